@@ -0,0 +1,106 @@
+"""
+Cache Versions Module
+Per-table write counters shared by every worker process on a host.
+
+Each uvicorn worker keeps its own caches (the table caches in
+supabase_service, the refill-due index, the technician stats rollups). A
+write bumps its table's counter; a worker that finds the counter moved since
+it cached something from that table treats the entry as stale, so a write
+made in one worker is seen by the others on their next read instead of when
+their TTLs run out.
+
+With CACHE_VERSIONS_FILE set (start.sh points every worker at the same
+file) the counters are 8-byte slots in a shared memory-mapped file, bumped
+under an flock. Without it they are process-local, which is all a single
+worker needs.
+"""
+
+import mmap
+import os
+import struct
+import threading
+from typing import Dict, Iterable, List, Optional
+
+try:
+    import fcntl
+except ImportError:  # Not available on Windows - counters stay process-local
+    fcntl = None
+
+_SLOT = struct.Struct("<Q")
+
+
+class TableVersions:
+    """Monotonic write counter per table, optionally shared through a file"""
+
+    def __init__(self, tables: Iterable[str], path: Optional[str] = None):
+        self._slots: Dict[str, int] = {table: slot for slot, table in enumerate(tables)}
+        self._lock = threading.Lock()
+        self._local: List[int] = [0] * len(self._slots)
+        self._own: List[int] = [0] * len(self._slots)
+        self._fd: Optional[int] = None
+        self._map: Optional[mmap.mmap] = None
+        if path and fcntl is None:
+            print("Warning: CACHE_VERSIONS_FILE is not supported on this platform - cache versions are per process")
+        elif path:
+            self._open(path)
+        # Counts already in the file were made before this process started
+        self._base: List[int] = [self._read(slot) for slot in range(len(self._slots))]
+
+    def _open(self, path: str) -> None:
+        size = _SLOT.size * max(1, len(self._slots))
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        try:
+            if os.fstat(fd).st_size < size:
+                os.ftruncate(fd, size)
+        finally:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+        self._fd = fd
+        self._map = mmap.mmap(fd, size)
+
+    def _read(self, slot: int) -> int:
+        if self._map is None:
+            return self._local[slot]
+        return _SLOT.unpack_from(self._map, slot * _SLOT.size)[0]
+
+    @property
+    def shared(self) -> bool:
+        """Whether the counters are shared with other processes"""
+        return self._map is not None
+
+    def get(self, table: str) -> int:
+        """Current version of a table (0 for tables without a counter)"""
+        slot = self._slots.get(table)
+        return self._read(slot) if slot is not None else 0
+
+    def bump(self, table: str) -> int:
+        """Record a write to a table and return its new version"""
+        slot = self._slots.get(table)
+        if slot is None:
+            return 0
+        with self._lock:
+            self._own[slot] += 1
+            if self._map is None:
+                self._local[slot] += 1
+                return self._local[slot]
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+            try:
+                version = self._read(slot) + 1
+                _SLOT.pack_into(self._map, slot * _SLOT.size, version)
+            finally:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+            return version
+
+    def foreign_writes(self, tables: Iterable[str]) -> int:
+        """Writes to the tables made by other processes since this one started
+
+        Structures that apply this process's own writes incrementally (the
+        refill-due index, the stats rollups) compare this to the value they
+        were built at to tell when another worker changed their source data.
+        """
+        total = 0
+        for table in tables:
+            slot = self._slots.get(table)
+            if slot is not None:
+                total += self._read(slot) - self._base[slot] - self._own[slot]
+        return total
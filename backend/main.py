@@ -1,32 +1,53 @@
 from fastapi import FastAPI, HTTPException, Depends, Request
+from fastapi.exceptions import RequestValidationError
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel, ConfigDict
 from typing import List, Optional
 from datetime import datetime, timezone
+from starlette.exceptions import HTTPException as StarletteHTTPException
 from starlette.responses import JSONResponse, RedirectResponse, HTMLResponse, Response
+import asyncio
 import json
+import logging
 import os
+import re
 from enum import Enum
 import base64
 import time
-import hmac
 import hashlib
 import secrets
 import bcrypt
-from supabase_service import (
-    load_users, save_users, delete_user,
-    load_clients, save_clients, delete_client,
+from timestamps import to_epoch_us
+from usage_engine import calculate_fleet_usage, compile_schedule
+from supabase_async import (
+    run_in_db_pool,
+    load_users, save_users, delete_user, insert_user, patch_user, get_user_by_username,
+    load_clients, delete_client, insert_client, patch_client, get_client_by_id,
     load_dispensers, save_dispensers,  # Legacy - kept for backward compatibility
-    load_machine_templates, save_machine_templates, delete_machine_template,  # New
-    load_machine_instances, save_machine_instances, delete_machine_instance,  # New
-    load_schedules, save_schedule, delete_schedule,
+    load_machine_templates, delete_machine_template,  # New
+    insert_machine_template, patch_machine_template,
+    get_machine_template_by_id, get_machine_template_by_sku,
+    load_machine_instances, delete_machine_instance,  # New
+    insert_machine_instance, patch_machine_instance_if,
+    get_machine_instance_by_id, get_machine_instance_by_code, load_machine_instances_for_client,
+    load_machine_instances_by_ids,
+    load_schedules, save_schedule, delete_schedule, load_compiled_schedules, get_schedule_by_id,
     load_schedule_time_ranges, save_schedule_time_ranges,
     load_schedule_intervals, save_schedule_intervals,
-    load_refill_logs, save_refill_logs, delete_refill_logs_by_dispenser,
-    load_technician_assignments, save_technician_assignments, delete_technician_assignment,
-    load_client_machines, save_client_machines,
-    clear_data_cache
+    load_refill_logs_page, delete_refill_logs_by_dispenser,
+    insert_refill_log, count_refill_logs,
+    load_technician_assignments, delete_technician_assignment,
+    insert_technician_assignment, patch_technician_assignment, patch_technician_assignment_if,
+    get_technician_assignment_by_id,
+    load_client_machines
 )
+from supabase_service import WriteConflictError, clear_data_cache, get_cache_stats
+from refill_index import refill_index
+from worker_pool import PoolSaturatedError, password_pool
+from token_keys import DEFAULT_KEY_ID, key_ring
+from technician_stats import technician_stats
+
+logger = logging.getLogger(__name__)
 
 app = FastAPI(title="Perfume Dispenser Management System")
 
@@ -41,7 +62,7 @@ async def startup_event():
     # The app will still start, but data initialization will happen on first request
     try:
         clear_data_cache()
-        init_default_data()
+        await init_default_data()
         print("Default data initialized successfully")
     except Exception as e:
         print(f"Warning: Could not initialize default data on startup: {e}")
@@ -95,9 +116,17 @@ app.add_middleware(
 
 # Data storage - using Supabase (see supabase_service.py)
 
-TOKEN_SECRET = os.environ.get("TOKEN_SECRET", secrets.token_urlsafe(32))  # Generate random secret if not provided
-TOKEN_TTL_SECONDS = 60 * 60 * 12  # 12 hours
-EXCLUDED_AUTH_PATHS = {"/api/login", "/api/client-login", "/docs", "/redoc", "/openapi.json", "/api/docs", "/api/health"}
+TOKEN_TTL_SECONDS = int(os.environ.get("TOKEN_TTL_SECONDS", str(60 * 60)))  # Access tokens: 1 hour
+REFRESH_TOKEN_TTL_SECONDS = int(os.environ.get("REFRESH_TOKEN_TTL_SECONDS", str(60 * 60 * 24 * 30)))  # 30 days
+EXCLUDED_AUTH_PATHS = frozenset({"/api/login", "/api/client-login", "/api/token/refresh", "/docs", "/redoc", "/openapi.json", "/api/docs", "/api/health"})
+# Swagger assets and health/docs sub-paths, matched with a single startswith call
+EXCLUDED_AUTH_PREFIXES = ("/docs", "/redoc", "/openapi.json", "/api/health", "/api/docs")
+# Verified tokens remembered per worker, so repeat requests skip decoding and the HMAC
+VERIFIED_TOKEN_CACHE_SIZE = int(os.environ.get("VERIFIED_TOKEN_CACHE_SIZE", "10000"))
+# Log the filters and result size of each technician assignments query (opt-in diagnostic)
+ASSIGNMENT_QUERY_DIAGNOSTICS = os.environ.get("ASSIGNMENT_QUERY_DIAGNOSTICS", "").strip().lower() in ("1", "true", "yes")
+# Attempts (read, then conditional update) before a read-modify-write endpoint gives up with 409
+WRITE_CONFLICT_ATTEMPTS = int(os.environ.get("WRITE_CONFLICT_ATTEMPTS", "3"))
 
 class UserRole(str, Enum):
     TECHNICIAN = "technician"
@@ -119,6 +148,9 @@ class LoginRequest(BaseModel):
     username: str
     password: str
 
+class RefreshRequest(BaseModel):
+    refresh_token: str
+
 class TimeInterval(BaseModel):
     spray_seconds: int
     pause_seconds: int
@@ -223,8 +255,23 @@ class TechnicianAssignment(BaseModel):
     notes: Optional[str] = None
     completed_date: Optional[str] = None
 
+class UsageCalculationRequest(BaseModel):
+    """Scope for the batch usage calculation - all filters are optional and combine"""
+    dispenser_ids: Optional[List[str]] = None
+    client_id: Optional[str] = None
+    technician_username: Optional[str] = None
+
+class BatchSubRequest(BaseModel):
+    """One read in a /api/batch call"""
+    id: Optional[str] = None  # Echoed back so callers can match responses
+    path: str  # e.g. "/api/dispensers" (may include a query string)
+    query: Optional[dict] = None
+
+class BatchRequest(BaseModel):
+    requests: List[BatchSubRequest]
+
 # Data storage functions - using Supabase (imported from supabase_service.py)
-# All load/save functions are now imported from supabase_service module
+# All load/save functions are awaitable wrappers from supabase_async, so queries never block the event loop
 
 # Password security functions (must be defined before init_default_data)
 def hash_password(password: str) -> str:
@@ -250,41 +297,59 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
     except Exception:
         return False
 
+async def hash_password_async(password: str) -> str:
+    """hash_password on the dedicated bcrypt pool, off the event loop"""
+    try:
+        return await password_pool.run(hash_password, password)
+    except PoolSaturatedError:
+        raise HTTPException(status_code=503, detail="Server busy, please retry")
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    """verify_password on the dedicated bcrypt pool, off the event loop"""
+    if not is_password_hashed(str(hashed_password or "")):
+        # Empty or legacy plain text passwords need no bcrypt work
+        return verify_password(plain_password, hashed_password)
+    try:
+        return await password_pool.run(verify_password, plain_password, hashed_password)
+    except PoolSaturatedError:
+        raise HTTPException(status_code=503, detail="Server busy, please retry")
+
 def is_password_hashed(password: str) -> bool:
     """Check if a password is already hashed"""
     return password.startswith('$2b$') or password.startswith('$2a$')
 
-def hash_existing_passwords():
+async def hash_existing_passwords():
     """Migrate existing plain text passwords to hashed passwords"""
-    users = load_users()
-    updated = False
+    users = await load_users()
+    migrated = []
     for user in users:
         password = str(user.get("password") or "").strip()
         if password and not is_password_hashed(password):
             # Hash the plain text password
-            user["password"] = hash_password(password)
-            updated = True
-    if updated:
-        save_users(users)
+            user["password"] = await hash_password_async(password)
+            migrated.append(user)
+    if migrated:
+        # Only upsert the rows that changed
+        await save_users(migrated)
         print("Migrated existing passwords to hashed format")
 
-def init_default_data():
+async def init_default_data():
     """Initialize default data in Google Sheets if they don't exist"""
     # Initialize default users if empty
-    users = load_users()
+    users = await load_users()
     if not users:
         default_users = [
-            {"username": "tech1", "password": hash_password("tech123"), "role": "technician"},
-            {"username": "admin1", "password": hash_password("admin123"), "role": "admin"},
-            {"username": "dev1", "password": hash_password("dev123"), "role": "developer"}
+            {"username": "tech1", "password": await hash_password_async("tech123"), "role": "technician"},
+            {"username": "admin1", "password": await hash_password_async("admin123"), "role": "admin"},
+            {"username": "dev1", "password": await hash_password_async("dev123"), "role": "developer"}
         ]
-        save_users(default_users)
+        await save_users(default_users)
     else:
         # Migrate any existing plain text passwords to hashed
-        hash_existing_passwords()
+        await hash_existing_passwords()
     
     # Initialize default schedules if empty
-    schedules = load_schedules()
+    schedules = await load_schedules()
     if not schedules:
         default_schedules = [
             {
@@ -332,7 +397,7 @@ def init_default_data():
             }
         ]
         for schedule in default_schedules:
-            save_schedule(schedule)
+            await save_schedule(schedule)
     
     # Don't initialize default clients - start with empty list
     # Clients should be added through the admin interface
@@ -344,26 +409,119 @@ def init_default_data():
 # This prevents crashes during import if credentials aren't available yet
 
 # Token utilities
-def _sign_payload(payload: str) -> str:
-    return hmac.new(TOKEN_SECRET.encode(), payload.encode(), hashlib.sha256).hexdigest()
+def _encode_token(payload: str) -> str:
+    """<key id>.<base64 payload>.<signature>, signed with the key ring's active key"""
+    kid = key_ring.active_kid
+    signature = key_ring.sign(payload, kid)
+    return f"{kid}.{base64.urlsafe_b64encode(payload.encode()).decode()}.{signature}"
+
+
+def _decode_token(token: str):
+    """Split a token into (payload, signature_valid)
+    
+    Tokens issued before the key ring carry no key id and are checked
+    against the "default" (TOKEN_SECRET) key. Raises ValueError if the
+    token is malformed.
+    """
+    parts = token.split(".")
+    if len(parts) == 3:
+        kid, encoded_payload, signature = parts
+    elif len(parts) == 2:
+        kid = DEFAULT_KEY_ID
+        encoded_payload, signature = parts
+    else:
+        raise ValueError("Malformed token")
+    payload = base64.urlsafe_b64decode(encoded_payload.encode()).decode()
+    return payload, key_ring.verify(kid, payload, signature)
 
 
 def generate_token(user: dict) -> str:
     issued_at = int(time.time())
     payload = f"{user['username']}|{user['role']}|{issued_at}"
-    signature = _sign_payload(payload)
-    token = f"{base64.urlsafe_b64encode(payload.encode()).decode()}.{signature}"
-    return token
+    return _encode_token(payload)
+
+
+def password_stamp(stored_password) -> str:
+    """Short fingerprint of a stored password hash, carried in refresh tokens
+    
+    Setting a new password changes the stamp, which ends every session
+    started with the old one.
+    """
+    return hashlib.sha256(str(stored_password or "").strip().encode()).hexdigest()[:16]
+
+
+def generate_refresh_token(user: dict, session_started_at: int = None) -> str:
+    """Long-lived token that can only be exchanged for new access tokens (POST /api/token/refresh)
+    
+    session_started_at is the login time the session is capped from; a
+    renewed token carries its predecessor's, so renewal never extends it.
+    user["password_stamp"] is the password_stamp of the account's password
+    at login.
+    """
+    issued_at = int(time.time())
+    if session_started_at is None:
+        session_started_at = issued_at
+    payload = f"refresh|{user['username']}|{user['role']}|{issued_at}|{session_started_at}|{user.get('password_stamp') or ''}"
+    return _encode_token(payload)
+
+
+def verify_refresh_token(token: str) -> dict:
+    """Check a refresh token's signature and session age and return the identity it was issued to
+    
+    The session ends REFRESH_TOKEN_TTL_SECONDS after the login that started
+    it, however often it was renewed. Tokens issued before the session time
+    was recorded (four fields) count from their own issue time, and tokens
+    issued before the password stamp (four or five fields) have a
+    password_stamp of None. The payload always has more fields than an
+    access token's, so a refresh token is never accepted by verify_token,
+    and access tokens are rejected here. The account itself is checked by
+    check_refresh_account.
+    """
+    try:
+        payload, signature_valid = _decode_token(token)
+    except Exception:
+        raise HTTPException(status_code=401, detail="Invalid refresh token")
+
+    if not signature_valid:
+        raise HTTPException(status_code=401, detail="Invalid refresh token signature")
+
+    try:
+        fields = payload.split("|")
+        if len(fields) == 4:
+            fields.append(fields[3])
+        if len(fields) == 5:
+            fields.append(None)
+        kind, username, role, issued_at_str, session_started_at_str, stamp = fields
+        issued_at = int(issued_at_str)
+        session_started_at = int(session_started_at_str)
+    except Exception:
+        raise HTTPException(status_code=401, detail="Invalid refresh token payload")
+    if kind != "refresh" or session_started_at > issued_at:
+        raise HTTPException(status_code=401, detail="Invalid refresh token payload")
+
+    if time.time() - session_started_at > REFRESH_TOKEN_TTL_SECONDS:
+        raise HTTPException(status_code=401, detail="Refresh token expired")
+
+    return {"username": username, "role": role, "session_started_at": session_started_at, "password_stamp": stamp}
+
+# token -> (identity, expires_at) for tokens that passed verification
+_verified_tokens: dict = {}
 
 
 def verify_token(token: str) -> dict:
+    cached = _verified_tokens.get(token)
+    if cached:
+        identity, expires_at = cached
+        if time.time() <= expires_at:
+            return dict(identity)
+        _verified_tokens.pop(token, None)
+
     try:
-        encoded_payload, signature = token.split(".")
-        payload = base64.urlsafe_b64decode(encoded_payload.encode()).decode()
+        payload, signature_valid = _decode_token(token)
     except Exception:
         raise HTTPException(status_code=401, detail="Invalid token")
 
-    if _sign_payload(payload) != signature:
+    if not signature_valid:
         raise HTTPException(status_code=401, detail="Invalid token signature")
 
     try:
@@ -375,7 +533,14 @@ def verify_token(token: str) -> dict:
     if time.time() - issued_at > TOKEN_TTL_SECONDS:
         raise HTTPException(status_code=401, detail="Token expired")
 
-    return {"username": username, "role": role}
+    identity = {"username": username, "role": role}
+    if role == "client":
+        identity["client_id"] = username  # Client tokens are issued with the client_id as username
+
+    if len(_verified_tokens) >= VERIFIED_TOKEN_CACHE_SIZE:
+        _verified_tokens.pop(next(iter(_verified_tokens)))  # Drop the oldest entry
+    _verified_tokens[token] = (identity, issued_at + TOKEN_TTL_SECONDS)
+    return dict(identity)
 
 def require_roles(request: Request, allowed_roles: list):
     user = getattr(request.state, "user", None)
@@ -385,11 +550,43 @@ def require_roles(request: Request, allowed_roles: list):
         raise HTTPException(status_code=403, detail="Forbidden")
     return user
 
+def client_scope(request: Request):
+    """client_id a client login is restricted to (None for staff users)"""
+    user = getattr(request.state, "user", None)
+    if user and user.get("role") == "client":
+        return user.get("client_id") or user.get("username")
+    return None
+
+# Browsers may store these responses but must revalidate them (If-None-Match) before reuse
+REVALIDATE_CACHE_CONTROL = "private, no-cache"
 
-def authenticate_user(username: str, password: str):
-    """Authenticate user using credentials from Google Sheets with secure password hashing"""
-    users = load_users()
+def conditional_json(request: Request, content) -> Response:
+    """JSON response with an ETag, answering 304 Not Modified when the client's copy is current
     
+    The ETag is a hash of the rendered body, so it stays valid across worker
+    processes and cache refills: it only changes when the data does. The
+    data itself comes from the table cache, so a revalidation costs no
+    database read while the cache is fresh.
+    """
+    response = JSONResponse(content=content)
+    etag = f'"{hashlib.sha1(response.body).hexdigest()}"'
+    headers = {"ETag": etag, "Cache-Control": REVALIDATE_CACHE_CONTROL, "Vary": "Authorization"}
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match:
+        candidates = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+        if etag in candidates or "*" in candidates:
+            return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+    return response
+
+
+async def authenticate_user(username: str, password: str):
+    """Authenticate user with secure password hashing
+    
+    The user row is fetched with a cached point lookup on the normalized
+    username (invalidated on user writes), so the cost of a login is the
+    password check, not the size of the users table.
+    """
     # Normalize input - strip whitespace and convert to string
     username_normalized = str(username).strip() if username else ""
     password_normalized = str(password).strip() if password else ""
@@ -397,27 +594,28 @@ def authenticate_user(username: str, password: str):
     if not username_normalized or not password_normalized:
         return None
     
-    # Find user and verify password securely
-    for user in users:
-        # Get username, always as string, strip whitespace
-        user_username = str(user.get("username") or "").strip()
-        
-        if user_username == username_normalized:
-            # Get stored password (could be hashed or plain text for migration)
-            stored_password = str(user.get("password") or "").strip()
-            
-            # Verify password using secure comparison
-            if verify_password(password_normalized, stored_password):
-                # Return user without password
-                user_copy = {k: v for k, v in user.items() if k != "password"}
-                return user
+    user = await get_user_by_username(username_normalized)
+    if not user:
+        return None
+    
+    # Get stored password (could be hashed or plain text for migration)
+    stored_password = str(user.get("password") or "").strip()
+    
+    # Verify password using secure comparison
+    if await verify_password_async(password_normalized, stored_password):
+        # Return user without password
+        authenticated = {k: v for k, v in user.items() if k != "password"}
+        authenticated["password_stamp"] = password_stamp(stored_password)
+        return authenticated
     
     return None
 
-def authenticate_client(client_id: str, password: str):
-    """Authenticate client using client_id and password from Google Sheets only (no hardcoded values)"""
-    clients = load_clients()
+async def authenticate_client(client_id: str, password: str):
+    """Authenticate client using client_id and stored password only (no hardcoded values)
     
+    Like authenticate_user, the client row comes from a cached point lookup
+    on the normalized client_id (invalidated on client writes).
+    """
     # Normalize input
     client_id_normalized = str(client_id).strip() if client_id else ""
     password_normalized = str(password).strip() if password else ""
@@ -425,61 +623,97 @@ def authenticate_client(client_id: str, password: str):
     if not client_id_normalized or not password_normalized:
         return None
     
-    for client in clients:
-        if str(client.get("id") or "").strip() == client_id_normalized:
-            # Get stored password from Google Sheets (must be hashed)
-            stored_password = str(client.get("password") or "").strip()
-            
-            # Client must have a password stored in Google Sheets - no hardcoded fallback
-            if not stored_password:
-                return None
-            
-            # Verify password using secure comparison (handles bcrypt hashed passwords)
-            if verify_password(password_normalized, stored_password):
-                # Return a user-like dict for token generation
-                return {
-                    "username": client_id,
-                    "role": "client",
-                    "client_id": client_id,
-                    "client_name": client.get("name", "")
-                }
+    client = await get_client_by_id(client_id_normalized)
+    if not client:
+        return None
+    
+    # Get stored password (must be hashed)
+    stored_password = str(client.get("password") or "").strip()
+    
+    # Client must have a password stored - no hardcoded fallback
+    if not stored_password:
+        return None
+    
+    # Verify password using secure comparison (handles bcrypt hashed passwords)
+    if await verify_password_async(password_normalized, stored_password):
+        # Return a user-like dict for token generation
+        return {
+            "username": client_id_normalized,
+            "role": "client",
+            "client_id": client_id_normalized,
+            "client_name": client.get("name", ""),
+            "password_stamp": password_stamp(stored_password)
+        }
     return None
 
 
-@app.middleware("http")
-async def enforce_auth(request: Request, call_next):
-    path = request.url.path
-    
-    # For OPTIONS requests (CORS preflight), always allow through without authentication
-    # CORS middleware will handle adding proper headers
-    if request.method == "OPTIONS":
-        return await call_next(request)
+async def check_refresh_account(identity: dict) -> dict:
+    """Check that a refresh token's account still exists unchanged
     
-    # Allow excluded paths without authentication
-    if path in EXCLUDED_AUTH_PATHS:
-        return await call_next(request)
+    The user (or client) row comes from the same cached point lookup as a
+    login, invalidated on writes to the table. Raises 401 if the account
+    was deleted, its role changed, or its password changed since the
+    session started (not checked for tokens issued without a password
+    stamp). Returns the identity with the account's current stamp.
+    """
+    if identity["role"] == "client":
+        account = await get_client_by_id(identity["username"])
+        role = "client" if account else None
+    else:
+        account = await get_user_by_username(identity["username"])
+        role = account.get("role") if account else None
+    if not account or role != identity["role"]:
+        raise HTTPException(status_code=401, detail="Refresh token revoked")
     
-    # Allow Swagger assets
-    if path.startswith("/docs") or path.startswith("/redoc") or path.startswith("/openapi.json"):
-        return await call_next(request)
+    current_stamp = password_stamp(account.get("password"))
+    if identity["password_stamp"] is not None and identity["password_stamp"] != current_stamp:
+        raise HTTPException(status_code=401, detail="Refresh token revoked")
+    return {**identity, "password_stamp": current_stamp}
+
+
+class AuthMiddleware:
+    """Pure ASGI authentication layer
     
-    # Allow API health and docs endpoints
-    if path.startswith("/api/health") or path.startswith("/api/docs"):
-        return await call_next(request)
+    Requires a valid bearer token on every HTTP request except CORS preflights
+    and the excluded paths, and stores the identity in scope["state"]["user"]
+    (read back as request.state.user). Requests are passed straight to the
+    inner app, so responses, streaming ones included, are not buffered.
+    """
 
-    # For all other methods, require authentication
-    auth_header = request.headers.get("authorization")
-    if not auth_header or not auth_header.lower().startswith("bearer "):
-        return JSONResponse({"detail": "Unauthorized"}, status_code=401)
+    def __init__(self, app):
+        self.app = app
 
-    token = auth_header.split(" ", 1)[1].strip()
-    try:
-        user = verify_token(token)
-        request.state.user = user
-    except HTTPException as e:
-        return JSONResponse({"detail": e.detail}, status_code=e.status_code)
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] == "OPTIONS":
+            # CORS middleware will handle adding proper headers to preflights
+            await self.app(scope, receive, send)
+            return
+
+        path = scope["path"]
+        if path in EXCLUDED_AUTH_PATHS or path.startswith(EXCLUDED_AUTH_PREFIXES):
+            await self.app(scope, receive, send)
+            return
+
+        auth_header = None
+        for name, value in scope["headers"]:
+            if name == b"authorization":
+                auth_header = value.decode("latin-1")
+                break
+        if not auth_header or not auth_header[:7].lower() == "bearer ":
+            await JSONResponse({"detail": "Unauthorized"}, status_code=401)(scope, receive, send)
+            return
+
+        try:
+            user = verify_token(auth_header[7:].strip())
+        except HTTPException as e:
+            await JSONResponse({"detail": e.detail}, status_code=e.status_code)(scope, receive, send)
+            return
+
+        scope.setdefault("state", {})["user"] = user
+        await self.app(scope, receive, send)
 
-    return await call_next(request)
+
+app.add_middleware(AuthMiddleware)
 
 # API Endpoints
 
@@ -487,13 +721,18 @@ async def enforce_auth(request: Request, call_next):
 async def login(credentials: LoginRequest):
     """Unified login endpoint - tries regular user first, then client if that fails"""
     # Try regular user authentication first
-    user = authenticate_user(credentials.username, credentials.password)
+    user = await authenticate_user(credentials.username, credentials.password)
     if user:
         token = generate_token(user)
-        return {"username": user["username"], "role": user["role"], "token": token}
+        return {
+            "username": user["username"],
+            "role": user["role"],
+            "token": token,
+            "refresh_token": generate_refresh_token(user)
+        }
     
     # If user authentication fails, try client authentication
-    client = authenticate_client(credentials.username, credentials.password)
+    client = await authenticate_client(credentials.username, credentials.password)
     if client:
         token = generate_token(client)
         return {
@@ -501,7 +740,8 @@ async def login(credentials: LoginRequest):
             "role": client["role"],
             "client_id": client["client_id"],
             "client_name": client.get("client_name", ""),
-            "token": token
+            "token": token,
+            "refresh_token": generate_refresh_token(client)
         }
     
     # Both failed
@@ -510,7 +750,7 @@ async def login(credentials: LoginRequest):
 @app.post("/api/client-login")
 async def client_login(credentials: LoginRequest):
     """Client login endpoint - authenticates using client_id and password from Google Sheets only"""
-    client = authenticate_client(credentials.username, credentials.password)
+    client = await authenticate_client(credentials.username, credentials.password)
     if not client:
         raise HTTPException(status_code=401, detail="Invalid client credentials")
     token = generate_token(client)
@@ -519,13 +759,35 @@ async def client_login(credentials: LoginRequest):
         "role": client["role"],
         "client_id": client["client_id"],
         "client_name": client.get("client_name", ""),
-        "token": token
+        "token": token,
+        "refresh_token": generate_refresh_token(client)
+    }
+
+@app.post("/api/token/refresh")
+async def refresh_token(body: RefreshRequest):
+    """Issue a new access token (and a renewed refresh token) from a refresh token
+    
+    Beyond the token's signature and session age, only a cached lookup of
+    the account is needed (no bcrypt password check): a deleted account, a
+    changed role or a changed password ends the session. The renewed
+    refresh token keeps the original login time, so the session still ends
+    REFRESH_TOKEN_TTL_SECONDS after that login.
+    """
+    identity = await check_refresh_account(verify_refresh_token(body.refresh_token.strip()))
+    response = {
+        "username": identity["username"],
+        "role": identity["role"],
+        "token": generate_token(identity),
+        "refresh_token": generate_refresh_token(identity, identity["session_started_at"])
     }
+    if identity["role"] == "client":
+        response["client_id"] = identity["username"]  # Client tokens are issued with the client_id as username
+    return response
 
 @app.get("/api/users")
 async def get_users():
     """Get all users (admin/developer only)"""
-    users = load_users()
+    users = await load_users()
     # Don't return passwords
     return [{
         "username": user["username"],
@@ -535,7 +797,7 @@ async def get_users():
 @app.post("/api/users")
 async def create_user(user: User):
     """Create a new user (admin/developer only) - password is automatically hashed"""
-    users = load_users()
+    users = await load_users()
     # Check if username already exists
     for existing_user in users:
         if existing_user["username"] == user.username:
@@ -543,9 +805,8 @@ async def create_user(user: User):
     
     user_dict = user.dict()
     # Hash the password before storing
-    user_dict["password"] = hash_password(user.password)
-    users.append(user_dict)
-    save_users(users)
+    user_dict["password"] = await hash_password_async(user.password)
+    await insert_user(user_dict)
     
     # Return user without password
     return {
@@ -556,30 +817,30 @@ async def create_user(user: User):
 @app.put("/api/users/{username}")
 async def update_user(username: str, user_update: dict):
     """Update a user (admin/developer only) - password is automatically hashed if provided"""
-    users = load_users()
-    
-    for i, user in enumerate(users):
-        if user["username"] == username:
-            # Update fields if provided
-            if "password" in user_update:
-                # Hash the password before storing
-                users[i]["password"] = hash_password(user_update["password"])
-            if "role" in user_update:
-                users[i]["role"] = user_update["role"]
-            
-            save_users(users)
-            
-            return {
-                "username": users[i]["username"],
-                "role": users[i]["role"]
-            }
+    user = await get_user_by_username(username)
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+    
+    # Update fields if provided
+    changes = {}
+    if "password" in user_update:
+        # Hash the password before storing
+        changes["password"] = await hash_password_async(user_update["password"])
+    if "role" in user_update:
+        changes["role"] = user_update["role"]
     
-    raise HTTPException(status_code=404, detail="User not found")
+    if changes:
+        user = await patch_user(username, changes) or {**user, **changes}
+    
+    return {
+        "username": user["username"],
+        "role": user["role"]
+    }
 
 @app.delete("/api/users/{username}")
 async def delete_user_endpoint(username: str):
     """Delete a user (admin/developer only)"""
-    users = load_users()
+    users = await load_users()
     
     # Don't allow deleting the last user
     if len(users) <= 1:
@@ -591,7 +852,7 @@ async def delete_user_endpoint(username: str):
         raise HTTPException(status_code=404, detail="User not found")
     
     # Delete from Supabase
-    delete_user(username)
+    await delete_user(username)
     
     return {"message": "User deleted successfully"}
 
@@ -599,83 +860,78 @@ async def delete_user_endpoint(username: str):
 async def migrate_passwords(request: Request):
     """Migrate all plain text passwords to hashed format (admin/developer only)"""
     require_roles(request, ["admin", "developer"])
-    hash_existing_passwords()
+    await hash_existing_passwords()
     return {"message": "Password migration completed successfully"}
 
 @app.get("/api/schedules")
-async def get_schedules():
-    return load_schedules()
+async def get_schedules(request: Request):
+    return conditional_json(request, await load_schedules())
 
 @app.post("/api/schedules")
 async def create_schedule(schedule: Schedule):
-    schedules = load_schedules()
+    schedules = await load_schedules()
     schedule_id = f"schedule_{len(schedules) + 1}"
     schedule_dict = schedule.dict()
     schedule_dict["id"] = schedule_id
-    return save_schedule(schedule_dict)
+    return await save_schedule(schedule_dict)
 
 @app.get("/api/schedules/{schedule_id}")
 async def get_schedule(schedule_id: str):
-    schedules = load_schedules()
-    for schedule in schedules:
-        if schedule.get("id") == schedule_id:
-            return schedule
-    raise HTTPException(status_code=404, detail="Schedule not found")
+    schedule = await get_schedule_by_id(schedule_id)
+    if not schedule:
+        raise HTTPException(status_code=404, detail="Schedule not found")
+    return schedule
 
 @app.put("/api/schedules/{schedule_id}")
 async def update_schedule(schedule_id: str, schedule: Schedule):
-    schedules = load_schedules()
-    schedule_found = any(s.get("id") == schedule_id for s in schedules)
-    if not schedule_found:
+    if not await get_schedule_by_id(schedule_id):
         raise HTTPException(status_code=404, detail="Schedule not found")
     
     schedule_dict = schedule.dict()
     schedule_dict["id"] = schedule_id
-    return save_schedule(schedule_dict)
+    saved = await save_schedule(schedule_dict)
+    await run_in_db_pool(refill_index.update_schedule, schedule_id)
+    return saved
 
 @app.delete("/api/schedules/{schedule_id}")
 async def delete_schedule_endpoint(schedule_id: str):
-    schedules = load_schedules()
+    schedule = await get_schedule_by_id(schedule_id)
+    if not schedule:
+        raise HTTPException(status_code=404, detail="Schedule not found")
     # Don't allow deleting fixed schedules
-    for schedule in schedules:
-        if schedule.get("id") == schedule_id:
-            if schedule.get("type") == "fixed":
-                raise HTTPException(status_code=400, detail="Cannot delete fixed schedules")
-            delete_schedule(schedule_id)
-            return {"message": "Schedule deleted"}
-    raise HTTPException(status_code=404, detail="Schedule not found")
+    if schedule.get("type") == "fixed":
+        raise HTTPException(status_code=400, detail="Cannot delete fixed schedules")
+    await delete_schedule(schedule_id)
+    await run_in_db_pool(refill_index.update_schedule, schedule_id)
+    return {"message": "Schedule deleted"}
 
 # ============================================================================
 # Machine Templates Endpoints (New - SKU Specifications)
 # ============================================================================
 
 @app.get("/api/machine-templates")
-async def get_machine_templates():
+async def get_machine_templates(request: Request):
     """Get all machine templates (SKU specifications)"""
-    templates = load_machine_templates()
-    return templates
+    templates = await load_machine_templates()
+    return conditional_json(request, templates)
 
 @app.get("/api/machine-templates/{template_id}")
 async def get_machine_template(template_id: str):
     """Get a specific machine template"""
-    templates = load_machine_templates()
-    for template in templates:
-        if template.get("id") == template_id:
-            return template
-    raise HTTPException(status_code=404, detail="Machine template not found")
+    template = await get_machine_template_by_id(template_id)
+    if not template:
+        raise HTTPException(status_code=404, detail="Machine template not found")
+    return template
 
 @app.post("/api/machine-templates")
 async def create_machine_template(template: MachineTemplate):
     """Create a new machine template (SKU specification)"""
-    templates = load_machine_templates()
-    
     # Check for duplicate SKU
-    for existing in templates:
-        if existing.get("sku") == template.sku:
-            raise HTTPException(
-                status_code=400,
-                detail=f"SKU '{template.sku}' already exists. SKU must be unique."
-            )
+    if await get_machine_template_by_sku(template.sku):
+        raise HTTPException(
+            status_code=400,
+            detail=f"SKU '{template.sku}' already exists. SKU must be unique."
+        )
     
     # Convert to dict
     try:
@@ -686,32 +942,22 @@ async def create_machine_template(template: MachineTemplate):
     except:
         template_dict = template.dict(exclude_none=False)
     
-    templates.append(template_dict)
-    save_machine_templates(templates)
+    await insert_machine_template(template_dict)
     return template_dict
 
 @app.put("/api/machine-templates/{template_id}")
 async def update_machine_template(template_id: str, template: MachineTemplate):
     """Update a machine template"""
-    templates = load_machine_templates()
-    
-    # Find template
-    template_index = None
-    for i, t in enumerate(templates):
-        if t.get("id") == template_id:
-            template_index = i
-            break
-    
-    if template_index is None:
+    if not await get_machine_template_by_id(template_id):
         raise HTTPException(status_code=404, detail="Machine template not found")
     
     # Check for duplicate SKU (excluding current template)
-    for existing in templates:
-        if existing.get("sku") == template.sku and existing.get("id") != template_id:
-            raise HTTPException(
-                status_code=400,
-                detail=f"SKU '{template.sku}' already exists. SKU must be unique."
-            )
+    existing = await get_machine_template_by_sku(template.sku)
+    if existing and existing.get("id") != template_id:
+        raise HTTPException(
+            status_code=400,
+            detail=f"SKU '{template.sku}' already exists. SKU must be unique."
+        )
     
     # Convert to dict
     try:
@@ -723,16 +969,14 @@ async def update_machine_template(template_id: str, template: MachineTemplate):
         template_dict = template.dict(exclude_none=False)
     
     template_dict["id"] = template_id
-    templates[template_index] = template_dict
-    save_machine_templates(templates)
+    await patch_machine_template(template_id, template_dict)
     return template_dict
 
 @app.delete("/api/machine-templates/{template_id}")
 async def delete_machine_template_endpoint(template_id: str):
     """Delete a machine template - only if no instances exist"""
     try:
-        templates = load_machine_templates()
-        instances = load_machine_instances()
+        instances = await load_machine_instances()
         
         # Check if any instances use this template
         instances_using_template = [i for i in instances if i.get("template_id") == template_id]
@@ -743,7 +987,7 @@ async def delete_machine_template_endpoint(template_id: str):
             )
         
         # Delete from Supabase
-        delete_machine_template(template_id)
+        await delete_machine_template(template_id)
         return {"message": "Machine template deleted successfully"}
     except HTTPException:
         raise
@@ -757,58 +1001,46 @@ async def delete_machine_template_endpoint(template_id: str):
 # ============================================================================
 
 @app.get("/api/machine-instances")
-async def get_machine_instances():
-    """Get all machine instances (installed machines)"""
-    instances = load_machine_instances()
-    client_machines_data = load_client_machines()
+async def get_machine_instances(request: Request):
+    """Get all machine instances (installed machines) - clients get only their own"""
+    scope = client_scope(request)
+    if scope:
+        return conditional_json(request, await load_machine_instances_for_client(scope))
+    
+    instances = await load_machine_instances()
+    client_machines_data = await load_client_machines()
     assigned_machines = client_machines_data.get("client_machines", [])
     
     # Merge instances with assigned machines (for backward compatibility)
     all_instances = instances + assigned_machines
-    return all_instances
+    return conditional_json(request, all_instances)
 
 @app.get("/api/machine-instances/{instance_id}")
-async def get_machine_instance(instance_id: str):
+async def get_machine_instance(instance_id: str, request: Request):
     """Get a specific machine instance"""
-    instances = load_machine_instances()
-    client_machines_data = load_client_machines()
-    
-    # Check instances first
-    for instance in instances:
-        if instance.get("id") == instance_id:
-            return instance
-    
-    # Check assigned machines
-    for instance in client_machines_data.get("client_machines", []):
-        if instance.get("id") == instance_id:
-            return instance
-    
-    raise HTTPException(status_code=404, detail="Machine instance not found")
+    instance = await get_machine_instance_by_id(instance_id)
+    scope = client_scope(request)
+    if not instance or (scope and instance.get("client_id") != scope):
+        raise HTTPException(status_code=404, detail="Machine instance not found")
+    return instance
 
 @app.post("/api/machine-instances")
 async def create_machine_instance(instance: MachineInstance):
     """Create a new machine instance (installed machine)"""
-    instances = load_machine_instances()
-    client_machines_data = load_client_machines()
-    
     # Verify template exists if template_id is provided
     if instance.template_id:
-        templates = load_machine_templates()
-        template_exists = any(t.get("id") == instance.template_id for t in templates)
-        if not template_exists:
+        if not await get_machine_template_by_id(instance.template_id):
             raise HTTPException(
                 status_code=400,
                 detail=f"Template '{instance.template_id}' not found"
             )
     
     # Check for duplicate unique_code
-    all_instances = instances + client_machines_data.get("client_machines", [])
-    for existing in all_instances:
-        if existing.get("unique_code") == instance.unique_code:
-            raise HTTPException(
-                status_code=400,
-                detail=f"Code '{instance.unique_code}' already exists. Code must be unique."
-            )
+    if await get_machine_instance_by_code(instance.unique_code):
+        raise HTTPException(
+            status_code=400,
+            detail=f"Code '{instance.unique_code}' already exists. Code must be unique."
+        )
     
     # Convert to dict
     try:
@@ -819,70 +1051,50 @@ async def create_machine_instance(instance: MachineInstance):
     except:
         instance_dict = instance.dict(exclude_none=False)
     
-    # Route based on status
+    # Assigned and installed machines live in the same table, distinguished by status
     status = instance.status or "installed"
     if status == "assigned":
-        if "client_machines" not in client_machines_data:
-            client_machines_data["client_machines"] = []
         instance_dict["status"] = "assigned"
-        client_machines_data["client_machines"].append(instance_dict)
-        save_client_machines(client_machines_data)
-    else:
-        instances.append(instance_dict)
-        save_machine_instances(instances)
+    await insert_machine_instance(instance_dict)
+    await run_in_db_pool(refill_index.upsert_machine, instance_dict)
     
     return instance_dict
 
+# Columns written by refills; full-row machine edits only change them deliberately
+REFILL_COLUMNS = ("current_level_ml", "last_refill_date")
+
+def guard_refill_columns(changes: dict, row: dict) -> dict:
+    """Keep a full-row machine edit from undoing a refill
+    
+    Edit forms send current_level_ml and last_refill_date back as the
+    client last saw them. They are dropped from changes when they match
+    the row, or when their last_refill_date is older than the row's (a
+    refill landed after the client loaded the machine). A real change is
+    kept and the returned condition pins the row's last_refill_date, so a
+    refill committing before the write makes it conflict - and the retry
+    then drops the now stale values.
+    
+    Returns the extra expected values for patch_machine_instance_if.
+    """
+    sent = {column: changes.pop(column) for column in REFILL_COLUMNS if column in changes}
+    if not sent:
+        return {}
+    stored_at = to_epoch_us(row.get("last_refill_date"))
+    sent_at = to_epoch_us(sent.get("last_refill_date", row.get("last_refill_date")))
+    if stored_at is not None and (sent_at is None or sent_at < stored_at):
+        return {}
+    unchanged = sent_at == stored_at and (
+        "current_level_ml" not in sent
+        or safe_float(sent["current_level_ml"]) == safe_float(row.get("current_level_ml"))
+    )
+    if unchanged:
+        return {}
+    changes.update(sent)
+    return {"last_refill_date": row.get("last_refill_date")}
+
 @app.put("/api/machine-instances/{instance_id}")
 async def update_machine_instance(instance_id: str, instance: MachineInstance):
     """Update a machine instance"""
-    instances = load_machine_instances()
-    client_machines_data = load_client_machines()
-    
-    # Find instance
-    instance_index = None
-    in_client_machines = False
-    
-    # Check client_machines first
-    for i, inst in enumerate(client_machines_data.get("client_machines", [])):
-        if inst.get("id") == instance_id:
-            instance_index = i
-            in_client_machines = True
-            break
-    
-    # Check instances if not found
-    if instance_index is None:
-        for i, inst in enumerate(instances):
-            if inst.get("id") == instance_id:
-                instance_index = i
-                break
-    
-    if instance_index is None:
-        raise HTTPException(status_code=404, detail="Machine instance not found")
-    
-    # Check for duplicate unique_code (excluding current instance)
-    all_instances = instances + client_machines_data.get("client_machines", [])
-    for existing in all_instances:
-        if existing.get("unique_code") == instance.unique_code and existing.get("id") != instance_id:
-            raise HTTPException(
-                status_code=400,
-                detail=f"Code '{instance.unique_code}' already exists. Code must be unique."
-            )
-    
-    # Prevent changing client_id
-    original_instance = None
-    if in_client_machines:
-        original_instance = client_machines_data.get("client_machines", [])[instance_index]
-    else:
-        original_instance = instances[instance_index]
-    
-    if original_instance and original_instance.get("client_id"):
-        if instance.client_id != original_instance.get("client_id"):
-            raise HTTPException(
-                status_code=400,
-                detail=f"Cannot change machine's client. Machine belongs to client '{original_instance.get('client_id')}'."
-            )
-    
     # Convert to dict
     try:
         if hasattr(instance, 'model_dump'):
@@ -894,68 +1106,57 @@ async def update_machine_instance(instance_id: str, instance: MachineInstance):
     
     instance_dict["id"] = instance_id
     
-    # Handle status changes (move between files)
-    new_status = instance.status or "installed"
-    was_assigned = in_client_machines
-    will_be_assigned = new_status == "assigned"
-    
-    if was_assigned and not will_be_assigned:
-        # Move from client_machines to instances
-        client_machines_data["client_machines"].pop(instance_index)
-        save_client_machines(client_machines_data)
-        instances.append(instance_dict)
-        save_machine_instances(instances)
-    elif not was_assigned and will_be_assigned:
-        # Move from instances to client_machines
-        instances.pop(instance_index)
-        save_machine_instances(instances)
-        if "client_machines" not in client_machines_data:
-            client_machines_data["client_machines"] = []
-        client_machines_data["client_machines"].append(instance_dict)
-        save_client_machines(client_machines_data)
+    # Status changes (assigned <-> installed) are just a column update on the same row
+    instance_dict["status"] = instance.status or "installed"
+    
+    for _ in range(WRITE_CONFLICT_ATTEMPTS):
+        original_instance = await get_machine_instance_by_id(instance_id)
+        if not original_instance:
+            raise HTTPException(status_code=404, detail="Machine instance not found")
+        
+        # Check for duplicate unique_code (excluding current instance)
+        existing = await get_machine_instance_by_code(instance.unique_code)
+        if existing and existing.get("id") != instance_id:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Code '{instance.unique_code}' already exists. Code must be unique."
+            )
+        
+        # Prevent changing client_id
+        if original_instance.get("client_id"):
+            if instance.client_id != original_instance.get("client_id"):
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"Cannot change machine's client. Machine belongs to client '{original_instance.get('client_id')}'."
+                )
+        
+        # Only write if the machine wasn't given to a client since the check above
+        changes = dict(instance_dict)
+        expected = {"client_id": original_instance.get("client_id"), **guard_refill_columns(changes, original_instance)}
+        try:
+            row = await patch_machine_instance_if(instance_id, expected, changes)
+            break
+        except WriteConflictError:
+            continue
     else:
-        # Update in place
-        if in_client_machines:
-            client_machines_data["client_machines"][instance_index] = instance_dict
-            save_client_machines(client_machines_data)
-        else:
-            instances[instance_index] = instance_dict
-            save_machine_instances(instances)
+        raise HTTPException(status_code=409, detail="Machine instance was modified concurrently, please retry")
+    await run_in_db_pool(refill_index.upsert_machine, row)
     
-    return instance_dict
+    return {**instance_dict, **{column: row.get(column) for column in REFILL_COLUMNS}}
 
 @app.delete("/api/machine-instances/{instance_id}")
 async def delete_machine_instance_endpoint(instance_id: str):
     """Delete a machine instance"""
-    instances = load_machine_instances()
-    client_machines_data = load_client_machines()
-    
-    # Check and remove from client_machines
-    client_machines = client_machines_data.get("client_machines", [])
-    found_in_client_machines = any(i.get("id") == instance_id for i in client_machines)
-    
-    if found_in_client_machines:
-        # Delete from Supabase (client_machines are just instances with status="assigned")
-        delete_machine_instance(instance_id)
-        # Also delete associated refill logs
-        delete_refill_logs_by_dispenser(instance_id)
-        return {"message": "Machine instance deleted successfully"}
-    
-    # Check and remove from instances
-    instance_to_delete = None
-    for i in instances:
-        if i.get("id") == instance_id:
-            instance_to_delete = i
-            break
-    
-    if not instance_to_delete:
+    if not await get_machine_instance_by_id(instance_id):
         raise HTTPException(status_code=404, detail="Machine instance not found")
     
-    # Delete from Supabase
-    delete_machine_instance(instance_id)
+    # Delete from Supabase (assigned and installed machines share the table)
+    await delete_machine_instance(instance_id)
+    refill_index.remove_machine(instance_id)
     
     # Remove associated refill logs
-    delete_refill_logs_by_dispenser(instance_id)
+    await delete_refill_logs_by_dispenser(instance_id)
+    technician_stats.remove_refills_for_dispenser(instance_id)
     
     return {"message": "Machine instance deleted successfully"}
 
@@ -964,11 +1165,18 @@ async def delete_machine_instance_endpoint(instance_id: str):
 # ============================================================================
 
 @app.get("/api/dispensers")
-async def get_dispensers():
-    """Get all dispensers - returns templates + instances merged (backward compatibility)"""
-    templates = load_machine_templates()
-    instances = load_machine_instances()
-    client_machines_data = load_client_machines()
+async def get_dispensers(request: Request):
+    """Get all dispensers - returns templates + instances merged (backward compatibility)
+    
+    Client logins get only their own machine instances, queried by client_id.
+    """
+    scope = client_scope(request)
+    if scope:
+        return conditional_json(request, await load_machine_instances_for_client(scope))
+    
+    templates = await load_machine_templates()
+    instances = await load_machine_instances()
+    client_machines_data = await load_client_machines()
     assigned_machines = client_machines_data.get("client_machines", [])
     
     # Merge templates and instances for backward compatibility
@@ -994,44 +1202,59 @@ async def get_dispensers():
     
     # Merge all
     all_dispensers = template_dispensers + instances + assigned_machines
-    return all_dispensers
+    return conditional_json(request, all_dispensers)
+
+# How soon a machine must be projected to run dry to count as needing a refill
+REFILL_DUE_WITHIN_DAYS = float(os.getenv("REFILL_DUE_WITHIN_DAYS", "3"))
+
+@app.get("/api/dispensers/refill-due")
+async def get_refill_due(request: Request, within_days: float = REFILL_DUE_WITHIN_DAYS, client_id: str = None):
+    """Machines projected to run out within within_days, soonest first
+
+    Served from the in-memory refill-due index rather than computing usage
+    for the whole fleet.
+    """
+    client_id = client_scope(request) or client_id
+    if within_days < 0:
+        raise HTTPException(status_code=400, detail="within_days must not be negative")
+    return await run_in_db_pool(refill_index.due_within, within_days * 86400, client_id=client_id)
 
 @app.get("/api/dispensers/{dispenser_id}")
-async def get_dispenser(dispenser_id: str):
+async def get_dispenser(dispenser_id: str, request: Request):
     """Get a specific dispenser - checks templates, instances, and client_machines (backward compatibility)"""
-    # Check templates first
-    templates = load_machine_templates()
-    for template in templates:
-        if template.get("id") == dispenser_id:
-            # Convert to dispenser format
-            return {
-                "id": template.get("id"),
-                "name": template.get("name"),
-                "sku": template.get("sku"),
-                "location": "",
-                "client_id": None,
-                "current_schedule_id": None,
-                "refill_capacity_ml": template.get("refill_capacity_ml"),
-                "current_level_ml": 0,
-                "last_refill_date": None,
-                "installation_date": None,
-                "fragrance_code": None,
-                "ml_per_hour": template.get("ml_per_hour"),
-                "unique_code": template.get("sku"),
-                "status": None
-            }
+    scope = client_scope(request)
+    if scope:
+        # Clients only see their own machine instances
+        instance = await get_machine_instance_by_id(dispenser_id)
+        if not instance or instance.get("client_id") != scope:
+            raise HTTPException(status_code=404, detail="Dispenser not found")
+        return instance
     
-    # Check instances
-    instances = load_machine_instances()
-    for instance in instances:
-        if instance.get("id") == dispenser_id:
-            return instance
+    # Check templates first
+    template = await get_machine_template_by_id(dispenser_id)
+    if template:
+        # Convert to dispenser format
+        return {
+            "id": template.get("id"),
+            "name": template.get("name"),
+            "sku": template.get("sku"),
+            "location": "",
+            "client_id": None,
+            "current_schedule_id": None,
+            "refill_capacity_ml": template.get("refill_capacity_ml"),
+            "current_level_ml": 0,
+            "last_refill_date": None,
+            "installation_date": None,
+            "fragrance_code": None,
+            "ml_per_hour": template.get("ml_per_hour"),
+            "unique_code": template.get("sku"),
+            "status": None
+        }
     
-    # Check assigned machines
-    client_machines_data = load_client_machines()
-    for instance in client_machines_data.get("client_machines", []):
-        if instance.get("id") == dispenser_id:
-            return instance
+    # Check installed and assigned machine instances
+    instance = await get_machine_instance_by_id(dispenser_id)
+    if instance:
+        return instance
     
     raise HTTPException(status_code=404, detail="Dispenser not found")
 
@@ -1039,10 +1262,6 @@ async def get_dispenser(dispenser_id: str):
 async def create_dispenser(dispenser: Dispenser):
     """Create a dispenser - routes to templates or instances based on client_id (backward compatibility)
     If no client_id, creates template. If client_id exists, creates instance."""
-    instances = load_machine_instances()
-    templates = load_machine_templates()
-    client_machines_data = load_client_machines()
-    
     # Convert to dict
     try:
         if hasattr(dispenser, 'model_dump'):
@@ -1059,12 +1278,11 @@ async def create_dispenser(dispenser: Dispenser):
     if not has_client:
         # It's a template - create in machine_templates
         # Check for duplicate SKU
-        for existing in templates:
-            if existing.get("sku") == dispenser.sku:
-                raise HTTPException(
-                    status_code=400,
-                    detail=f"SKU '{dispenser.sku}' already exists. SKU must be unique."
-                )
+        if await get_machine_template_by_sku(dispenser.sku):
+            raise HTTPException(
+                status_code=400,
+                detail=f"SKU '{dispenser.sku}' already exists. SKU must be unique."
+            )
         
         template_dict = {
             "id": f"template_{dispenser.sku.replace(' ', '_').replace('-', '_').upper()}",
@@ -1074,27 +1292,23 @@ async def create_dispenser(dispenser: Dispenser):
             "ml_per_hour": dispenser.ml_per_hour,
             "description": None
         }
-        templates.append(template_dict)
-        save_machine_templates(templates)
+        await insert_machine_template(template_dict)
         return dispenser_dict  # Return original format for backward compatibility
     else:
         # It's an instance - create in machine_instances
         # Check for duplicate unique_code
-        all_instances = instances + client_machines_data.get("client_machines", [])
-        for existing in all_instances:
-            if existing.get("unique_code") == dispenser.unique_code:
-                raise HTTPException(
-                    status_code=400, 
-                    detail=f"Code '{dispenser.unique_code}' already exists. Code must be unique."
-                )
+        if await get_machine_instance_by_code(dispenser.unique_code):
+            raise HTTPException(
+                status_code=400, 
+                detail=f"Code '{dispenser.unique_code}' already exists. Code must be unique."
+            )
     
         # Find template_id from SKU if not provided
         template_id = None
         if dispenser.sku:
-            for template in templates:
-                if template.get("sku") == dispenser.sku:
-                    template_id = template.get("id")
-                    break
+            template = await get_machine_template_by_sku(dispenser.sku)
+            if template:
+                template_id = template.get("id")
         
         instance_dict = {
             "id": dispenser.id,
@@ -1113,42 +1327,35 @@ async def create_dispenser(dispenser: Dispenser):
             "status": dispenser_dict.get("status", "installed")
         }
         
-        # Route based on status
-        status = instance_dict.get("status", "installed")
-        if status == "assigned":
-            if "client_machines" not in client_machines_data:
-                client_machines_data["client_machines"] = []
-            client_machines_data["client_machines"].append(instance_dict)
-            save_client_machines(client_machines_data)
-        else:
-            instances.append(instance_dict)
-            save_machine_instances(instances)
+        # Assigned and installed machines live in the same table, distinguished by status
+        await insert_machine_instance(instance_dict)
+        await run_in_db_pool(refill_index.upsert_machine, instance_dict)
         
         return dispenser_dict  # Return original format for backward compatibility
 
 @app.put("/api/dispensers/{dispenser_id}")
 async def update_dispenser(dispenser_id: str, dispenser: Dispenser):
     """Update a dispenser - routes to templates or instances based on type (backward compatibility)"""
-    templates = load_machine_templates()
-    instances = load_machine_instances()
-    client_machines_data = load_client_machines()
+    # Convert to dict
+    try:
+        if hasattr(dispenser, 'model_dump'):
+            dispenser_dict = dispenser.model_dump(exclude_none=False)
+        else:
+            dispenser_dict = dispenser.dict(exclude_none=False)
+    except:
+        dispenser_dict = dispenser.dict(exclude_none=False)
+    dispenser_dict["id"] = dispenser_id
     
     # Check if it's a template first
-    template_index = None
-    for i, t in enumerate(templates):
-        if t.get("id") == dispenser_id:
-            template_index = i
-            break
-    
-    if template_index is not None:
+    if await get_machine_template_by_id(dispenser_id):
         # It's a template - update it
         # Check for duplicate SKU
-        for existing in templates:
-            if existing.get("sku") == dispenser.sku and existing.get("id") != dispenser_id:
-                raise HTTPException(
-                    status_code=400,
-                    detail=f"SKU '{dispenser.sku}' already exists. SKU must be unique."
-                )
+        existing = await get_machine_template_by_sku(dispenser.sku)
+        if existing and existing.get("id") != dispenser_id:
+            raise HTTPException(
+                status_code=400,
+                detail=f"SKU '{dispenser.sku}' already exists. SKU must be unique."
+            )
         
         template_dict = {
             "id": dispenser_id,
@@ -1158,71 +1365,15 @@ async def update_dispenser(dispenser_id: str, dispenser: Dispenser):
             "ml_per_hour": dispenser.ml_per_hour,
             "description": None
         }
-        templates[template_index] = template_dict
-        save_machine_templates(templates)
+        await patch_machine_template(dispenser_id, template_dict)
         return dispenser_dict  # Return original format
     
-    # It's an instance - find it
-    instance_index = None
-    in_client_machines = False
-    
-    # Check client_machines first
-    for i, inst in enumerate(client_machines_data.get("client_machines", [])):
-        if inst.get("id") == dispenser_id:
-            instance_index = i
-            in_client_machines = True
-            break
-    
-    # Check instances if not found
-    if instance_index is None:
-        for i, inst in enumerate(instances):
-            if inst.get("id") == dispenser_id:
-                instance_index = i
-                break
-    
-    if instance_index is None:
-        raise HTTPException(status_code=404, detail="Dispenser not found")
-    
-    # Check for duplicate unique_code (excluding current instance)
-    all_instances = instances + client_machines_data.get("client_machines", [])
-    for existing in all_instances:
-        if existing.get("unique_code") == dispenser.unique_code and existing.get("id") != dispenser_id:
-            raise HTTPException(
-                status_code=400, 
-                detail=f"Code '{dispenser.unique_code}' already exists. Code must be unique."
-            )
-    
-    # Convert to dict
-    try:
-        if hasattr(dispenser, 'model_dump'):
-            dispenser_dict = dispenser.model_dump(exclude_none=False)
-        else:
-            dispenser_dict = dispenser.dict(exclude_none=False)
-    except:
-        dispenser_dict = dispenser.dict(exclude_none=False)
-    dispenser_dict["id"] = dispenser_id
-    
-    # Prevent changing client_id
-    original_instance = None
-    if in_client_machines:
-        original_instance = client_machines_data.get("client_machines", [])[instance_index]
-    else:
-        original_instance = instances[instance_index]
-    
-    if original_instance and original_instance.get("client_id"):
-        if dispenser_dict.get("client_id") and dispenser_dict.get("client_id") != original_instance.get("client_id"):
-            raise HTTPException(
-                status_code=400,
-                detail=f"Cannot change machine's client. Machine belongs to client '{original_instance.get('client_id')}'."
-            )
-    
     # Find template_id from SKU
     template_id = None
     if dispenser.sku:
-        for template in templates:
-            if template.get("sku") == dispenser.sku:
-                template_id = template.get("id")
-                break
+        template = await get_machine_template_by_sku(dispenser.sku)
+        if template:
+            template_id = template.get("id")
     
     instance_dict = {
         "id": dispenser_id,
@@ -1241,45 +1392,52 @@ async def update_dispenser(dispenser_id: str, dispenser: Dispenser):
         "status": dispenser_dict.get("status", "installed")
     }
     
-    # Handle status changes
-    new_status = instance_dict.get("status", "installed")
-    was_assigned = in_client_machines
-    will_be_assigned = new_status == "assigned"
-    
-    if was_assigned and not will_be_assigned:
-        client_machines_data["client_machines"].pop(instance_index)
-        save_client_machines(client_machines_data)
-        instances.append(instance_dict)
-        save_machine_instances(instances)
-    elif not was_assigned and will_be_assigned:
-        instances.pop(instance_index)
-        save_machine_instances(instances)
-        if "client_machines" not in client_machines_data:
-            client_machines_data["client_machines"] = []
-        client_machines_data["client_machines"].append(instance_dict)
-        save_client_machines(client_machines_data)
+    for _ in range(WRITE_CONFLICT_ATTEMPTS):
+        # It's an instance - find it
+        original_instance = await get_machine_instance_by_id(dispenser_id)
+        if original_instance is None:
+            raise HTTPException(status_code=404, detail="Dispenser not found")
+        
+        # Check for duplicate unique_code (excluding current instance)
+        existing = await get_machine_instance_by_code(dispenser.unique_code)
+        if existing and existing.get("id") != dispenser_id:
+            raise HTTPException(
+                status_code=400, 
+                detail=f"Code '{dispenser.unique_code}' already exists. Code must be unique."
+            )
+        
+        # Prevent changing client_id
+        if original_instance.get("client_id"):
+            if dispenser_dict.get("client_id") and dispenser_dict.get("client_id") != original_instance.get("client_id"):
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"Cannot change machine's client. Machine belongs to client '{original_instance.get('client_id')}'."
+                )
+        
+        # Status changes (assigned <-> installed) are just a column update on the same row.
+        # Only write if the machine wasn't given to a client since the check above
+        changes = dict(instance_dict)
+        expected = {"client_id": original_instance.get("client_id"), **guard_refill_columns(changes, original_instance)}
+        try:
+            row = await patch_machine_instance_if(dispenser_id, expected, changes)
+            break
+        except WriteConflictError:
+            continue
     else:
-        if in_client_machines:
-            client_machines_data["client_machines"][instance_index] = instance_dict
-            save_client_machines(client_machines_data)
-        else:
-            instances[instance_index] = instance_dict
-            save_machine_instances(instances)
+        raise HTTPException(status_code=409, detail="Dispenser was modified concurrently, please retry")
+    await run_in_db_pool(refill_index.upsert_machine, row)
     
-    return dispenser_dict  # Return original format for backward compatibility
+    # Original format for backward compatibility, with the level the machine really has
+    return {**dispenser_dict, **{column: row.get(column) for column in REFILL_COLUMNS}}
 
 @app.delete("/api/dispensers/{dispenser_id}")
 async def delete_dispenser(dispenser_id: str):
     """Delete a machine/dispenser - routes to templates or instances (backward compatibility)"""
     try:
-        templates = load_machine_templates()
-        instances = load_machine_instances()
-        client_machines_data = load_client_machines()
-        
         # Check if it's a template
-        template_found = any(t.get("id") == dispenser_id for t in templates)
-        if template_found:
+        if await get_machine_template_by_id(dispenser_id):
             # Check if any instances use this template
+            instances = await load_machine_instances()
             instances_using_template = [i for i in instances if i.get("template_id") == dispenser_id]
             if instances_using_template:
                 raise HTTPException(
@@ -1287,30 +1445,20 @@ async def delete_dispenser(dispenser_id: str):
                     detail=f"Cannot delete template. {len(instances_using_template)} machine instance(s) are using this template."
                 )
             # Delete from Supabase
-            delete_machine_template(dispenser_id)
-            return {"message": "Dispenser deleted successfully"}
-        
-        # Check and remove from client_machines
-        client_machines = client_machines_data.get("client_machines", [])
-        found_in_client_machines = any(i.get("id") == dispenser_id for i in client_machines)
-        
-        if found_in_client_machines:
-            # Delete from Supabase (client_machines are just instances with status="assigned")
-            delete_machine_instance(dispenser_id)
-            # Also delete associated refill logs
-            delete_refill_logs_by_dispenser(dispenser_id)
+            await delete_machine_template(dispenser_id)
             return {"message": "Dispenser deleted successfully"}
         
-        # Check and remove from instances
-        instance_found = any(i.get("id") == dispenser_id for i in instances)
-        if not instance_found:
+        # Check installed and assigned machine instances
+        if not await get_machine_instance_by_id(dispenser_id):
             raise HTTPException(status_code=404, detail="Dispenser not found")
         
         # Delete from Supabase
-        delete_machine_instance(dispenser_id)
+        await delete_machine_instance(dispenser_id)
+        refill_index.remove_machine(dispenser_id)
         
         # Remove associated refill logs
-        delete_refill_logs_by_dispenser(dispenser_id)
+        await delete_refill_logs_by_dispenser(dispenser_id)
+        technician_stats.remove_refills_for_dispenser(dispenser_id)
         
         return {"message": "Dispenser deleted successfully"}
     except HTTPException:
@@ -1327,138 +1475,112 @@ async def assign_schedule(dispenser_id: str, body: dict):
     if schedule_id == "":
         schedule_id = None
     
-    instances = load_machine_instances()
-    client_machines_data = load_client_machines()
-    
-    # Check client_machines first
-    for i, inst in enumerate(client_machines_data.get("client_machines", [])):
-        if inst.get("id") == dispenser_id:
-            client_machines_data["client_machines"][i]["current_schedule_id"] = schedule_id
-            save_client_machines(client_machines_data)
-            return client_machines_data["client_machines"][i]
-    
-    # Check instances
-    for i, inst in enumerate(instances):
-        if inst.get("id") == dispenser_id:
-            instances[i]["current_schedule_id"] = schedule_id
-            save_machine_instances(instances)
-            return instances[i]
-    
-    raise HTTPException(status_code=404, detail="Machine instance not found")
+    for _ in range(WRITE_CONFLICT_ATTEMPTS):
+        inst = await get_machine_instance_by_id(dispenser_id)
+        if inst is None:
+            raise HTTPException(status_code=404, detail="Machine instance not found")
+        
+        # Only write if no other change landed since the read, so the row
+        # returned and indexed below is the machine as it is now
+        expected = {"current_schedule_id": inst.get("current_schedule_id"), "last_refill_date": inst.get("last_refill_date")}
+        try:
+            inst = await patch_machine_instance_if(dispenser_id, expected, {"current_schedule_id": schedule_id})
+            break
+        except WriteConflictError:
+            continue
+    else:
+        raise HTTPException(status_code=409, detail="Machine instance was modified concurrently, please retry")
+    await run_in_db_pool(refill_index.upsert_machine, inst)
+    return inst
+
+def safe_float(value):
+    """Convert value to float, handling strings, integers, and None (anything unparsable is 0.0)"""
+    if value is None:
+        return 0.0
+    if isinstance(value, str):
+        try:
+            # Remove any whitespace and convert
+            cleaned = value.strip()
+            return float(cleaned) if cleaned else 0.0
+        except (ValueError, TypeError):
+            return 0.0
+    if isinstance(value, (int, float)):
+        return float(value)
+    return 0.0
 
 @app.post("/api/dispensers/{dispenser_id}/refill")
 async def log_refill(dispenser_id: str, refill: RefillLog):
     """Log a refill - works with machine instances only (backward compatibility)"""
-    instances = load_machine_instances()
-    client_machines_data = load_client_machines()
-    
-    # Find instance in both files
-    dispenser = None
-    in_client_machines = False
-    dispenser_index = None
-    
-    # Check client_machines first
-    for i, inst in enumerate(client_machines_data.get("client_machines", [])):
-        if inst.get("id") == dispenser_id:
-            dispenser = inst
-            in_client_machines = True
-            dispenser_index = i
+    for _ in range(WRITE_CONFLICT_ATTEMPTS):
+        # Find the installed or assigned machine instance
+        dispenser = await get_machine_instance_by_id(dispenser_id)
+        if not dispenser:
+            raise HTTPException(status_code=404, detail="Dispenser not found")
+        
+        # Get current level and capacity with type safety
+        refill_capacity = safe_float(dispenser.get("refill_capacity_ml", 0))
+        refill_amount = safe_float(refill.refill_amount_ml)  # This is "adding_ml_refill"
+        
+        # Use level_before_refill from request if provided (even if 0), otherwise use current_level_ml
+        # This ensures we capture the actual level before refill from frontend calculation
+        if refill.level_before_refill is not None:
+            level_before_refill = safe_float(refill.level_before_refill)
+            # Ensure it's not negative
+            if level_before_refill < 0:
+                level_before_refill = 0.0
+        else:
+            # Use stored current_level_ml as fallback only if not provided in request
+            level_before_refill = safe_float(dispenser.get("current_level_ml", 0))
+        
+        # Ensure level_before_refill is valid (not None)
+        if level_before_refill is None:
+            level_before_refill = safe_float(dispenser.get("current_level_ml", 0))
+        
+        # Calculate new level: level_before_refill + refill_amount (capped at capacity)
+        # This is the "current_ml_refill" - level after adding the refill
+        new_level = min(level_before_refill + refill_amount, refill_capacity)
+        
+        # Use current_ml_refill from request if provided (even if 0), otherwise calculate it
+        if refill.current_ml_refill is not None:
+            current_ml_refill = safe_float(refill.current_ml_refill)
+            # Ensure it's not negative
+            if current_ml_refill < 0:
+                current_ml_refill = 0.0
+        else:
+            # Calculate it if not provided
+            current_ml_refill = new_level
+        
+        # Ensure current_ml_refill is valid (not None)
+        if current_ml_refill is None:
+            current_ml_refill = new_level
+        
+        # Update instance level using current_ml_refill (ensure it's stored as float, not string)
+        # This ensures we use the calculated value from frontend which uses level_before_refill
+        level_update = {
+            "current_level_ml": float(current_ml_refill),
+            "last_refill_date": refill.timestamp
+        }
+        # When the level before the refill came from the stored row, only write if no
+        # other refill has landed meanwhile (every refill moves last_refill_date)
+        expected = {} if refill.level_before_refill is not None else {"last_refill_date": dispenser.get("last_refill_date")}
+        try:
+            await patch_machine_instance_if(dispenser_id, expected, level_update)
             break
-    
-    # Check instances if not found
-    if not dispenser:
-        for i, inst in enumerate(instances):
-            if inst.get("id") == dispenser_id:
-                dispenser = inst
-                dispenser_index = i
-                break
-    
-    if not dispenser:
-        raise HTTPException(status_code=404, detail="Dispenser not found")
-    
-    # Helper function to convert to float safely (handles strings, ints, floats, None)
-    def safe_float(value):
-        """Convert value to float, handling strings, integers, and None"""
-        if value is None:
-            return 0.0
-        if isinstance(value, str):
-            try:
-                # Remove any whitespace and convert
-                cleaned = value.strip()
-                return float(cleaned) if cleaned else 0.0
-            except (ValueError, TypeError):
-                return 0.0
-        if isinstance(value, (int, float)):
-            return float(value)
-        return 0.0
-    
-    # Get current level and capacity with type safety
-    refill_capacity = safe_float(dispenser.get("refill_capacity_ml", 0))
-    refill_amount = safe_float(refill.refill_amount_ml)  # This is "adding_ml_refill"
-    
-    # Use level_before_refill from request if provided (even if 0), otherwise use current_level_ml
-    # This ensures we capture the actual level before refill from frontend calculation
-    if refill.level_before_refill is not None:
-        level_before_refill = safe_float(refill.level_before_refill)
-        # Ensure it's not negative
-        if level_before_refill < 0:
-            level_before_refill = 0.0
-    else:
-        # Use stored current_level_ml as fallback only if not provided in request
-        level_before_refill = safe_float(dispenser.get("current_level_ml", 0))
-    
-    # Ensure level_before_refill is valid (not None)
-    if level_before_refill is None:
-        level_before_refill = safe_float(dispenser.get("current_level_ml", 0))
-    
-    # Calculate new level: level_before_refill + refill_amount (capped at capacity)
-    # This is the "current_ml_refill" - level after adding the refill
-    new_level = min(level_before_refill + refill_amount, refill_capacity)
-    
-    # Use current_ml_refill from request if provided (even if 0), otherwise calculate it
-    if refill.current_ml_refill is not None:
-        current_ml_refill = safe_float(refill.current_ml_refill)
-        # Ensure it's not negative
-        if current_ml_refill < 0:
-            current_ml_refill = 0.0
-    else:
-        # Calculate it if not provided
-        current_ml_refill = new_level
-    
-    # Ensure current_ml_refill is valid (not None)
-    if current_ml_refill is None:
-        current_ml_refill = new_level
-    
-    # Log for debugging (can be removed in production)
-    print(f"Refill Calculation: dispenser_id={dispenser_id}")
-    print(f"  - Received level_before_refill from request: {refill.level_before_refill}")
-    print(f"  - Received current_ml_refill from request: {refill.current_ml_refill}")
-    print(f"  - Calculated level_before_refill: {level_before_refill}")
-    print(f"  - Calculated current_ml_refill: {current_ml_refill}")
-    print(f"  - Adding ml refill: {refill_amount}, capacity: {refill_capacity}")
-    
-    # Update instance level using current_ml_refill (ensure it's stored as float, not string)
-    # This ensures we use the calculated value from frontend which uses level_before_refill
-    if in_client_machines:
-        client_machines_data["client_machines"][dispenser_index]["current_level_ml"] = float(current_ml_refill)
-        client_machines_data["client_machines"][dispenser_index]["last_refill_date"] = refill.timestamp
-        save_client_machines(client_machines_data)
+        except WriteConflictError:
+            continue
     else:
-        instances[dispenser_index]["current_level_ml"] = float(current_ml_refill)
-        instances[dispenser_index]["last_refill_date"] = refill.timestamp
-        save_machine_instances(instances)
+        raise HTTPException(status_code=409, detail="Dispenser was modified concurrently, please retry")
+    await run_in_db_pool(refill_index.upsert_machine, {**dispenser, **level_update})
     
     # Count number of refills done for this machine (number_of_refills_done)
-    existing_refills = load_refill_logs()
-    refills_for_machine = [r for r in existing_refills if r.get("dispenser_id") == dispenser_id]
-    number_of_refills_done = len(refills_for_machine) + 1  # +1 for this refill
+    # A head-only count query on dispenser_id - no refill rows are transferred
+    number_of_refills_done = await count_refill_logs(dispenser_id) + 1  # +1 for this refill
     
-    # Generate unique refill ID using timestamp and counter for better organization
-    # Format: refill_YYYYMMDD_HHMMSS_dispenserID_last6chars_counter
+    # Generate unique refill ID using timestamp and the machine's refill counter
+    # Format: refill_YYYYMMDD_HHMMSS_micro_dispenserID_last6chars_counter
     timestamp_now = datetime.now(timezone.utc)
-    existing_refills_count = len(existing_refills)
     # Use microsecond for better uniqueness
-    refill_id = f"refill_{timestamp_now.strftime('%Y%m%d_%H%M%S_%f')}_{dispenser_id[-6:]}_{existing_refills_count + 1}"
+    refill_id = f"refill_{timestamp_now.strftime('%Y%m%d_%H%M%S_%f')}_{dispenser_id[-6:]}_{number_of_refills_done}"
     
     # Get machine details for refill log
     machine_unique_code = dispenser.get("unique_code")
@@ -1474,7 +1596,6 @@ async def log_refill(dispenser_id: str, refill: RefillLog):
     fragrance_code_value = refill.fragrance_code
     if not fragrance_code_value and refill.notes:
         # Try to extract from notes format: "Fragrance Code: XXX"
-        import re
         match = re.search(r'Fragrance Code:\s*([^\n]+)', refill.notes)
         if match:
             fragrance_code_value = match.group(1).strip()
@@ -1504,77 +1625,262 @@ async def log_refill(dispenser_id: str, refill: RefillLog):
     if "current_ml_refill" not in refill_dict:
         refill_dict["current_ml_refill"] = float(new_level)
     
-    # Debug: Print what we're storing
-    print(f"Storing refill log:")
-    print(f"  - level_before_refill: {refill_dict.get('level_before_refill')} (type: {type(refill_dict.get('level_before_refill'))})")
-    print(f"  - current_ml_refill: {refill_dict.get('current_ml_refill')} (type: {type(refill_dict.get('current_ml_refill'))})")
-    print(f"  - refill_amount_ml: {refill_dict.get('refill_amount_ml')}")
-    print(f"  - fragrance_code: {refill_dict.get('fragrance_code')}")
-    print(f"  - number_of_refills_done: {refill_dict.get('number_of_refills_done')}")
-    print(f"  - Full refill_dict keys: {list(refill_dict.keys())}")
-    print(f"  - Full refill_dict: {refill_dict}")
+    logger.debug(
+        "Storing refill log for %s: level_before_refill=%s current_ml_refill=%s refill_amount_ml=%s number_of_refills_done=%s",
+        dispenser_id, refill_dict.get("level_before_refill"), refill_dict.get("current_ml_refill"),
+        refill_dict.get("refill_amount_ml"), refill_dict.get("number_of_refills_done"),
+    )
     
-    existing_refills.append(refill_dict)
-    save_refill_logs(existing_refills)
+    await insert_refill_log(refill_dict)
+    technician_stats.add_refill(refill_dict)
     
     return refill_dict
 
+REFILL_LOGS_MAX_PAGE_SIZE = 1000
+
+def _encode_cursor(key) -> str:
+    """Opaque next-page token for a (timestamp, id) keyset position"""
+    return base64.urlsafe_b64encode(json.dumps(list(key)).encode()).decode().rstrip("=")
+
+def _decode_cursor(cursor: str):
+    try:
+        timestamp, row_id = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode())
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if not isinstance(row_id, str) or not (timestamp is None or isinstance(timestamp, str)):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return timestamp, row_id
+
 @app.get("/api/refill-logs")
-async def get_refill_logs(request: Request):
-    """Get refill logs - admins/developers see all, technicians see only their own"""
+async def get_refill_logs(request: Request, response: Response, start_date: str = None, end_date: str = None,
+                          dispenser_id: str = None, client_id: str = None,
+                          technician_username: str = None, fragrance_code: str = None,
+                          limit: int = None, cursor: str = None, include_total: bool = False):
+    """Get refill logs - admins/developers see all, technicians see only their own
+
+    With limit (and cursor for later pages) the response is one page,
+    {"items", "next_cursor", "total"}, ordered by (timestamp, id) newest
+    first. Without them the response is a plain array of at most
+    REFILL_LOGS_MAX_PAGE_SIZE logs, newest first; when more match, the
+    X-Next-Cursor header continues from there. Filters and paging are
+    applied by the database query.
+    """
     user = getattr(request.state, "user", None)
     if not user:
         raise HTTPException(status_code=401, detail="Unauthorized")
     
-    refill_logs = load_refill_logs()
+    if (start_date and to_epoch_us(start_date) is None) or (end_date and to_epoch_us(end_date) is None):
+        raise HTTPException(status_code=400, detail="start_date and end_date must be ISO timestamps")
     
     # If user is technician, filter to only their own logs
     if user.get("role") == "technician":
         technician_username = user.get("username", "")
-        technician_normalized = str(technician_username).strip() if technician_username else ""
-        refill_logs = [
-            log for log in refill_logs
-            if str(log.get("technician_username") or "").strip() == technician_normalized
-        ]
+        if not str(technician_username or "").strip():
+            return {"items": [], "next_cursor": None, "total": 0} if limit is not None or cursor is not None else []
+    # Clients see only logs for their own machines
+    client_id = client_scope(request) or client_id
     # Admin and developer can see all logs
-    
-    return refill_logs
+    technician_normalized = str(technician_username).strip() if technician_username else None
+    
+    paged = limit is not None or cursor is not None
+    if paged:
+        if limit is None:
+            limit = 100
+        if limit < 1 or limit > REFILL_LOGS_MAX_PAGE_SIZE:
+            raise HTTPException(status_code=400, detail=f"limit must be between 1 and {REFILL_LOGS_MAX_PAGE_SIZE}")
+    
+    rows, next_key, total = await load_refill_logs_page(
+        limit=limit if paged else REFILL_LOGS_MAX_PAGE_SIZE,
+        after=_decode_cursor(cursor) if cursor else None,
+        dispenser_id=dispenser_id or None,
+        client_id=client_id or None,
+        technician_username=technician_normalized,
+        fragrance_code=fragrance_code or None,
+        start=start_date or None,
+        end=end_date or None,
+        include_total=include_total and paged,
+    )
+    if not paged:
+        if next_key:
+            response.headers["X-Next-Cursor"] = _encode_cursor(next_key)
+        return rows
+    return {
+        "items": rows,
+        "next_cursor": _encode_cursor(next_key) if next_key else None,
+        "total": total,
+    }
 
 @app.get("/api/clients")
 async def get_clients(request: Request):
     """Get all clients - exclude hashed password, but include plain password for admins"""
     user = getattr(request.state, "user", None)
-    clients = load_clients()
+    scope = client_scope(request)
+    if scope:
+        # Clients only see their own record
+        client = await get_client_by_id(scope)
+        return conditional_json(request, [{k: v for k, v in client.items() if k not in ['password', 'password_plain']}] if client else [])
+    clients = await load_clients()
     
     # For admins/developers, include password_plain for client management
     # For others, exclude both password fields
     if user and user.get("role") in ["admin", "developer"]:
         # Admins can see plain passwords for client management
-        return [{k: v for k, v in client.items() if k != 'password'} for client in clients]
+        return conditional_json(request, [{k: v for k, v in client.items() if k != 'password'} for client in clients])
     else:
         # Others cannot see any password information
-        return [{k: v for k, v in client.items() if k not in ['password', 'password_plain']} for client in clients]
+        return conditional_json(request, [{k: v for k, v in client.items() if k not in ['password', 'password_plain']} for client in clients])
 
 @app.get("/api/clients/{client_id}")
 async def get_client(client_id: str, request: Request):
     """Get a specific client - exclude password field for security, but include plain password for admins"""
     user = getattr(request.state, "user", None)
-    clients = load_clients()
-    for client in clients:
-        if client["id"] == client_id:
-            # For admins/developers, include password_plain for client management
-            # For others, exclude both password fields
-            if user and user.get("role") in ["admin", "developer"]:
-                # Admins can see plain passwords for client management
-                return {k: v for k, v in client.items() if k != 'password'}
-            else:
-                # Others cannot see any password information
-                return {k: v for k, v in client.items() if k not in ['password', 'password_plain']}
-    raise HTTPException(status_code=404, detail="Client not found")
+    scope = client_scope(request)
+    client = await get_client_by_id(client_id) if not scope or scope == client_id else None
+    if not client:
+        raise HTTPException(status_code=404, detail="Client not found")
+    # For admins/developers, include password_plain for client management
+    # For others, exclude both password fields
+    if user and user.get("role") in ["admin", "developer"]:
+        # Admins can see plain passwords for client management
+        return {k: v for k, v in client.items() if k != 'password'}
+    else:
+        # Others cannot see any password information
+        return {k: v for k, v in client.items() if k not in ['password', 'password_plain']}
+
+async def load_usage_schedules(schedule_ids) -> dict:
+    """Compiled schedules for usage calculations, keyed by schedule id
+    
+    A schedule that compiles with neither time ranges nor intervals is
+    reloaded bypassing the cache, and if it still has no time ranges they
+    are queried directly, also under the "_"/"-" spellings of its id.
+    Every usage endpoint goes through here so they all see the same schedules.
+    """
+    schedule_ids = [sid for sid in dict.fromkeys(schedule_ids) if sid]
+    if not schedule_ids:
+        return {}
+    compiled = await load_compiled_schedules(schedule_ids=schedule_ids)
+    
+    empty_ids = [sid for sid, sch in compiled.items() if not sch.is_time_based and sch.interval_count == 0]
+    if not empty_ids:
+        return compiled
+    try:
+        # Bypass the cache and reload these schedules
+        reloaded = {sch.get("id"): sch for sch in await load_schedules(force_refresh=True, schedule_ids=empty_ids)}
+        for schedule_id in empty_ids:
+            schedule = reloaded.get(schedule_id, {"id": schedule_id})
+            if not schedule.get("time_ranges"):
+                # Try with different schedule_id formats
+                for variant in dict.fromkeys([schedule_id, schedule_id.replace("_", "-"), schedule_id.replace("-", "_")]):
+                    time_ranges = await load_schedule_time_ranges(variant)
+                    if time_ranges:
+                        schedule["time_ranges"] = time_ranges
+                        break
+            compiled[schedule_id] = compile_schedule(schedule)
+    except Exception as e:
+        print(f"Error reloading empty schedules {empty_ids}: {e}")
+    return compiled
+
+async def calculate_machines_usage(machines: list) -> dict:
+    """Usage of each machine, {machine_id: usage}, in the usage-calculation endpoints' shape
+    
+    The one usage path behind the single-machine, batch, dashboard and
+    workload endpoints: the machines' schedules are loaded once through
+    load_usage_schedules and the vectorized engine runs over all machines.
+    Machines without a (known) schedule get zero usage; machines on a
+    schedule that can't be used get zero usage and an "error" message.
+    """
+    schedules = await load_usage_schedules(m.get("current_schedule_id") for m in machines)
+    return calculate_fleet_usage(machines, schedules.values())
+
+CLIENT_DASHBOARD_RECENT_REFILLS = 50
+
+def project_level(machine: dict, usage: dict):
+    """Estimated current level of a machine and its percentage of capacity
+    
+    Projects the stored level forward by the usage since the last refill
+    (usage is one entry of calculate_fleet_usage). The percentage is None
+    when the machine has no capacity.
+    """
+    capacity = safe_float(machine.get("refill_capacity_ml"))
+    level = safe_float(machine.get("current_level_ml"))
+    if usage and usage.get("usage_since_refill"):
+        # An empty stored level means the machine was filled to capacity at the last refill
+        level = max(0.0, (level if level > 0 else capacity) - usage["usage_since_refill"])
+    if capacity > 0:
+        level = min(level, capacity)
+    percent = level / capacity * 100 if capacity > 0 else None
+    return round(level, 2), round(percent, 1) if percent is not None else None
+
+@app.get("/api/clients/{client_id}/dashboard")
+async def get_client_dashboard(client_id: str, request: Request):
+    """Everything the client dashboard opens with, in one request
+    
+    Loads the client's machines, assignments, recent refill logs and this
+    month's refill count concurrently (each query filtered by client), then
+    computes the summary cards and per-machine usage from that one snapshot.
+    machines_needing_refill is the client's share of the refill-due index,
+    the same machines GET /api/dispensers/refill-due returns.
+    """
+    scope = client_scope(request)
+    if scope and scope != client_id:
+        raise HTTPException(status_code=404, detail="Client not found")
+    
+    now = datetime.now(timezone.utc)
+    month_start = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0).isoformat()
+    client, machines, (recent_logs, next_key, total_refills), refills_this_month, refill_due = await asyncio.gather(
+        get_client_by_id(client_id),
+        load_machine_instances_for_client(client_id),
+        load_refill_logs_page(limit=CLIENT_DASHBOARD_RECENT_REFILLS, client_id=client_id, include_total=True),
+        count_refill_logs(client_id=client_id, start=month_start),
+        run_in_db_pool(refill_index.due_within, REFILL_DUE_WITHIN_DAYS * 86400, client_id=client_id),
+    )
+    if not client:
+        raise HTTPException(status_code=404, detail="Client not found")
+    
+    machine_ids = [m.get("id") for m in machines]
+    assignments, usage = await asyncio.gather(
+        load_technician_assignments(dispenser_ids=machine_ids),
+        calculate_machines_usage(machines),
+    )
+    
+    # Project each machine's level forward by its usage since the last refill
+    for machine in machines:
+        machine_usage = usage.get(machine.get("id"))
+        if machine_usage is None:
+            continue
+        machine_usage["estimated_level_ml"], machine_usage["level_percent"] = project_level(machine, machine_usage)
+    
+    installed = [m for m in machines if m.get("status") == "installed"]
+    levels = [safe_float(m.get("current_level_ml")) for m in machines]
+    refill_dates = [(to_epoch_us(m.get("last_refill_date")), m.get("last_refill_date")) for m in machines]
+    refill_dates = [pair for pair in refill_dates if pair[0] is not None]
+    
+    return {
+        "client": {k: v for k, v in client.items() if k not in ['password', 'password_plain']},
+        "summary": {
+            "total_machines": len(machines),
+            "installed_machines": len(installed),
+            "active_machines": len(installed),
+            "machines_needing_refill": len(refill_due),
+            "upcoming_maintenance": sum(1 for a in assignments if a.get("status") in ("assigned", "pending")),
+        },
+        "quick_stats": {
+            "total_capacity_ml": round(sum(safe_float(m.get("refill_capacity_ml")) for m in machines), 2),
+            "average_level_ml": round(sum(levels) / len(levels), 2) if levels else None,
+            "last_refill_date": max(refill_dates)[1] if refill_dates else None,
+            "refills_this_month": refills_this_month or 0,
+            "total_refills": total_refills or 0,
+        },
+        "machines": machines,
+        "usage": {machine_id: usage.get(machine_id) for machine_id in machine_ids},
+        "assignments": assignments,
+        "recent_refill_logs": recent_logs,
+        "refill_logs_next_cursor": _encode_cursor(next_key) if next_key else None,
+    }
 
 @app.post("/api/clients")
 async def create_client(client: Client):
-    existing_clients = load_clients()
+    existing_clients = await load_clients()
     
     # Generate client ID: first 4 chars of name + first 4 chars of address + last 4 digits of phone
     def generate_client_id(name, address, phone):
@@ -1628,14 +1934,13 @@ async def create_client(client: Client):
     generated_password = ''.join(password_chars)
     
     # Hash the password before storing
-    hashed_password = hash_password(generated_password)
+    hashed_password = await hash_password_async(generated_password)
     
     client_dict = client.dict(exclude={'password', 'password_plain'})  # Exclude password fields from input
     client_dict["id"] = client_id
     client_dict["password"] = hashed_password  # Store hashed password
     client_dict["password_plain"] = generated_password  # Store plain password (for admin retrieval)
-    existing_clients.append(client_dict)
-    save_clients(existing_clients)
+    await insert_client(client_dict)
     
     # Return client with plain password for display (only on creation)
     response_dict = client_dict.copy()
@@ -1645,36 +1950,34 @@ async def create_client(client: Client):
 @app.put("/api/clients/{client_id}")
 async def update_client(client_id: str, client: Client):
     """Update a client - preserve password_plain if it exists"""
-    clients = load_clients()
-    for i, c in enumerate(clients):
-        if c["id"] == client_id:
-            # Preserve existing password_plain if updating other fields
-            existing_password_plain = c.get("password_plain")
-            existing_password_hash = c.get("password")
-            
-            client_dict = client.dict(exclude={'password', 'password_plain'})  # Exclude password fields from input
-            client_dict["id"] = client_id
-            
-            # Preserve existing password fields if not being updated
-            if existing_password_hash:
-                client_dict["password"] = existing_password_hash
-            if existing_password_plain:
-                client_dict["password_plain"] = existing_password_plain
-            
-            clients[i] = client_dict
-            save_clients(clients)
-            
-            # Return without hashed password for security
-            response_dict = {k: v for k, v in client_dict.items() if k != 'password'}
-            return response_dict
-    raise HTTPException(status_code=404, detail="Client not found")
+    c = await get_client_by_id(client_id)
+    if not c:
+        raise HTTPException(status_code=404, detail="Client not found")
+    
+    # Preserve existing password_plain if updating other fields
+    existing_password_plain = c.get("password_plain")
+    existing_password_hash = c.get("password")
+    
+    client_dict = client.dict(exclude={'password', 'password_plain'})  # Exclude password fields from input
+    client_dict["id"] = client_id
+    
+    # Preserve existing password fields if not being updated
+    if existing_password_hash:
+        client_dict["password"] = existing_password_hash
+    if existing_password_plain:
+        client_dict["password_plain"] = existing_password_plain
+    
+    await patch_client(client_id, client_dict)
+    
+    # Return without hashed password for security
+    response_dict = {k: v for k, v in client_dict.items() if k != 'password'}
+    return response_dict
 
 @app.delete("/api/clients/{client_id}")
 async def delete_client_endpoint(client_id: str):
     """Delete a client - checks machine instances for associated machines"""
-    instances = load_machine_instances()
-    client_machines_data = load_client_machines()
-    clients = load_clients()
+    instances = await load_machine_instances()
+    client_machines_data = await load_client_machines()
     
     # Check if any instances are using this client
     all_instances = instances + client_machines_data.get("client_machines", [])
@@ -1687,450 +1990,384 @@ async def delete_client_endpoint(client_id: str):
             raise HTTPException(status_code=400, detail="Cannot delete client with associated dispensers")
     
     # Delete from Supabase
-    delete_client(client_id)
+    await delete_client(client_id)
     return {"message": "Client deleted"}
 
-def calculate_time_range_usage(time_ranges, ml_per_hour=None, days_of_week=None):
-    """Calculate daily usage from time ranges, accounting for days_of_week
-    
-    Args:
-        time_ranges: List of time range dicts with start_time, end_time, spray_seconds, pause_seconds
-        ml_per_hour: Optional ml per hour rate (if None, uses 0.1 ml per second default)
-        days_of_week: Optional list of day numbers (0=Monday, 6=Sunday). If None, runs every day.
+@app.post("/api/dispensers/usage-calculation")
+async def calculate_usage_batch(body: UsageCalculationRequest, request: Request):
+    """Calculate usage for many machines in one pass - loads instances and schedules once
     
-    Returns:
-        Average daily usage in ml (weekly usage / 7)
+    Scope with dispenser_ids, client_id and/or technician_username (machines with
+    pending assignments for that technician). With no scope, every installed or
+    assigned machine is included. Returns {dispenser_id: usage}; requested ids
+    that don't exist map to null. Client logins are always scoped to their own machines.
     """
-    import json
-    
-    # Parse days_of_week if it's a string (JSON) or already a list
-    active_days = None
-    if days_of_week is not None:
-        if isinstance(days_of_week, str):
-            try:
-                # Try parsing as JSON string (e.g., '["0","1","2"]')
-                parsed = json.loads(days_of_week)
-                # Convert string numbers to integers
-                active_days = [int(d) if isinstance(d, str) else d for d in parsed]
-            except (json.JSONDecodeError, ValueError):
-                # If parsing fails, try to extract numbers from string
-                try:
-                    # Handle cases like "[0,1,2]" or "0,1,2"
-                    cleaned = days_of_week.strip('[]"')
-                    active_days = [int(d.strip()) for d in cleaned.split(',') if d.strip().isdigit()]
-                except:
-                    active_days = None
-        elif isinstance(days_of_week, list):
-            # Already a list, convert string numbers to integers if needed
-            active_days = [int(d) if isinstance(d, str) else d for d in days_of_week]
-    
-    # If no days specified or parsing failed, assume all 7 days
-    if active_days is None or len(active_days) == 0:
-        active_days_count = 7
+    scope = client_scope(request)
+    if scope:
+        body.client_id = scope
+        machines = {m.get("id"): m for m in await load_machine_instances_for_client(scope)}
     else:
-        active_days_count = len(active_days)
-    
-    # Calculate usage per day (for one active day)
-    total_usage_per_day_ml = 0
-    total_run_time_hours_per_day = 0
-    
-    for time_range in time_ranges:
-        try:
-            # Parse start and end times
-            start_h, start_m = map(int, str(time_range.get("start_time", "00:00")).split(":"))
-            end_h, end_m = map(int, str(time_range.get("end_time", "23:59")).split(":"))
-            
-            start_minutes = start_h * 60 + start_m
-            end_minutes = end_h * 60 + end_m
-            
-            # Handle overnight ranges (e.g., 23:59 to 00:00)
-            if end_minutes < start_minutes:
-                end_minutes += 24 * 60
-            
-            duration_minutes = end_minutes - start_minutes
-            duration_seconds = duration_minutes * 60
-            
-            # Convert spray_seconds and pause_seconds to float (handle string/number)
-            spray_seconds = float(time_range.get("spray_seconds", 0))
-            pause_seconds = float(time_range.get("pause_seconds", 0))
-            
-            # Calculate cycles within this time range
-            cycle_duration = spray_seconds + pause_seconds
-            if cycle_duration == 0:
-                continue  # Skip invalid cycles
-            
-            cycles = duration_seconds / cycle_duration
-            
-            if ml_per_hour:
-                # Method 1: Use ml_per_hour rate
-                # Calculate total spray time in hours for this range
-                spray_time_seconds = cycles * spray_seconds
-                spray_time_hours = spray_time_seconds / 3600
-                total_run_time_hours_per_day += spray_time_hours
-            else:
-                # Method 2: Use default 0.1 ml per second
-                ML_PER_SECOND = 0.1
-                usage_per_cycle = spray_seconds * ML_PER_SECOND
-                total_usage_per_day_ml += usage_per_cycle * cycles
-        except (ValueError, KeyError, TypeError):
-            # Skip invalid time ranges and continue
-            continue
-    
-    # Calculate total usage per day
-    if ml_per_hour:
-        total_usage_per_day_ml = total_run_time_hours_per_day * ml_per_hour
-    
-    # Calculate weekly usage: usage per day * number of active days
-    weekly_usage_ml = total_usage_per_day_ml * active_days_count
-    
-    # Return average daily usage (weekly usage / 7)
-    average_daily_usage_ml = weekly_usage_ml / 7
+        instances = await load_machine_instances()
+        client_machines_data = await load_client_machines()
+        machines = {m.get("id"): m for m in client_machines_data.get("client_machines", []) + instances}
+    
+    ids = None
+    if body.dispenser_ids is not None:
+        ids = list(dict.fromkeys(body.dispenser_ids))
+    if body.technician_username:
+        technician_normalized = str(body.technician_username).strip()
+        assigned_ids = {
+            a.get("dispenser_id") for a in await load_technician_assignments(technician=technician_normalized, status="pending")
+        }
+        ids = [i for i in (ids if ids is not None else machines) if i in assigned_ids]
+    if ids is None:
+        ids = list(machines)
+    if body.client_id:
+        ids = [i for i in ids if machines.get(i, {}).get("client_id") == body.client_id]
     
-    return average_daily_usage_ml
+    usage = await calculate_machines_usage([machines[i] for i in ids if i in machines])
+    return {dispenser_id: usage.get(dispenser_id) for dispenser_id in ids}
 
 @app.get("/api/dispensers/{dispenser_id}/usage-calculation")
-async def calculate_usage(dispenser_id: str):
+async def calculate_usage(dispenser_id: str, request: Request):
     """Calculate daily usage based on assigned schedule - works with machine instances (backward compatibility)"""
-    instances = load_machine_instances()
-    client_machines_data = load_client_machines()
-    schedules = load_schedules()
-    
-    # Find instance in both files
-    dispenser = None
-    for inst in client_machines_data.get("client_machines", []):
-        if inst.get("id") == dispenser_id:
-            dispenser = inst
-            break
-    
-    if not dispenser:
-        for inst in instances:
-            if inst.get("id") == dispenser_id:
-                dispenser = inst
-                break
-    
-    if not dispenser:
+    # Find the installed or assigned machine instance
+    dispenser = await get_machine_instance_by_id(dispenser_id)
+    scope = client_scope(request)
+    if not dispenser or (scope and dispenser.get("client_id") != scope):
         raise HTTPException(status_code=404, detail="Dispenser not found")
     
-    if not dispenser.get("current_schedule_id"):
-        return {"daily_usage_ml": 0, "days_until_empty": None}
-    
-    # Find schedule
-    schedule = None
-    current_schedule_id = dispenser.get("current_schedule_id")
-    
-    for s in schedules:
-        if s.get("id") == current_schedule_id:
-            schedule = s
-            break
-    
-    if not schedule:
-        return {"daily_usage_ml": 0, "days_until_empty": None}
-    
-    # If time_ranges is empty, try to reload schedules with force_refresh
-    if not schedule.get("time_ranges") or len(schedule.get("time_ranges", [])) == 0:
-        try:
-            # Clear cache and reload schedules
-            clear_data_cache()
-            schedules = load_schedules(force_refresh=True)
-            
-            # Find the schedule again after reload
-            for s in schedules:
-                if s.get("id") == current_schedule_id:
-                    schedule = s
-                    break
-            
-            # If still empty, try direct query
-            if not schedule.get("time_ranges") or len(schedule.get("time_ranges", [])) == 0:
-                from supabase_service import supabase as supabase_client
-                direct_query = supabase_client.table("schedule_time_ranges").select("*").eq("schedule_id", schedule.get("id")).execute()
-                if direct_query.data:
-                    schedule["time_ranges"] = direct_query.data
-                else:
-                    # Try with different schedule_id formats
-                    schedule_id_variants = [
-                        schedule.get("id"),
-                        schedule.get("id").replace("_", "-"),
-                        schedule.get("id").replace("-", "_"),
-                    ]
-                    for variant in schedule_id_variants:
-                        if variant != schedule.get("id"):
-                            test_query = supabase_client.table("schedule_time_ranges").select("*").eq("schedule_id", variant).execute()
-                            if test_query.data:
-                                schedule["time_ranges"] = test_query.data
-                                break
-        except Exception:
-            pass
-    
-    # Check for ml_per_hour: machine-specific takes priority over schedule-specific
-    ml_per_hour = dispenser.get("ml_per_hour") or schedule.get("ml_per_hour")
-    
-    # Get days_of_week from schedule
-    days_of_week = schedule.get("days_of_week")
-    
-    # Check if it's a time-based schedule (check for both None and empty list)
-    time_ranges = schedule.get("time_ranges")
-    if time_ranges and len(time_ranges) > 0:
-        daily_usage_ml = calculate_time_range_usage(time_ranges, ml_per_hour, days_of_week)
-        cycle_usage_ml = daily_usage_ml / 24  # Approximate per hour
-    else:
-        # Old format: interval-based schedule
-        ML_PER_SECOND = 0.1
-        
-        if ml_per_hour:
-            # Calculate total run time in hours
-            cycle_usage_ml = 0
-            for interval in schedule.get("intervals", []):
-                cycle_usage_ml += interval["spray_seconds"]
-            # Convert to hours
-            cycle_run_time_hours = cycle_usage_ml / 3600
-            cycle_usage_ml = cycle_run_time_hours * ml_per_hour
-        else:
-            # Use default calculation
-            cycle_usage_ml = 0
-            for interval in schedule.get("intervals", []):
-                cycle_usage_ml += interval["spray_seconds"] * ML_PER_SECOND
-        
-        # Calculate daily usage
-        daily_cycles = schedule.get("daily_cycles")
-        if daily_cycles is None:
-            daily_cycles = 1  # Default to 1 if None
-        daily_usage_ml = cycle_usage_ml * daily_cycles
-    
-    # Calculate actual usage since last refill if last_refill_date is provided
-    actual_usage_since_refill = 0
-    if daily_usage_ml > 0 and dispenser.get("last_refill_date"):
-        try:
-            from datetime import datetime, timezone
-            last_refill = datetime.fromisoformat(dispenser["last_refill_date"].replace('Z', '+00:00'))
-            if last_refill.tzinfo is None:
-                last_refill = last_refill.replace(tzinfo=timezone.utc)
-            now = datetime.now(timezone.utc)
-            time_diff = now - last_refill
-            hours_since_refill = time_diff.total_seconds() / 3600
-            days_since_refill = hours_since_refill / 24
-            
-            # Calculate usage based on schedule type
-            if schedule.get("time_ranges"):
-                # For time-based schedules, calculate usage per hour
-                if ml_per_hour:
-                    actual_usage_since_refill = hours_since_refill * (daily_usage_ml / 24)
-                else:
-                    actual_usage_since_refill = days_since_refill * daily_usage_ml
-            else:
-                # For interval-based schedules
-                actual_usage_since_refill = days_since_refill * daily_usage_ml
-        except Exception as e:
-            # If date parsing fails, use default calculation
-            pass
-    
-    # Calculate days until empty
-    if daily_usage_ml > 0:
-        # Helper function to convert to float safely
-        def safe_float_usage(value):
-            """Convert value to float, handling strings and None"""
-            if value is None:
-                return 0.0
-            if isinstance(value, str):
-                try:
-                    return float(value)
-                except (ValueError, TypeError):
-                    return 0.0
-            return float(value)
-        
-        # If we have actual usage since refill, we can calculate remaining level
-        # Otherwise use current_level_ml as is (with type safety)
-        remaining_level = safe_float_usage(dispenser.get("current_level_ml", 0))
-        if actual_usage_since_refill > 0:
-            # Note: This is informational - actual level should be updated via refill logs
-            # But we can show projected remaining based on usage
-            remaining_level = max(0, remaining_level - actual_usage_since_refill)
-        
-        days_until_empty = remaining_level / daily_usage_ml if remaining_level > 0 else 0
-    else:
-        days_until_empty = None
-    
-    return {
-        "daily_usage_ml": round(daily_usage_ml, 2),
-        "days_until_empty": round(days_until_empty, 2) if days_until_empty else None,
-        "cycle_usage_ml": round(cycle_usage_ml, 2),
-        "usage_since_refill": round(actual_usage_since_refill, 2) if actual_usage_since_refill > 0 else None,
-    }
+    return (await calculate_machines_usage([dispenser]))[dispenser_id]
 
 # Technician Assignment Endpoints
 @app.get("/api/technician-assignments")
-async def get_technician_assignments(technician: str = None, status: str = None):
-    """Get all technician assignments, optionally filtered by technician username or status"""
-    assignments = load_technician_assignments()
-    
-    if technician:
-        # Normalize technician username for comparison (strip whitespace)
-        technician_normalized = str(technician).strip() if technician else ""
-        # Debug: print all assignments and filtered results
-        print(f"DEBUG: Filtering assignments for technician: '{technician_normalized}'")
-        print(f"DEBUG: Total assignments before filter: {len(assignments)}")
-        for a in assignments:
-            stored_username = str(a.get("technician_username") or "").strip()
-            print(f"DEBUG: Assignment {a.get('id')}: technician_username='{stored_username}' (match: {stored_username == technician_normalized})")
-        
-        assignments = [
-            a for a in assignments 
-            if str(a.get("technician_username") or "").strip() == technician_normalized
-        ]
-        print(f"DEBUG: Filtered assignments count: {len(assignments)}")
+async def get_technician_assignments(request: Request, technician: str = None, status: str = None,
+                                     dispenser_id: str = None, visit_date_from: str = None,
+                                     visit_date_to: str = None, limit: int = None):
+    """Get technician assignments, newest first - technicians see only their own
+    
+    All filters (technician, status, dispenser_id, visit_date_from/visit_date_to
+    as inclusive ISO bounds, limit) are applied by the database query.
+    """
+    user = getattr(request.state, "user", None)
+    if user and user.get("role") == "technician":
+        technician = user.get("username", "")
     
-    if status:
-        assignments = [a for a in assignments if a.get("status") == status]
+    # Clients only see assignments for their own machines
+    scope = client_scope(request)
+    client_dispenser_ids = None
+    if scope:
+        client_dispenser_ids = [m.get("id") for m in await load_machine_instances_for_client(scope)]
+    
+    # Normalize technician username for comparison (strip whitespace)
+    technician_normalized = str(technician).strip() if technician else None
+    
+    if (visit_date_from and to_epoch_us(visit_date_from) is None) or (visit_date_to and to_epoch_us(visit_date_to) is None):
+        raise HTTPException(status_code=400, detail="visit_date_from and visit_date_to must be ISO timestamps")
+    if limit is not None and limit < 1:
+        raise HTTPException(status_code=400, detail="limit must be at least 1")
+    
+    assignments = await load_technician_assignments(
+        technician=technician_normalized or None,
+        status=status or None,
+        dispenser_id=dispenser_id or None,
+        visit_date_from=visit_date_from or None,
+        visit_date_to=visit_date_to or None,
+        limit=limit,
+        dispenser_ids=client_dispenser_ids,
+    )
+    
+    if ASSIGNMENT_QUERY_DIAGNOSTICS:
+        print(
+            f"Technician assignments query: technician={technician_normalized!r} status={status!r} "
+            f"dispenser_id={dispenser_id!r} visit_date=[{visit_date_from!r}, {visit_date_to!r}] "
+            f"limit={limit!r} -> {len(assignments)} row(s)"
+        )
     
     return assignments
 
 @app.get("/api/technician-assignments/{assignment_id}")
-async def get_technician_assignment(assignment_id: str):
+async def get_technician_assignment(assignment_id: str, request: Request):
     """Get a specific assignment by ID"""
-    assignments = load_technician_assignments()
-    for assignment in assignments:
-        if assignment["id"] == assignment_id:
-            return assignment
-    raise HTTPException(status_code=404, detail="Assignment not found")
+    assignment = await get_technician_assignment_by_id(assignment_id)
+    scope = client_scope(request)
+    if assignment is not None and scope:
+        machine = await get_machine_instance_by_id(assignment.get("dispenser_id"))
+        if not machine or machine.get("client_id") != scope:
+            assignment = None
+    if assignment is None:
+        raise HTTPException(status_code=404, detail="Assignment not found")
+    return assignment
 
 @app.post("/api/technician-assignments")
 async def create_technician_assignment(assignment: TechnicianAssignment):
     """Create a new technician assignment"""
-    assignments = load_technician_assignments()
-    
-    # Generate ID if not provided
-    assignment_id = assignment.id or f"assign_{datetime.now().strftime('%Y%m%d%H%M%S')}_{len(assignments)}"
+    # Generate ID if not provided (random suffix instead of a table count, so no full load is needed)
+    assignment_id = assignment.id or f"assign_{datetime.now().strftime('%Y%m%d%H%M%S')}_{secrets.token_hex(3)}"
     
     assignment_dict = assignment.dict()
     assignment_dict["id"] = assignment_id
     
-    assignments.append(assignment_dict)
-    save_technician_assignments(assignments)
+    await insert_technician_assignment(assignment_dict)
+    technician_stats.add_assignment(assignment_dict)
     return assignment_dict
 
 @app.put("/api/technician-assignments/{assignment_id}")
 async def update_technician_assignment(assignment_id: str, assignment_update: dict):
     """Update a technician assignment"""
-    assignments = load_technician_assignments()
+    assignment = await get_technician_assignment_by_id(assignment_id)
+    if assignment is None:
+        raise HTTPException(status_code=404, detail="Assignment not found")
     
-    for i, assignment in enumerate(assignments):
-        if assignment["id"] == assignment_id:
-            # Update fields
-            for key, value in assignment_update.items():
-                if key != "id":  # Don't allow changing ID
-                    assignments[i][key] = value
-            
-            save_technician_assignments(assignments)
-            return assignments[i]
+    # Update fields
+    changes = {key: value for key, value in assignment_update.items() if key != "id"}  # Don't allow changing ID
+    previous = dict(assignment)
+    assignment.update(changes)
     
-    raise HTTPException(status_code=404, detail="Assignment not found")
+    if changes:
+        await patch_technician_assignment(assignment_id, changes)
+        technician_stats.replace_assignment(previous, assignment)
+    return assignment
 
 @app.delete("/api/technician-assignments/{assignment_id}")
 async def delete_technician_assignment_endpoint(assignment_id: str):
     """Delete a technician assignment"""
-    assignments = load_technician_assignments()
-    
     # Check if assignment exists
-    assignment_exists = any(a["id"] == assignment_id for a in assignments)
-    if not assignment_exists:
+    existing = await get_technician_assignment_by_id(assignment_id)
+    if existing is None:
         raise HTTPException(status_code=404, detail="Assignment not found")
     
     # Delete from Supabase
-    delete_technician_assignment(assignment_id)
+    await delete_technician_assignment(assignment_id)
+    technician_stats.remove_assignment(existing)
     return {"message": "Assignment deleted successfully"}
 
 @app.post("/api/technician-assignments/{assignment_id}/complete")
 async def complete_assignment(assignment_id: str, completion_data: dict = None):
     """Mark an assignment as completed"""
-    assignments = load_technician_assignments()
-    
-    for i, assignment in enumerate(assignments):
-        if assignment["id"] == assignment_id:
-            assignments[i]["status"] = "completed"
-            assignments[i]["completed_date"] = datetime.now().isoformat()
-            if completion_data:
-                if "notes" in completion_data:
-                    completion_notes = completion_data.get("notes")
-                    # For installation tasks, preserve CLIENT_ID prefix if it exists
-                    if assignment.get("task_type") == "installation" and assignment.get("notes"):
-                        # Extract CLIENT_ID from original notes if present
-                        import re
-                        client_id_match = re.search(r'CLIENT_ID:([^|]+)', assignment.get("notes", ""))
-                        if client_id_match:
-                            # Preserve CLIENT_ID and append completion notes
-                            client_id_part = f"CLIENT_ID:{client_id_match.group(1).strip()}"
-                            if completion_notes:
-                                assignments[i]["notes"] = f"{client_id_part} | {completion_notes}"
-                            else:
-                                assignments[i]["notes"] = client_id_part
+    for _ in range(WRITE_CONFLICT_ATTEMPTS):
+        assignment = await get_technician_assignment_by_id(assignment_id)
+        if assignment is None:
+            raise HTTPException(status_code=404, detail="Assignment not found")
+        
+        previous = dict(assignment)
+        assignment["status"] = "completed"
+        assignment["completed_date"] = datetime.now().isoformat()
+        if completion_data:
+            if "notes" in completion_data:
+                completion_notes = completion_data.get("notes")
+                # For installation tasks, preserve CLIENT_ID prefix if it exists
+                if assignment.get("task_type") == "installation" and assignment.get("notes"):
+                    # Extract CLIENT_ID from original notes if present
+                    client_id_match = re.search(r'CLIENT_ID:([^|]+)', assignment.get("notes", ""))
+                    if client_id_match:
+                        # Preserve CLIENT_ID and append completion notes
+                        client_id_part = f"CLIENT_ID:{client_id_match.group(1).strip()}"
+                        if completion_notes:
+                            assignment["notes"] = f"{client_id_part} | {completion_notes}"
                         else:
-                            # No CLIENT_ID found, just use completion notes
-                            assignments[i]["notes"] = completion_notes
+                            assignment["notes"] = client_id_part
                     else:
-                        # For non-installation tasks, just update notes normally
-                        assignments[i]["notes"] = completion_notes
-            
-            save_technician_assignments(assignments)
-            return assignments[i]
-    
-    raise HTTPException(status_code=404, detail="Assignment not found")
+                        # No CLIENT_ID found, just use completion notes
+                        assignment["notes"] = completion_notes
+                else:
+                    # For non-installation tasks, just update notes normally
+                    assignment["notes"] = completion_notes
+        
+        # Only write the columns completion touches
+        changed_fields = ["status", "completed_date"]
+        if completion_data and "notes" in completion_data:
+            changed_fields.append("notes")
+        # Only write if the status the completion was based on is unchanged
+        expected = {"status": previous.get("status")}
+        try:
+            await patch_technician_assignment_if(assignment_id, expected, {key: assignment.get(key) for key in changed_fields})
+            break
+        except WriteConflictError:
+            continue
+    else:
+        raise HTTPException(status_code=409, detail="Assignment was modified concurrently, please retry")
+    technician_stats.replace_assignment(previous, assignment)
+    return assignment
 
-@app.get("/api/technician-stats/{technician_username}")
-async def get_technician_stats(technician_username: str, start_date: str = None, end_date: str = None):
-    """Get statistics for a specific technician"""
-    assignments = load_technician_assignments()
-    refill_logs = load_refill_logs()
+OPEN_ASSIGNMENT_STATUSES = ("pending", "assigned")
+
+def installation_client_id(assignment: dict):
+    """client_id an installation task is for (CLIENT_ID:<id> in its notes), or None"""
+    if assignment.get("task_type") != "installation":
+        return None
+    match = re.search(r'CLIENT_ID:([^|]+)', assignment.get("notes") or "")
+    return match.group(1).strip() if match else None
+
+@app.get("/api/technicians/{username}/workload")
+async def get_technician_workload(username: str, request: Request):
+    """A technician's open assignments with everything needed to plan the day
     
-    # Normalize technician username for comparison (strip whitespace)
-    technician_normalized = str(technician_username).strip() if technician_username else ""
+    Each pending/assigned task is joined with its machine, client name and
+    address, schedule name and the machine's projected level, in one pass
+    over data loaded once (every query filtered to this technician's rows).
+    Sorted by visit date, undated tasks last.
+    """
+    user = getattr(request.state, "user", None)
+    if not user or user.get("role") == "client":
+        raise HTTPException(status_code=403, detail="Forbidden")
+    if user.get("role") == "technician" and user.get("username") != username:
+        raise HTTPException(status_code=403, detail="Technicians can only view their own workload")
     
-    # Filter assignments for this technician
-    tech_assignments = [
-        a for a in assignments 
-        if str(a.get("technician_username") or "").strip() == technician_normalized
+    assignments = [
+        a for a in await load_technician_assignments(technician=username)
+        if a.get("status") in OPEN_ASSIGNMENT_STATUSES
     ]
+    machines = {m.get("id"): m for m in await load_machine_instances_by_ids([a.get("dispenser_id") for a in assignments])}
+    
+    schedule_ids = list({m.get("current_schedule_id") for m in machines.values() if m.get("current_schedule_id")})
+    client_ids = {m.get("client_id") for m in machines.values()} | {installation_client_id(a) for a in assignments}
+    client_ids = [client_id for client_id in client_ids if client_id]
+    usage, *clients = await asyncio.gather(
+        calculate_machines_usage(list(machines.values())),
+        *(get_client_by_id(client_id) for client_id in client_ids),
+    )
+    clients = {client.get("id"): client for client in clients if client}
+    schedule_names = {sch.get("id"): sch.get("name") for sch in await load_schedules(schedule_ids=schedule_ids)} if schedule_ids else {}
     
-    # Filter refill logs for this technician
-    tech_refills = [
-        r for r in refill_logs 
-        if str(r.get("technician_username") or "").strip() == technician_normalized
-    ]
+    tasks = []
+    for assignment in assignments:
+        machine = machines.get(assignment.get("dispenser_id"))
+        client = clients.get(machine.get("client_id") if machine else installation_client_id(assignment))
+        task = {
+            "assignment_id": assignment.get("id"),
+            "task_type": assignment.get("task_type"),
+            "status": assignment.get("status"),
+            "visit_date": assignment.get("visit_date"),
+            "assigned_date": assignment.get("assigned_date"),
+            "notes": assignment.get("notes"),
+            "dispenser_id": assignment.get("dispenser_id"),
+            "machine": None,
+            "client": {"id": client.get("id"), "name": client.get("name"), "address": client.get("address")} if client else None,
+            "schedule": None,
+            "daily_usage_ml": None,
+            "estimated_level_ml": None,
+            "level_percent": None,
+            "days_until_empty": None,
+        }
+        if machine:
+            machine_usage = usage.get(machine.get("id")) or {}
+            level, percent = project_level(machine, machine_usage)
+            schedule_id = machine.get("current_schedule_id")
+            task.update({
+                "machine": {field: machine.get(field) for field in (
+                    "unique_code", "sku", "location", "status", "fragrance_code",
+                    "refill_capacity_ml", "current_level_ml", "last_refill_date",
+                )},
+                "schedule": {"id": schedule_id, "name": schedule_names.get(schedule_id)} if schedule_id else None,
+                "daily_usage_ml": machine_usage.get("daily_usage_ml"),
+                "estimated_level_ml": level,
+                "level_percent": percent,
+                "days_until_empty": machine_usage.get("days_until_empty"),
+            })
+        tasks.append(task)
+    
+    tasks.sort(key=lambda t: (to_epoch_us(t["visit_date"]) is None, to_epoch_us(t["visit_date"]) or 0))
+    return {"technician_username": username, "generated_at": datetime.now(timezone.utc).isoformat(), "tasks": tasks}
+
+def check_stats_range(start_date: str, end_date: str):
+    """Reject unparsable technician-stats bounds instead of reading them as the epoch"""
+    if (start_date and to_epoch_us(start_date) is None) or (end_date and to_epoch_us(end_date) is None):
+        raise HTTPException(status_code=400, detail="start_date and end_date must be ISO timestamps")
+
+@app.get("/api/technician-stats")
+async def get_all_technician_stats(request: Request, start_date: str = None, end_date: str = None):
+    """Get statistics for every technician, summed from the per-day rollups (admin/developer only)"""
+    require_roles(request, ["admin", "developer"])
+    check_stats_range(start_date, end_date)
+    technicians = [u.get("username") for u in await load_users() if u.get("role") == "technician"]
+    return await run_in_db_pool(technician_stats.stats_for_all, start_date, end_date, technicians=technicians)
+
+@app.get("/api/technician-stats/{technician_username}")
+async def get_technician_stats(technician_username: str, request: Request, start_date: str = None, end_date: str = None):
+    """Get statistics for a specific technician - technicians only see their own
+
+    Served from the per-day rollups; start_date/end_date select whole UTC days (inclusive).
+    """
+    user = require_roles(request, ["admin", "developer", "technician"])
+    if user.get("role") == "technician" and user.get("username") != technician_username.strip():
+        raise HTTPException(status_code=403, detail="Technicians can only view their own stats")
+    check_stats_range(start_date, end_date)
+    return await run_in_db_pool(technician_stats.stats_for, technician_username, start_date, end_date)
+
+BATCH_MAX_REQUESTS = 20
+
+async def _run_sub_request(request: Request, sub: BatchSubRequest) -> dict:
+    """Run one GET sub-request through the router, as the caller of the batch"""
+    from urllib.parse import urlencode, urlsplit
+    
+    result = {"id": sub.id, "path": sub.path}
+    split = urlsplit(sub.path)
+    path = split.path
+    if not path.startswith("/api/") or path.rstrip("/") == "/api/batch":
+        return {**result, "status": 400, "body": {"detail": "Only /api/ read endpoints can be batched"}}
+    query_string = split.query
+    if sub.query:
+        extra = urlencode({k: v for k, v in sub.query.items() if v is not None}, doseq=True)
+        query_string = f"{query_string}&{extra}" if query_string else extra
+    
+    scope = {
+        "type": "http",
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": request.url.scheme,
+        "path": path,
+        "raw_path": path.encode(),
+        "root_path": "",
+        "query_string": query_string.encode(),
+        "headers": [(k, v) for k, v in request.scope["headers"] if k not in (b"content-length", b"content-type")],
+        "client": request.scope.get("client"),
+        "server": request.scope.get("server"),
+        "app": app,
+        "state": {"user": getattr(request.state, "user", None)},  # Already authenticated by the batch request
+    }
+    response = {"status": 500, "body": []}
     
-    # Apply date filters if provided
-    if start_date:
-        start_dt = datetime.fromisoformat(start_date.replace('Z', '+00:00'))
-        tech_assignments = [a for a in tech_assignments if datetime.fromisoformat(a.get("assigned_date", "1970-01-01").replace('Z', '+00:00')) >= start_dt]
-        tech_refills = [r for r in tech_refills if datetime.fromisoformat(r.get("timestamp", "1970-01-01").replace('Z', '+00:00')) >= start_dt]
-    
-    if end_date:
-        end_dt = datetime.fromisoformat(end_date.replace('Z', '+00:00'))
-        tech_assignments = [a for a in tech_assignments if datetime.fromisoformat(a.get("assigned_date", "1970-01-01").replace('Z', '+00:00')) <= end_dt]
-        tech_refills = [r for r in tech_refills if datetime.fromisoformat(r.get("timestamp", "1970-01-01").replace('Z', '+00:00')) <= end_dt]
-    
-    # Calculate stats
-    total_assigned = len(tech_assignments)
-    completed = len([a for a in tech_assignments if a.get("status") == "completed"])
-    pending = len([a for a in tech_assignments if a.get("status") == "pending"])
-    cancelled = len([a for a in tech_assignments if a.get("status") == "cancelled"])
-    total_refills = len(tech_refills)
-    total_ml_refilled = sum(r.get("refill_amount_ml", 0) for r in tech_refills)
-    
-    # Count unique visits (by date and dispenser)
-    unique_visits = set()
-    for assignment in tech_assignments:
-        if assignment.get("status") == "completed" and assignment.get("completed_date"):
-            visit_key = f"{assignment.get('dispenser_id')}_{assignment.get('completed_date', '')[:10]}"
-            unique_visits.add(visit_key)
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
     
-    return {
-        "technician_username": technician_username,
-        "machines_assigned": total_assigned,
-        "refills_completed": total_refills,
-        "pending_refills": pending,
-        "completed_tasks": completed,
-        "cancelled_tasks": cancelled,
-        "visit_count": len(unique_visits),
-        "total_ml_refilled": round(total_ml_refilled, 2)
-    }
+    async def send(message):
+        if message["type"] == "http.response.start":
+            response["status"] = message["status"]
+        elif message["type"] == "http.response.body":
+            response["body"].append(message.get("body", b""))
+    
+    try:
+        await app.router(scope, receive, send)
+    except StarletteHTTPException as e:
+        return {**result, "status": e.status_code, "body": {"detail": e.detail}}
+    except RequestValidationError as e:
+        return {**result, "status": 422, "body": {"detail": e.errors()}}
+    except Exception as e:
+        error_msg = str(e) if str(e) else "Unknown error"
+        print(f"Error in batch sub-request {sub.path}: {error_msg}")
+        return {**result, "status": 500, "body": {"detail": f"Internal error: {error_msg}"}}
+    
+    raw = b"".join(response["body"])
+    try:
+        body = json.loads(raw) if raw else None
+    except ValueError:
+        body = raw.decode(errors="replace")
+    return {**result, "status": response["status"], "body": body}
+
+@app.post("/api/batch")
+async def batch(body: BatchRequest, request: Request):
+    """Run several read (GET) requests in one round trip
+    
+    Sub-requests run concurrently in this request's context: they reuse its
+    authenticated user instead of re-running auth, and concurrent loads of
+    the same table share one query. Each result carries its own status, so
+    one failing read doesn't fail the batch.
+    """
+    if len(body.requests) > BATCH_MAX_REQUESTS:
+        raise HTTPException(status_code=400, detail=f"At most {BATCH_MAX_REQUESTS} requests per batch")
+    responses = await asyncio.gather(*(_run_sub_request(request, sub) for sub in body.requests))
+    return {"responses": responses}
 
 @app.get("/api/health")
 async def health_check():
@@ -2139,7 +2376,7 @@ async def health_check():
         # Test Supabase connection
         from supabase_service import supabase
         # Simple query to test connection
-        result = supabase.table("users").select("username").limit(1).execute()
+        result = await run_in_db_pool(supabase.table("users").select("username").limit(1).execute)
         
         return {
             "status": "healthy",
@@ -2158,6 +2395,12 @@ async def health_check():
             }
         )
 
+@app.get("/api/cache-stats")
+async def cache_stats(request: Request):
+    """Data cache hit/miss counters, refill index size and password pool metrics (admin/developer only)"""
+    require_roles(request, ["admin", "developer"])
+    return {**get_cache_stats(), "refill_index": refill_index.stats(), "password_pool": password_pool.stats()}
+
 @app.get("/api/docs")
 async def api_docs():
     """API documentation endpoint - redirects to FastAPI Swagger UI"""
@@ -0,0 +1,284 @@
+"""
+Refill-due priority index
+
+Keeps every scheduled machine in a min-heap keyed by the projected time it
+runs dry, so "which machines need a refill in the next N days" only walks
+the front of the heap instead of computing usage for the whole fleet.
+
+The index is built from machine instances and compiled schedules, then kept
+current by the mutation endpoints (refills, schedule changes, instance
+updates). Writes to those tables from other workers (seen through the shared
+table versions) trigger a full rebuild on the next query, and a periodic
+rebuild picks up anything written outside the app.
+"""
+
+import heapq
+import os
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+from supabase_service import load_client_machines, load_compiled_schedules, load_machine_instances, table_versions
+from timestamps import days_since, to_epoch_us
+from usage_engine import CompiledSchedule, project_empty_times
+
+REFILL_INDEX_TTL_SECONDS = int(os.getenv("REFILL_INDEX_TTL_SECONDS", "300"))
+
+# Tables the index is built from
+_SOURCE_TABLES = ("machine_instances", "schedules")
+
+# Loads a rebuild retries when incremental updates land while it is loading
+_REBUILD_ATTEMPTS = 3
+
+# Machine fields kept in the index (enough to recompute and to answer queries)
+_SNAPSHOT_FIELDS = (
+    "id", "client_id", "location", "unique_code", "current_schedule_id",
+    "ml_per_hour", "current_level_ml", "last_refill_date", "installation_date", "refill_capacity_ml",
+)
+
+
+class RefillDueIndex:
+    """Min-heap of machines ordered by projected empty time
+
+    Heap entries are (empty_at, machine_id, seq). Updates push a new entry
+    and bump the machine's seq; stale entries are skipped on read and
+    dropped when the heap is compacted. Each client has its own heap so a
+    client-scoped query never touches other clients' machines.
+    """
+
+    def __init__(self, ttl_seconds: int = REFILL_INDEX_TTL_SECONDS):
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.RLock()
+        self._built_at: Optional[float] = None
+        self._foreign_writes = 0                          # Other workers' source writes at build time
+        self._generation = 0                              # Bumped by every incremental update
+        self._seq = 0
+        self._machines: Dict[str, Dict[str, Any]] = {}    # machine_id -> snapshot
+        self._entries: Dict[str, tuple] = {}              # machine_id -> (empty_at, daily_usage_ml, seq)
+        self._heap: List[tuple] = []
+        self._client_heaps: Dict[Any, List[tuple]] = {}
+        self._by_schedule: Dict[str, set] = {}            # schedule_id -> machine ids
+
+    # ------------------------------------------------------------------
+    # Building
+    # ------------------------------------------------------------------
+
+    def rebuild(self) -> None:
+        """Rebuild the whole index from machine instances and schedules
+
+        The tables are loaded without holding the lock. If an incremental
+        update lands meanwhile (a refill in this worker, say), the loaded
+        rows may predate it, so the load is repeated; if updates keep
+        landing, the index is swapped in but left marked stale so the next
+        query rebuilds again.
+        """
+        for attempt in range(_REBUILD_ATTEMPTS):
+            with self._lock:
+                generation = self._generation
+            foreign_writes = table_versions.foreign_writes(_SOURCE_TABLES)
+            machines = load_machine_instances() + load_client_machines().get("client_machines", [])
+            schedule_ids = list({m["current_schedule_id"] for m in machines if m.get("current_schedule_id")})
+            compiled = load_compiled_schedules(schedule_ids) if schedule_ids else {}
+            projections = project_empty_times(machines, compiled.values())
+
+            with self._lock:
+                raced = self._generation != generation
+                if raced and attempt + 1 < _REBUILD_ATTEMPTS:
+                    continue
+                self._machines = {}
+                self._entries = {}
+                self._heap = []
+                self._client_heaps = {}
+                self._by_schedule = {}
+                for machine in machines:
+                    self._track(machine)
+                    projection = projections.get(machine.get("id"))
+                    if projection:
+                        self._push(machine.get("id"), projection, heapify=False)
+                heapq.heapify(self._heap)
+                for heap in self._client_heaps.values():
+                    heapq.heapify(heap)
+                self._foreign_writes = foreign_writes
+                self._built_at = None if raced else time.time()
+                return
+
+    def _ensure_fresh(self) -> None:
+        if (self._built_at is None or time.time() - self._built_at > self.ttl_seconds
+                or table_versions.foreign_writes(_SOURCE_TABLES) != self._foreign_writes):
+            self.rebuild()
+
+    def invalidate(self) -> None:
+        """Force a full rebuild on the next query"""
+        with self._lock:
+            self._built_at = None
+
+    # ------------------------------------------------------------------
+    # Incremental updates
+    # ------------------------------------------------------------------
+
+    def upsert_machine(self, machine: Dict[str, Any], compiled: Optional[CompiledSchedule] = None) -> None:
+        """Recompute one machine after a refill, schedule assignment or edit
+
+        Args:
+            machine: Machine instance dict (the full row, or at least its snapshot fields)
+            compiled: The machine's compiled schedule, loaded when not given
+        """
+        with self._lock:
+            self._generation += 1
+        if self._built_at is None or not machine.get("id"):
+            return  # Not built yet - the first query builds from the database
+
+        schedule_id = machine.get("current_schedule_id")
+        if schedule_id and (compiled is None or compiled.id != schedule_id):
+            compiled = load_compiled_schedules([schedule_id]).get(schedule_id)
+        projection = project_empty_times([machine], [compiled]).get(machine["id"]) if compiled else None
+
+        with self._lock:
+            self._untrack(machine["id"])
+            self._track(machine)
+            if projection:
+                self._push(machine["id"], projection)
+
+    def remove_machine(self, machine_id: str) -> None:
+        """Drop a deleted machine from the index"""
+        with self._lock:
+            self._generation += 1
+            self._untrack(machine_id)
+
+    def update_schedule(self, schedule_id: str) -> None:
+        """Recompute every machine on a schedule after it was edited or deleted"""
+        with self._lock:
+            self._generation += 1
+        if self._built_at is None:
+            return
+        with self._lock:
+            machines = [self._machines[mid] for mid in self._by_schedule.get(schedule_id, ())]
+        if not machines:
+            return
+
+        compiled = load_compiled_schedules([schedule_id]).get(schedule_id)
+        projections = project_empty_times(machines, [compiled]) if compiled else {}
+        with self._lock:
+            for machine in machines:
+                machine_id = machine["id"]
+                if machine_id not in self._machines:
+                    continue  # Removed while the schedule was loading
+                self._entries.pop(machine_id, None)
+                if machine_id in projections:
+                    self._push(machine_id, projections[machine_id])
+            self._maybe_compact()
+
+    # ------------------------------------------------------------------
+    # Queries
+    # ------------------------------------------------------------------
+
+    def due_within(self, within_seconds: float, client_id: Optional[str] = None,
+                   now: Optional[datetime] = None) -> List[Dict[str, Any]]:
+        """Machines projected to run dry within within_seconds of now
+
+        Walks the heap top-down, only descending into children whose key is
+        still within the horizon, so the cost is proportional to the number
+        of machines returned rather than the fleet size.
+
+        Returns:
+            Machines sorted by projected empty time (already-empty ones first)
+        """
+        self._ensure_fresh()
+        now_ts = (now or datetime.now(timezone.utc)).timestamp()
+        horizon = now_ts + within_seconds
+
+        with self._lock:
+            heap = self._heap if client_id is None else self._client_heaps.get(client_id, [])
+            due = []
+            stack = [0] if heap else []
+            while stack:
+                i = stack.pop()
+                empty_at, machine_id, seq = heap[i]
+                if empty_at > horizon:
+                    continue  # Nothing below this node is due either
+                entry = self._entries.get(machine_id)
+                if entry and entry[2] == seq:
+                    due.append((empty_at, machine_id, entry[1]))
+                for child in (2 * i + 1, 2 * i + 2):
+                    if child < len(heap):
+                        stack.append(child)
+
+            due.sort()
+            return [self._describe(machine_id, empty_at, daily, now_ts) for empty_at, machine_id, daily in due]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "machines": len(self._entries),
+                "heap_size": len(self._heap),
+                "clients": len(self._client_heaps),
+                "built_at": self._built_at,
+            }
+
+    # ------------------------------------------------------------------
+    # Internals (callers hold the lock)
+    # ------------------------------------------------------------------
+
+    def _track(self, machine: Dict[str, Any]) -> None:
+        snapshot = {field: machine.get(field) for field in _SNAPSHOT_FIELDS}
+        snapshot["last_refill_us"] = to_epoch_us(snapshot["last_refill_date"])
+        self._machines[snapshot["id"]] = snapshot
+        if snapshot["current_schedule_id"]:
+            self._by_schedule.setdefault(snapshot["current_schedule_id"], set()).add(snapshot["id"])
+
+    def _untrack(self, machine_id: str) -> None:
+        snapshot = self._machines.pop(machine_id, None)
+        self._entries.pop(machine_id, None)
+        if snapshot and snapshot["current_schedule_id"]:
+            self._by_schedule.get(snapshot["current_schedule_id"], set()).discard(machine_id)
+        self._maybe_compact()
+
+    def _push(self, machine_id: str, projection: tuple, heapify: bool = True) -> None:
+        empty_at, daily = projection
+        self._seq += 1
+        entry = (empty_at, machine_id, self._seq)
+        self._entries[machine_id] = (empty_at, daily, self._seq)
+        client_heap = self._client_heaps.setdefault(self._machines[machine_id]["client_id"], [])
+        if heapify:
+            heapq.heappush(self._heap, entry)
+            heapq.heappush(client_heap, entry)
+        else:
+            self._heap.append(entry)
+            client_heap.append(entry)
+
+    def _maybe_compact(self) -> None:
+        """Rebuild the heaps from live entries once stale ones dominate"""
+        if len(self._heap) <= 2 * len(self._entries) + 64:
+            return
+        self._heap = []
+        self._client_heaps = {}
+        for machine_id, (empty_at, daily, seq) in self._entries.items():
+            entry = (empty_at, machine_id, seq)
+            self._heap.append(entry)
+            self._client_heaps.setdefault(self._machines[machine_id]["client_id"], []).append(entry)
+        heapq.heapify(self._heap)
+        for heap in self._client_heaps.values():
+            heapq.heapify(heap)
+
+    def _describe(self, machine_id: str, empty_at: float, daily: float, now_ts: float) -> Dict[str, Any]:
+        machine = self._machines[machine_id]
+        seconds_left = max(0.0, empty_at - now_ts)
+        since_refill = days_since(machine["last_refill_us"], datetime.fromtimestamp(now_ts, timezone.utc))
+        return {
+            "dispenser_id": machine_id,
+            "client_id": machine["client_id"],
+            "location": machine["location"],
+            "unique_code": machine["unique_code"],
+            "current_schedule_id": machine["current_schedule_id"],
+            "refill_capacity_ml": machine["refill_capacity_ml"],
+            "last_refill_date": machine["last_refill_date"],
+            "days_since_refill": round(since_refill, 2) if since_refill is not None else None,
+            "daily_usage_ml": round(daily, 2),
+            "estimated_level_ml": round(seconds_left / 86400 * daily, 2),
+            "days_until_empty": round(seconds_left / 86400, 2),
+            "projected_empty_at": datetime.fromtimestamp(empty_at, timezone.utc).isoformat(),
+        }
+
+
+refill_index = RefillDueIndex()
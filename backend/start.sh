@@ -2,8 +2,35 @@
 # Get PORT from environment variable (Cloud Run sets this to 8080)
 PORT=${PORT:-8080}
 
-echo "Starting application on port $PORT..."
+# Number of uvicorn worker processes: WEB_CONCURRENCY if set, otherwise one
+# per CPU available to the container (cgroup CPU quota, capped at nproc)
+if [ -z "$WEB_CONCURRENCY" ]; then
+    WEB_CONCURRENCY=$(nproc 2>/dev/null || echo 1)
+    if [ -r /sys/fs/cgroup/cpu.max ]; then
+        read -r QUOTA PERIOD < /sys/fs/cgroup/cpu.max
+        if [ "$QUOTA" != "max" ] && [ "$PERIOD" -gt 0 ]; then
+            QUOTA_CPUS=$(( (QUOTA + PERIOD - 1) / PERIOD ))
+            if [ "$QUOTA_CPUS" -lt "$WEB_CONCURRENCY" ]; then
+                WEB_CONCURRENCY=$QUOTA_CPUS
+            fi
+        fi
+    fi
+fi
 
-# Start uvicorn with proper error handling
-exec python -m uvicorn main:app --host 0.0.0.0 --port $PORT --log-level info
+# Tokens must verify in every worker, so several workers need a shared signing key
+if [ "$WEB_CONCURRENCY" -gt 1 ] && [ -z "$TOKEN_SIGNING_KEYS_FILE" ] && [ -z "$TOKEN_SIGNING_KEYS" ] && [ -z "$TOKEN_SECRET" ]; then
+    echo "Warning: no shared token signing key set - running a single worker"
+    WEB_CONCURRENCY=1
+fi
+
+# Each worker caches table reads; a shared version file lets a write in one
+# worker invalidate the others' caches at once instead of after their TTLs
+if [ "$WEB_CONCURRENCY" -gt 1 ] && [ -z "$CACHE_VERSIONS_FILE" ]; then
+    CACHE_VERSIONS_FILE=$(mktemp)
+    export CACHE_VERSIONS_FILE
+fi
 
+echo "Starting application on port $PORT with $WEB_CONCURRENCY worker(s)..."
+
+# Start uvicorn with proper error handling
+exec python -m uvicorn main:app --host 0.0.0.0 --port $PORT --workers $WEB_CONCURRENCY --log-level info
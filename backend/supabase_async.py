@@ -0,0 +1,168 @@
+"""
+Async Supabase Service Module
+Awaitable versions of the supabase_service API for the async endpoints.
+
+Every function here has the same name, arguments and return value as its
+supabase_service counterpart. The call runs on a dedicated, bounded thread
+pool, so a PostgREST round trip waits off the event loop, and other requests
+in the worker keep being served while it is in flight. All workers share the
+one Supabase client, and with it the same pool of keep-alive HTTP connections.
+The read-through cache, time indexes and compiled schedules are shared with
+the synchronous API too.
+
+Reads are coalesced on the event loop: while a load_/get_/count_ call is
+in flight, identical calls await the same pool task instead of taking
+another pool thread, and each receives its own copy of the result. A call
+only joins a read started at the same versions of the tables it reads, so
+a read issued after a write never gets rows loaded before it.
+
+In-memory helpers (cache stats and invalidation) stay synchronous and can be
+imported from supabase_service directly.
+"""
+
+import asyncio
+import copy
+import functools
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List
+
+import supabase_service
+
+# Maximum number of Supabase calls in flight per worker process
+DB_MAX_CONCURRENCY = int(os.getenv("DB_MAX_CONCURRENCY", "16"))
+
+_executor = ThreadPoolExecutor(max_workers=DB_MAX_CONCURRENCY, thread_name_prefix="supabase")
+
+
+async def run_in_db_pool(func: Callable[..., Any], *args, **kwargs) -> Any:
+    """Run a blocking data-layer call on the Supabase thread pool and await it"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, functools.partial(func, *args, **kwargs))
+
+
+def _awaitable(func: Callable[..., Any]) -> Callable[..., Any]:
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        return await run_in_db_pool(func, *args, **kwargs)
+    return wrapper
+
+
+# Reads in flight on this worker's event loop: key -> [pool task, number of callers waiting on it]
+_inflight: Dict[tuple, List[Any]] = {}
+
+
+def _freeze(value: Any) -> Any:
+    """Hashable form of a call argument (lists become tuples)"""
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(item) for item in value)
+    return value
+
+
+def _coalesced(func: Callable[..., Any], *tables: str) -> Callable[..., Any]:
+    """Like _awaitable, but identical concurrent calls share one pool task
+
+    tables are the tables func reads. Their current versions are part of
+    the key, so once a write bumps one, later calls start a new read rather
+    than joining one that may predate the write. Calls with unhashable
+    arguments or force_refresh=True always run on their own. When a task was
+    shared, every caller gets a deep copy so no caller can mutate another's
+    rows.
+    """
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        try:
+            key = (func.__name__, tuple(supabase_service.table_versions.get(table) for table in tables),
+                   _freeze(args), tuple(sorted((k, _freeze(v)) for k, v in kwargs.items())))
+            hash(key)
+        except TypeError:
+            key = None
+        if key is None or kwargs.get("force_refresh"):
+            return await run_in_db_pool(func, *args, **kwargs)
+
+        flight = _inflight.get(key)
+        if flight is None or flight[0].done():
+            task = asyncio.ensure_future(run_in_db_pool(func, *args, **kwargs))
+            flight = _inflight[key] = [task, 0]
+            task.add_done_callback(lambda _: _inflight.pop(key, None))
+        else:
+            flight[1] += 1
+        # Shielded, so a cancelled caller does not cancel the query for the others
+        result = await asyncio.shield(flight[0])
+        return copy.deepcopy(result) if flight[1] else result
+    return wrapper
+
+
+# Users
+load_users = _coalesced(supabase_service.load_users, "users")
+get_user_by_username = _coalesced(supabase_service.get_user_by_username, "users")
+insert_user = _awaitable(supabase_service.insert_user)
+patch_user = _awaitable(supabase_service.patch_user)
+save_users = _awaitable(supabase_service.save_users)
+delete_user = _awaitable(supabase_service.delete_user)
+
+# Clients
+load_clients = _coalesced(supabase_service.load_clients, "clients")
+get_client_by_id = _coalesced(supabase_service.get_client_by_id, "clients")
+insert_client = _awaitable(supabase_service.insert_client)
+patch_client = _awaitable(supabase_service.patch_client)
+save_clients = _awaitable(supabase_service.save_clients)
+delete_client = _awaitable(supabase_service.delete_client)
+
+# Machine templates
+load_machine_templates = _coalesced(supabase_service.load_machine_templates, "machine_templates")
+get_machine_template_by_id = _coalesced(supabase_service.get_machine_template_by_id, "machine_templates")
+get_machine_template_by_sku = _coalesced(supabase_service.get_machine_template_by_sku, "machine_templates")
+insert_machine_template = _awaitable(supabase_service.insert_machine_template)
+patch_machine_template = _awaitable(supabase_service.patch_machine_template)
+save_machine_templates = _awaitable(supabase_service.save_machine_templates)
+delete_machine_template = _awaitable(supabase_service.delete_machine_template)
+
+# Machine instances
+load_machine_instances = _coalesced(supabase_service.load_machine_instances, "machine_instances")
+get_machine_instance_by_id = _coalesced(supabase_service.get_machine_instance_by_id, "machine_instances")
+get_machine_instance_by_code = _coalesced(supabase_service.get_machine_instance_by_code, "machine_instances")
+load_machine_instances_by_ids = _coalesced(supabase_service.load_machine_instances_by_ids, "machine_instances")
+load_machine_instances_for_client = _coalesced(supabase_service.load_machine_instances_for_client, "machine_instances")
+insert_machine_instance = _awaitable(supabase_service.insert_machine_instance)
+patch_machine_instance = _awaitable(supabase_service.patch_machine_instance)
+patch_machine_instance_if = _awaitable(supabase_service.patch_machine_instance_if)
+save_machine_instances = _awaitable(supabase_service.save_machine_instances)
+delete_machine_instance = _awaitable(supabase_service.delete_machine_instance)
+load_client_machines = _coalesced(supabase_service.load_client_machines, "machine_instances")
+save_client_machines = _awaitable(supabase_service.save_client_machines)
+
+# Schedules
+load_schedules = _coalesced(supabase_service.load_schedules, "schedules")
+get_schedule_by_id = _coalesced(supabase_service.get_schedule_by_id, "schedules")
+save_schedule = _awaitable(supabase_service.save_schedule)
+delete_schedule = _awaitable(supabase_service.delete_schedule)
+load_schedule_time_ranges = _coalesced(supabase_service.load_schedule_time_ranges, "schedules")
+save_schedule_time_ranges = _awaitable(supabase_service.save_schedule_time_ranges)
+load_schedule_intervals = _coalesced(supabase_service.load_schedule_intervals, "schedules")
+save_schedule_intervals = _awaitable(supabase_service.save_schedule_intervals)
+load_compiled_schedules = _awaitable(supabase_service.load_compiled_schedules)
+
+# Refill logs
+load_refill_logs = _coalesced(supabase_service.load_refill_logs, "refill_logs")
+load_refill_logs_page = _coalesced(supabase_service.load_refill_logs_page, "refill_logs")
+insert_refill_log = _awaitable(supabase_service.insert_refill_log)
+count_refill_logs = _coalesced(supabase_service.count_refill_logs, "refill_logs")
+save_refill_logs = _awaitable(supabase_service.save_refill_logs)
+delete_refill_logs_by_dispenser = _awaitable(supabase_service.delete_refill_logs_by_dispenser)
+
+# Technician assignments
+load_technician_assignments = _coalesced(supabase_service.load_technician_assignments, "technician_assignments")
+get_technician_assignment_by_id = _coalesced(supabase_service.get_technician_assignment_by_id, "technician_assignments")
+insert_technician_assignment = _awaitable(supabase_service.insert_technician_assignment)
+patch_technician_assignment = _awaitable(supabase_service.patch_technician_assignment)
+patch_technician_assignment_if = _awaitable(supabase_service.patch_technician_assignment_if)
+save_technician_assignments = _awaitable(supabase_service.save_technician_assignments)
+delete_technician_assignment = _awaitable(supabase_service.delete_technician_assignment)
+
+# Legacy dispensers
+load_dispensers = _coalesced(supabase_service.load_dispensers, "machine_templates", "machine_instances")
+save_dispensers = _awaitable(supabase_service.save_dispensers)
+
+# Time indexes
+load_time_index = _awaitable(supabase_service.load_time_index)
@@ -4,11 +4,19 @@ Replaces Google Sheets service with Supabase client
 """
 
 import os
-from typing import List, Dict, Any, Optional
+import copy
+import threading
+import time
+from collections import OrderedDict
+from typing import List, Dict, Any, Optional, Callable, Hashable, Tuple
 
 from dotenv import load_dotenv
 from supabase import create_client, Client
 
+from cache_versions import TableVersions
+from timestamps import TIMESTAMP_COLUMNS, TimeIndex, to_utc_iso
+from usage_engine import CompiledSchedule, schedule_version
+
 # Load environment variables from a .env file (if present)
 load_dotenv()
 
@@ -27,29 +35,293 @@ if not SUPABASE_URL or not SUPABASE_KEY:
 # Initialize Supabase client
 supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
 
+# ============================================================================
+# READ-THROUGH CACHE
+# ============================================================================
+
+# Set DATA_CACHE_ENABLED=false to always read straight from Supabase
+DATA_CACHE_ENABLED = os.getenv("DATA_CACHE_ENABLED", "true").strip().lower() not in ("0", "false", "no")
+
+# Per-table TTLs in seconds. Reference tables change rarely; operational
+# tables are written by technicians throughout the day.
+CACHE_TTL_SECONDS = {
+    "users": 300,
+    "clients": 300,
+    "machine_templates": 600,
+    "schedules": 600,
+    "machine_instances": 60,
+    "refill_logs": 30,
+    "technician_assignments": 30,
+}
+
+# Maximum number of distinct queries (filter combinations) cached per table
+CACHE_MAX_ENTRIES = int(os.getenv("DATA_CACHE_MAX_ENTRIES", "64"))
+
+# Per-table write counters, shared by every worker when CACHE_VERSIONS_FILE
+# names a common file (start.sh sets one for several workers). Cache entries
+# remember the version they were loaded at and are misses once it moves.
+table_versions = TableVersions(CACHE_TTL_SECONDS, os.getenv("CACHE_VERSIONS_FILE"))
+
+
+class _TableCache:
+    """Process-local TTL + LRU cache for the query results of one table
+
+    Entries are (expires_at, table version, value); an entry loaded before
+    the table's latest write in any worker counts as expired.
+    """
+
+    def __init__(self, table: str, ttl_seconds: float, max_entries: int):
+        self.table = table
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _live(self, entry) -> bool:
+        return entry[0] >= time.monotonic() and entry[1] == table_versions.get(self.table)
+
+    def get(self, key: Hashable):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or not self._live(entry):
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[2]
+
+    def peek(self, key: Hashable, count_hit: bool = False):
+        """Return a live entry without counting a miss (optionally counting a hit)"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or not self._live(entry):
+                return None
+            if count_hit:
+                self.hits += 1
+            return entry[2]
+
+    def set(self, key: Hashable, value: Any, version: Optional[int] = None):
+        """Cache value under key, tagged with the table version it was loaded at
+        
+        Pass the version read before the query ran, so a write that lands
+        while it is in flight leaves the entry already stale.
+        """
+        if version is None:
+            version = table_versions.get(self.table)
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, version, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+                "ttl_seconds": self.ttl_seconds,
+                "max_entries": self.max_entries,
+                "version": table_versions.get(self.table),
+            }
+
+
+_caches: Dict[str, _TableCache] = {
+    table: _TableCache(table, ttl, CACHE_MAX_ENTRIES)
+    for table, ttl in CACHE_TTL_SECONDS.items()
+}
+
+
+def _copy_rows(rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Copy cached rows so callers can mutate them without corrupting the cache"""
+    return copy.deepcopy(rows)
+
+
+def _cached_load(table: str, key: Hashable, loader: Callable[[], List[Dict[str, Any]]], force_refresh: bool = False) -> List[Dict[str, Any]]:
+    """Serve a query from the table cache, running loader on a miss or forced refresh
+
+    Concurrent misses from the async endpoints are coalesced before they
+    reach the thread pool (see supabase_async), so no pool thread waits here.
+    """
+    cache = _caches[table]
+    if DATA_CACHE_ENABLED and not force_refresh:
+        rows = cache.get(key)
+        if rows is not None:
+            return _copy_rows(rows)
+
+    version = table_versions.get(table)
+    rows = loader()
+    if DATA_CACHE_ENABLED:
+        cache.set(key, _copy_rows(rows), version)
+    return rows
+
+
+def _get_by_key(table: str, column: str, value: Any, full_keys: tuple = ("all",),
+                status_filter: Optional[List[str]] = None) -> Optional[Dict[str, Any]]:
+    """Point lookup of one row by column == value
+
+    When every full-table query in full_keys is cached, the row comes from a
+    column -> row hash index over those cached rows (built once per cache
+    fill). Otherwise a single eq(column, value).limit(1) query is issued and
+    its result cached under ("by", column, value).
+    """
+    if value is None or value == "":
+        return None
+    cache = _caches[table]
+    if DATA_CACHE_ENABLED:
+        index_key = ("index", column) + tuple(full_keys)
+        index = cache.peek(index_key, count_hit=True)
+        if index is None:
+            version = table_versions.get(table)
+            cached = [cache.peek(key) for key in full_keys]
+            if all(rows is not None for rows in cached):
+                index = {}
+                for rows in cached:
+                    for row in rows:
+                        index.setdefault(row.get(column), row)
+                cache.set(index_key, index, version)
+        if index is not None:
+            row = index.get(value)
+            return copy.deepcopy(row) if row is not None else None
+
+    def _load():
+        query = supabase.table(table).select("*").eq(column, value)
+        if status_filter:
+            query = query.in_("status", status_filter)
+        response = query.limit(1).execute()
+        return response.data if response.data else []
+    rows = _cached_load(table, ("by", column, value), _load)
+    return rows[0] if rows else None
+
+
+def load_time_index(table: str, column: str, force_refresh: bool = False) -> TimeIndex:
+    """Rows of a table sorted by a pre-parsed timestamp column (see timestamps.TIMESTAMP_COLUMNS)
+
+    The index is built once per table load and cached next to the table's
+    rows, so writes to the table invalidate it too.
+    """
+    if column not in TIMESTAMP_COLUMNS.get(table, ()):
+        raise ValueError(f"No time index for {table}.{column}")
+    cache = _caches[table]
+    key = ("time_index", column)
+    if DATA_CACHE_ENABLED and not force_refresh:
+        index = cache.get(key)
+        if index is not None:
+            return index
+
+    version = table_versions.get(table)
+    if table == "refill_logs":
+        rows = load_refill_logs(force_refresh)
+    elif table == "technician_assignments":
+        rows = load_technician_assignments(force_refresh)
+    else:
+        rows = load_machine_instances(force_refresh) + load_client_machines(force_refresh).get("client_machines", [])
+    index = TimeIndex(rows, column)
+    if DATA_CACHE_ENABLED:
+        cache.set(key, index, version)
+    return index
+
+
+def get_cache_stats() -> Dict[str, Dict[str, Any]]:
+    """Hit/miss counters and sizes for every table cache"""
+    return {table: cache.stats() for table, cache in _caches.items()}
+
+
+# ============================================================================
+# SINGLE-ROW WRITE HELPERS
+# ============================================================================
+
+def _insert_row(table: str, row: Dict[str, Any]) -> Dict[str, Any]:
+    """Insert exactly one row and invalidate the table cache"""
+    response = supabase.table(table).insert(row).execute()
+    invalidate_cache(table)
+    return response.data[0] if response.data else row
+
+
+def _patch_row(table: str, key_column: str, key: Any, changes: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Update only the given columns of one row; returns the updated row or None if missing"""
+    response = supabase.table(table).update(changes).eq(key_column, key).execute()
+    invalidate_cache(table)
+    return response.data[0] if response.data else None
+
+
+class WriteConflictError(Exception):
+    """Raised when a conditional update finds the row changed since it was read"""
+
+
+def _patch_row_if(table: str, key_column: str, key: Any, expected: Dict[str, Any],
+                  changes: Dict[str, Any]) -> Dict[str, Any]:
+    """Update one row only if its columns still hold the expected values (compare-and-set)
+
+    The check and the write are a single UPDATE ... WHERE, so it is atomic
+    across workers and instances. On a mismatch (or a missing row) the
+    table cache is invalidated, so the caller's next read sees the current
+    row, and WriteConflictError is raised for the caller to re-read and retry.
+    """
+    query = supabase.table(table).update(changes).eq(key_column, key)
+    for column, value in expected.items():
+        query = query.is_(column, "null") if value is None else query.eq(column, value)
+    response = query.execute()
+    invalidate_cache(table)
+    if not response.data:
+        raise WriteConflictError(f"{table} row {key} was modified concurrently")
+    return response.data[0]
+
 # ============================================================================
 # USERS OPERATIONS
 # ============================================================================
 
 def load_users(force_refresh: bool = False) -> List[Dict[str, Any]]:
     """Load users from Supabase"""
-    response = supabase.table("users").select("*").execute()
-    return response.data if response.data else []
+    def _load():
+        response = supabase.table("users").select("*").execute()
+        return response.data if response.data else []
+    return _cached_load("users", "all", _load, force_refresh)
+
+
+def get_user_by_username(username: str) -> Optional[Dict[str, Any]]:
+    """Load one user by username (None if missing)"""
+    return _get_by_key("users", "username", username)
+
+
+def insert_user(user: Dict[str, Any]) -> Dict[str, Any]:
+    """Insert a single user"""
+    return _insert_row("users", user)
+
+
+def patch_user(username: str, changes: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Update only the given fields of a user"""
+    return _patch_row("users", "username", username, changes)
 
 
 def save_users(users: List[Dict[str, Any]]):
-    """Save users to Supabase"""
+    """Bulk upsert users (seeding and migrations only - use insert_user/patch_user for single rows)"""
     if not users:
         return
     
     # Upsert all users
     supabase.table("users").upsert(users, on_conflict="username").execute()
+    invalidate_cache("users")
 
 
 def delete_user(username: str):
     """Delete a user from Supabase"""
     try:
         result = supabase.table("users").delete().eq("username", username).execute()
+        invalidate_cache("users")
         return result
     except Exception as e:
         print(f"Error deleting user {username}: {e}")
@@ -62,22 +334,41 @@ def delete_user(username: str):
 
 def load_clients(force_refresh: bool = False) -> List[Dict[str, Any]]:
     """Load clients from Supabase"""
-    response = supabase.table("clients").select("*").execute()
-    return response.data if response.data else []
+    def _load():
+        response = supabase.table("clients").select("*").execute()
+        return response.data if response.data else []
+    return _cached_load("clients", "all", _load, force_refresh)
+
+
+def get_client_by_id(client_id: str) -> Optional[Dict[str, Any]]:
+    """Load one client by id (None if missing)"""
+    return _get_by_key("clients", "id", client_id)
+
+
+def insert_client(client: Dict[str, Any]) -> Dict[str, Any]:
+    """Insert a single client"""
+    return _insert_row("clients", client)
+
+
+def patch_client(client_id: str, changes: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Update only the given fields of a client"""
+    return _patch_row("clients", "id", client_id, changes)
 
 
 def save_clients(clients: List[Dict[str, Any]]):
-    """Save clients to Supabase"""
+    """Bulk upsert clients (bulk operations only - use insert_client/patch_client for single rows)"""
     if not clients:
         return
     
     supabase.table("clients").upsert(clients, on_conflict="id").execute()
+    invalidate_cache("clients")
 
 
 def delete_client(client_id: str):
     """Delete a client from Supabase"""
     try:
         result = supabase.table("clients").delete().eq("id", client_id).execute()
+        invalidate_cache("clients")
         return result
     except Exception as e:
         print(f"Error deleting client {client_id}: {e}")
@@ -90,22 +381,46 @@ def delete_client(client_id: str):
 
 def load_machine_templates(force_refresh: bool = False) -> List[Dict[str, Any]]:
     """Load machine templates from Supabase"""
-    response = supabase.table("machine_templates").select("*").execute()
-    return response.data if response.data else []
+    def _load():
+        response = supabase.table("machine_templates").select("*").execute()
+        return response.data if response.data else []
+    return _cached_load("machine_templates", "all", _load, force_refresh)
+
+
+def get_machine_template_by_id(template_id: str) -> Optional[Dict[str, Any]]:
+    """Load one machine template by id (None if missing)"""
+    return _get_by_key("machine_templates", "id", template_id)
+
+
+def get_machine_template_by_sku(sku: str) -> Optional[Dict[str, Any]]:
+    """Load the machine template with this SKU (None if missing)"""
+    return _get_by_key("machine_templates", "sku", sku)
+
+
+def insert_machine_template(template: Dict[str, Any]) -> Dict[str, Any]:
+    """Insert a single machine template"""
+    return _insert_row("machine_templates", template)
+
+
+def patch_machine_template(template_id: str, changes: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Update only the given fields of a machine template"""
+    return _patch_row("machine_templates", "id", template_id, changes)
 
 
 def save_machine_templates(templates: List[Dict[str, Any]]):
-    """Save machine templates to Supabase"""
+    """Bulk upsert machine templates (bulk operations only)"""
     if not templates:
         return
     
     supabase.table("machine_templates").upsert(templates, on_conflict="id").execute()
+    invalidate_cache("machine_templates")
 
 
 def delete_machine_template(template_id: str):
     """Delete a machine template from Supabase"""
     try:
         result = supabase.table("machine_templates").delete().eq("id", template_id).execute()
+        invalidate_cache("machine_templates")
         return result
     except Exception as e:
         print(f"Error deleting machine template {template_id}: {e}")
@@ -118,22 +433,87 @@ def delete_machine_template(template_id: str):
 
 def load_machine_instances(force_refresh: bool = False) -> List[Dict[str, Any]]:
     """Load machine instances from Supabase"""
-    response = supabase.table("machine_instances").select("*").eq("status", "installed").execute()
-    return response.data if response.data else []
+    def _load():
+        response = supabase.table("machine_instances").select("*").eq("status", "installed").execute()
+        return response.data if response.data else []
+    return _cached_load("machine_instances", "installed", _load, force_refresh)
+
+
+# Statuses served by load_machine_instances + load_client_machines
+_MACHINE_INSTANCE_STATUSES = ["installed", "assigned"]
+
+
+def get_machine_instance_by_id(instance_id: str) -> Optional[Dict[str, Any]]:
+    """Load one installed or assigned machine instance by id (None if missing)"""
+    return _get_by_key("machine_instances", "id", instance_id, ("installed", "assigned"), _MACHINE_INSTANCE_STATUSES)
+
+
+def get_machine_instance_by_code(unique_code: str) -> Optional[Dict[str, Any]]:
+    """Load the installed or assigned machine instance with this unique code (None if missing)"""
+    return _get_by_key("machine_instances", "unique_code", unique_code, ("installed", "assigned"), _MACHINE_INSTANCE_STATUSES)
+
+
+def load_machine_instances_by_ids(instance_ids: List[str], force_refresh: bool = False) -> List[Dict[str, Any]]:
+    """Load the installed or assigned machine instances with the given ids (missing ids are skipped)"""
+    ids = sorted({instance_id for instance_id in instance_ids if instance_id})
+    if not ids:
+        return []
+    def _load():
+        response = (
+            supabase.table("machine_instances")
+            .select("*")
+            .in_("id", ids)
+            .in_("status", _MACHINE_INSTANCE_STATUSES)
+            .execute()
+        )
+        return response.data if response.data else []
+    return _cached_load("machine_instances", ("ids", tuple(ids)), _load, force_refresh)
+
+
+def load_machine_instances_for_client(client_id: str, force_refresh: bool = False) -> List[Dict[str, Any]]:
+    """Load one client's installed and assigned machine instances (installed first)"""
+    def _load():
+        response = (
+            supabase.table("machine_instances")
+            .select("*")
+            .eq("client_id", client_id)
+            .in_("status", _MACHINE_INSTANCE_STATUSES)
+            .execute()
+        )
+        rows = response.data if response.data else []
+        return sorted(rows, key=lambda row: row.get("status") != "installed")
+    return _cached_load("machine_instances", ("client", client_id), _load, force_refresh)
+
+
+def insert_machine_instance(instance: Dict[str, Any]) -> Dict[str, Any]:
+    """Insert a single machine instance (any status, including 'assigned')"""
+    return _insert_row("machine_instances", instance)
+
+
+def patch_machine_instance(instance_id: str, changes: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Update only the given fields of a machine instance"""
+    return _patch_row("machine_instances", "id", instance_id, changes)
+
+
+def patch_machine_instance_if(instance_id: str, expected: Dict[str, Any], changes: Dict[str, Any]) -> Dict[str, Any]:
+    """Update a machine instance only if its fields still match expected (raises WriteConflictError)"""
+    return _patch_row_if("machine_instances", "id", instance_id, expected, changes)
 
 
 def save_machine_instances(instances: List[Dict[str, Any]]):
-    """Save machine instances to Supabase"""
+    """Bulk upsert machine instances (bulk operations only)"""
     if not instances:
         return
     
     supabase.table("machine_instances").upsert(instances, on_conflict="id").execute()
+    invalidate_cache("machine_instances")
 
 
 def delete_machine_instance(instance_id: str):
     """Delete a machine instance from Supabase"""
     try:
         result = supabase.table("machine_instances").delete().eq("id", instance_id).execute()
+        invalidate_cache("machine_instances")
         return result
     except Exception as e:
         print(f"Error deleting machine instance {instance_id}: {e}")
@@ -144,30 +524,93 @@ def delete_machine_instance(instance_id: str):
 # SCHEDULES OPERATIONS
 # ============================================================================
 
-def load_schedules(force_refresh: bool = False) -> List[Dict[str, Any]]:
-    """Load schedules from Supabase with time_ranges and intervals"""
-    schedules_response = supabase.table("schedules").select("*").execute()
-    schedules = schedules_response.data if schedules_response.data else []
+def _chunked(values: List[Any], size: int = 200):
+    """Yield successive slices of values so in_ filters stay within URL limits"""
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+def _load_schedule_children(table: str, schedule_ids: Optional[List[str]] = None) -> Dict[str, List[Dict[str, Any]]]:
+    """Load child rows of a schedule table grouped by schedule_id"""
+    rows: List[Dict[str, Any]] = []
+    if schedule_ids is None:
+        response = supabase.table(table).select("*").execute()
+        rows = response.data if response.data else []
+    else:
+        for chunk in _chunked(schedule_ids):
+            response = supabase.table(table).select("*").in_("schedule_id", chunk).execute()
+            rows.extend(response.data if response.data else [])
+    
+    grouped: Dict[str, List[Dict[str, Any]]] = {}
+    for row in rows:
+        grouped.setdefault(row.get("schedule_id"), []).append(row)
+    return grouped
+
+
+def load_schedules(force_refresh: bool = False, schedule_ids: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+    """Load schedules from Supabase with time_ranges and intervals
+    
+    Schedules, time ranges and intervals are fetched with one query per table
+    (chunked in_ filters when schedule_ids is given) and stitched in memory.
+    Pass schedule_ids to load only those schedules.
+    """
+    if schedule_ids is None:
+        return _cached_load("schedules", "all", _fetch_schedules, force_refresh)
+    
+    schedule_ids = list(dict.fromkeys(sid for sid in schedule_ids if sid))
+    if not schedule_ids:
+        return []
+    
+    # Serve subsets from a live full load when there is one
+    if DATA_CACHE_ENABLED and not force_refresh:
+        all_schedules = _caches["schedules"].peek("all", count_hit=True)
+        if all_schedules is not None:
+            wanted = set(schedule_ids)
+            return _copy_rows([sch for sch in all_schedules if sch.get("id") in wanted])
+    
+    key = ("ids",) + tuple(sorted(schedule_ids))
+    return _cached_load("schedules", key, lambda: _fetch_schedules(schedule_ids), force_refresh)
+
+
+def get_schedule_by_id(schedule_id: str) -> Optional[Dict[str, Any]]:
+    """Load one schedule with its time ranges and intervals (None if missing)"""
+    schedules = load_schedules(schedule_ids=[schedule_id])
+    return next((sch for sch in schedules if sch.get("id") == schedule_id), None)
+
+
+def _fetch_schedules(schedule_ids: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+    """Query schedules and their child rows, bypassing the cache"""
+    if schedule_ids is not None:
+        schedules = []
+        for chunk in _chunked(schedule_ids):
+            schedules_response = supabase.table("schedules").select("*").in_("id", chunk).execute()
+            schedules.extend(schedules_response.data if schedules_response.data else [])
+    else:
+        schedules_response = supabase.table("schedules").select("*").execute()
+        schedules = schedules_response.data if schedules_response.data else []
+    
+    if not schedules:
+        return []
+    
+    # Only filter child tables by id when a subset was requested
+    child_ids = [s.get("id") for s in schedules] if schedule_ids is not None else None
+    
+    # Load time ranges
+    try:
+        time_ranges_by_schedule = _load_schedule_children("schedule_time_ranges", child_ids)
+    except Exception as e:
+        time_ranges_by_schedule = {}
+    
+    # Load intervals
+    try:
+        intervals_by_schedule = _load_schedule_children("schedule_intervals", child_ids)
+    except Exception as e:
+        intervals_by_schedule = {}
     
-    # Load time ranges and intervals for each schedule
     for schedule in schedules:
         schedule_id = schedule.get("id")
-        
-        # Load time ranges
-        try:
-            time_ranges_response = supabase.table("schedule_time_ranges").select("*").eq("schedule_id", schedule_id).execute()
-            time_ranges_data = time_ranges_response.data if time_ranges_response.data else []
-            schedule["time_ranges"] = time_ranges_data
-        except Exception as e:
-            schedule["time_ranges"] = []
-        
-        # Load intervals
-        try:
-            intervals_response = supabase.table("schedule_intervals").select("*").eq("schedule_id", schedule_id).execute()
-            intervals_data = intervals_response.data if intervals_response.data else []
-            schedule["intervals"] = intervals_data
-        except Exception as e:
-            schedule["intervals"] = []
+        schedule["time_ranges"] = time_ranges_by_schedule.get(schedule_id, [])
+        schedule["intervals"] = intervals_by_schedule.get(schedule_id, [])
     
     return schedules
 
@@ -191,6 +634,7 @@ def save_schedule(schedule: Dict[str, Any]):
     
     # Upsert schedule
     supabase.table("schedules").upsert(schedule_data, on_conflict="id").execute()
+    invalidate_cache("schedules")
     
     # Handle time_ranges
     if schedule.get("time_ranges"):
@@ -228,6 +672,9 @@ def save_schedule(schedule: Dict[str, Any]):
         if intervals_data:
             supabase.table("schedule_intervals").insert(intervals_data).execute()
     
+    # Invalidate again so readers racing the child-row writes don't keep a partial schedule
+    invalidate_cache("schedules")
+    invalidate_compiled_schedule(schedule_id)
     return schedule
 
 
@@ -254,6 +701,8 @@ def save_schedule_time_ranges(schedule_id: str, time_ranges: List[Dict[str, Any]
                 "pause_seconds": tr.get("pause_seconds")
             })
         supabase.table("schedule_time_ranges").insert(time_ranges_data).execute()
+    invalidate_cache("schedules")
+    invalidate_compiled_schedule(schedule_id)
 
 
 def load_schedule_intervals(schedule_id: str, force_refresh: bool = False) -> List[Dict[str, Any]]:
@@ -277,6 +726,58 @@ def save_schedule_intervals(schedule_id: str, intervals: List[Dict[str, Any]]):
                 "pause_seconds": interval.get("pause_seconds")
             })
         supabase.table("schedule_intervals").insert(intervals_data).execute()
+    invalidate_cache("schedules")
+    invalidate_compiled_schedule(schedule_id)
+
+
+# schedule id -> (fresh_until, schedules table version, CompiledSchedule).
+# Fresh entries are served without touching the raw schedule rows; once
+# stale (after the schedules TTL, or a schedule write in any worker) the row
+# is reloaded and only recompiled if its version stamp changed. Saves and
+# deletes here and invalidate_cache("schedules") drop entries at once.
+_compiled_schedules: Dict[str, Tuple[float, int, CompiledSchedule]] = {}
+_compiled_schedules_lock = threading.Lock()
+
+
+def load_compiled_schedules(schedule_ids: Optional[List[str]] = None, force_refresh: bool = False) -> Dict[str, CompiledSchedule]:
+    """Load schedules as immutable CompiledSchedule objects keyed by schedule id"""
+    compiled: Dict[str, CompiledSchedule] = {}
+    to_load = schedule_ids
+    if schedule_ids is not None and DATA_CACHE_ENABLED and not force_refresh:
+        now = time.monotonic()
+        version = table_versions.get("schedules")
+        with _compiled_schedules_lock:
+            for schedule_id in schedule_ids:
+                entry = _compiled_schedules.get(schedule_id)
+                if entry is not None and entry[0] >= now and entry[1] == version:
+                    compiled[schedule_id] = entry[2]
+        to_load = [sid for sid in schedule_ids if sid and sid not in compiled]
+        if not to_load:
+            return compiled
+
+    version = table_versions.get("schedules")
+    schedules = load_schedules(force_refresh=force_refresh, schedule_ids=to_load)
+    fresh_until = time.monotonic() + CACHE_TTL_SECONDS["schedules"]
+    with _compiled_schedules_lock:
+        for schedule in schedules:
+            schedule_id = schedule.get("id")
+            entry = _compiled_schedules.get(schedule_id)
+            cached = entry[2] if entry is not None else None
+            stamp = schedule_version(schedule)
+            if cached is None or cached.version != stamp:
+                cached = CompiledSchedule(schedule, stamp)
+            _compiled_schedules[schedule_id] = (fresh_until, version, cached)
+            compiled[schedule_id] = cached
+    return compiled
+
+
+def invalidate_compiled_schedule(schedule_id: Optional[str] = None):
+    """Drop one compiled schedule, or all of them if no id is given"""
+    with _compiled_schedules_lock:
+        if schedule_id is None:
+            _compiled_schedules.clear()
+        else:
+            _compiled_schedules.pop(schedule_id, None)
 
 
 def delete_schedule(schedule_id: str):
@@ -289,6 +790,8 @@ def delete_schedule(schedule_id: str):
     
     # Delete schedule
     supabase.table("schedules").delete().eq("id", schedule_id).execute()
+    invalidate_cache("schedules")
+    invalidate_compiled_schedule(schedule_id)
 
 
 # ============================================================================
@@ -297,22 +800,117 @@ def delete_schedule(schedule_id: str):
 
 def load_refill_logs(force_refresh: bool = False) -> List[Dict[str, Any]]:
     """Load refill logs from Supabase"""
-    response = supabase.table("refill_logs").select("*").order("timestamp", desc=True).execute()
-    return response.data if response.data else []
+    def _load():
+        response = supabase.table("refill_logs").select("*").order("timestamp", desc=True).execute()
+        return response.data if response.data else []
+    return _cached_load("refill_logs", "all", _load, force_refresh)
+
+
+def _postgrest_literal(value: Any) -> str:
+    """Quote a value for use inside a PostgREST or=(...) filter"""
+    return '"' + str(value).replace("\\", "\\\\").replace('"', '\\"') + '"'
+
+
+def _filter_refill_logs(query, dispenser_id: Optional[str] = None, client_id: Optional[str] = None,
+                        technician_username: Optional[str] = None, fragrance_code: Optional[str] = None,
+                        start: Optional[str] = None, end: Optional[str] = None):
+    """Apply the refill-log filters to a PostgREST query
+
+    start/end are inclusive ISO bounds on timestamp, sent as UTC ISO strings
+    so every caller compares the same instants whatever offset it was given.
+    """
+    if dispenser_id:
+        query = query.eq("dispenser_id", dispenser_id)
+    if client_id:
+        query = query.eq("client_id", client_id)
+    if technician_username:
+        query = query.eq("technician_username", technician_username)
+    if fragrance_code:
+        query = query.eq("fragrance_code", fragrance_code)
+    if start:
+        query = query.gte("timestamp", to_utc_iso(start) or start)
+    if end:
+        query = query.lte("timestamp", to_utc_iso(end) or end)
+    return query
+
+
+def load_refill_logs_page(limit: Optional[int] = None, after: Optional[Tuple[Optional[str], str]] = None,
+                          dispenser_id: Optional[str] = None, client_id: Optional[str] = None,
+                          technician_username: Optional[str] = None, fragrance_code: Optional[str] = None,
+                          start: Optional[str] = None, end: Optional[str] = None,
+                          include_total: bool = False) -> Tuple[List[Dict[str, Any]], Optional[Tuple[Optional[str], str]], Optional[int]]:
+    """One page of refill logs, newest first, with every filter applied by PostgREST
+
+    Rows are ordered by (timestamp, id) descending, undated rows last. Paging
+    is keyset-based: pass the previous page's next key as after and the
+    query continues strictly below it, so every page costs the same however
+    deep it is. Not cached - pages are cheap and rarely requested twice.
+
+    Args:
+        limit: Page size (None returns every matching row)
+        after: (timestamp, id) of the last row already seen
+        start, end: Inclusive ISO bounds on timestamp
+        include_total: Also count every row matching the filters (a separate
+            head-only query, so the total is the same on every page)
+
+    Returns:
+        (rows, next key or None on the last page, total or None)
+    """
+    filters = dict(dispenser_id=dispenser_id, client_id=client_id, technician_username=technician_username,
+                   fragrance_code=fragrance_code, start=start, end=end)
+    query = _filter_refill_logs(supabase.table("refill_logs").select("*"), **filters)
+    if after is not None:
+        after_timestamp, after_id = after
+        if after_timestamp is None:
+            query = query.or_(f"and(timestamp.is.null,id.lt.{_postgrest_literal(after_id)})")
+        else:
+            ts = _postgrest_literal(after_timestamp)
+            query = query.or_(f"timestamp.lt.{ts},and(timestamp.eq.{ts},id.lt.{_postgrest_literal(after_id)}),timestamp.is.null")
+    
+    query = query.order("timestamp", desc=True, nullsfirst=False).order("id", desc=True)
+    if limit:
+        query = query.limit(limit + 1)  # One extra row tells whether another page exists
+    response = query.execute()
+    rows = response.data if response.data else []
+    
+    next_key = None
+    if limit and len(rows) > limit:
+        rows = rows[:limit]
+        next_key = (rows[-1].get("timestamp"), rows[-1].get("id"))
+    total = count_refill_logs(**filters) if include_total else None
+    return rows, next_key, total
+
+
+def insert_refill_log(refill_log: Dict[str, Any]) -> Dict[str, Any]:
+    """Insert a single refill log"""
+    return _insert_row("refill_logs", refill_log)
+
+
+def count_refill_logs(dispenser_id: Optional[str] = None, client_id: Optional[str] = None,
+                      technician_username: Optional[str] = None, fragrance_code: Optional[str] = None,
+                      start: Optional[str] = None, end: Optional[str] = None) -> int:
+    """Count the refill logs matching the filters without transferring any rows"""
+    query = supabase.table("refill_logs").select("id", count="exact", head=True)
+    response = _filter_refill_logs(query, dispenser_id=dispenser_id, client_id=client_id,
+                                   technician_username=technician_username, fragrance_code=fragrance_code,
+                                   start=start, end=end).execute()
+    return response.count or 0
 
 
 def save_refill_logs(refill_logs: List[Dict[str, Any]]):
-    """Save refill logs to Supabase"""
+    """Bulk upsert refill logs (bulk operations only - use insert_refill_log for new refills)"""
     if not refill_logs:
         return
     
     supabase.table("refill_logs").upsert(refill_logs, on_conflict="id").execute()
+    invalidate_cache("refill_logs")
 
 
 def delete_refill_logs_by_dispenser(dispenser_id: str):
     """Delete all refill logs for a specific dispenser"""
     try:
         result = supabase.table("refill_logs").delete().eq("dispenser_id", dispenser_id).execute()
+        invalidate_cache("refill_logs")
         return result
     except Exception as e:
         print(f"Error deleting refill logs for dispenser {dispenser_id}: {e}")
@@ -324,30 +922,82 @@ def delete_refill_logs_by_dispenser(dispenser_id: str):
 # TECHNICIAN ASSIGNMENTS OPERATIONS
 # ============================================================================
 
-def load_technician_assignments(force_refresh: bool = False, technician: Optional[str] = None, status: Optional[str] = None) -> List[Dict[str, Any]]:
-    """Load technician assignments from Supabase"""
-    query = supabase.table("technician_assignments").select("*")
-    
-    if technician:
-        query = query.eq("technician_username", technician)
-    if status:
-        query = query.eq("status", status)
-    
-    response = query.order("assigned_date", desc=True).execute()
-    return response.data if response.data else []
+# Cache key of the unfiltered technician assignments query
+_ALL_ASSIGNMENTS_KEY = (None, None, None, None, None, None, None)
+
+
+def load_technician_assignments(force_refresh: bool = False, technician: Optional[str] = None, status: Optional[str] = None,
+                                dispenser_id: Optional[str] = None, visit_date_from: Optional[str] = None,
+                                visit_date_to: Optional[str] = None, limit: Optional[int] = None,
+                                dispenser_ids: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+    """Load technician assignments from Supabase, newest assigned first
+
+    Every filter is applied by PostgREST, so only matching rows cross the
+    network. visit_date_from/visit_date_to are inclusive ISO bounds on
+    visit_date; limit caps the number of rows returned; dispenser_ids
+    restricts to a set of machines (e.g. one client's).
+    """
+    if dispenser_ids is not None and not dispenser_ids:
+        return []
+    def _load():
+        query = supabase.table("technician_assignments").select("*")
+        
+        if technician:
+            query = query.eq("technician_username", technician)
+        if status:
+            query = query.eq("status", status)
+        if dispenser_id:
+            query = query.eq("dispenser_id", dispenser_id)
+        if dispenser_ids is not None:
+            query = query.in_("dispenser_id", dispenser_ids)
+        if visit_date_from:
+            query = query.gte("visit_date", visit_date_from)
+        if visit_date_to:
+            query = query.lte("visit_date", visit_date_to)
+        
+        query = query.order("assigned_date", desc=True)
+        if limit:
+            query = query.limit(limit)
+        response = query.execute()
+        return response.data if response.data else []
+    key = (technician, status, dispenser_id, visit_date_from, visit_date_to, limit,
+           tuple(sorted(dispenser_ids)) if dispenser_ids is not None else None)
+    return _cached_load("technician_assignments", key, _load, force_refresh)
+
+
+def get_technician_assignment_by_id(assignment_id: str) -> Optional[Dict[str, Any]]:
+    """Load one technician assignment by id (None if missing)"""
+    return _get_by_key("technician_assignments", "id", assignment_id, (_ALL_ASSIGNMENTS_KEY,))
+
+
+def insert_technician_assignment(assignment: Dict[str, Any]) -> Dict[str, Any]:
+    """Insert a single technician assignment"""
+    return _insert_row("technician_assignments", assignment)
+
+
+def patch_technician_assignment(assignment_id: str, changes: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Update only the given fields of a technician assignment"""
+    return _patch_row("technician_assignments", "id", assignment_id, changes)
+
+
+def patch_technician_assignment_if(assignment_id: str, expected: Dict[str, Any], changes: Dict[str, Any]) -> Dict[str, Any]:
+    """Update a technician assignment only if its fields still match expected (raises WriteConflictError)"""
+    return _patch_row_if("technician_assignments", "id", assignment_id, expected, changes)
 
 
 def save_technician_assignments(assignments: List[Dict[str, Any]]):
-    """Save technician assignments to Supabase"""
+    """Bulk upsert technician assignments (bulk operations only)"""
     if not assignments:
         return
     
     supabase.table("technician_assignments").upsert(assignments, on_conflict="id").execute()
+    invalidate_cache("technician_assignments")
 
 
 def delete_technician_assignment(assignment_id: str):
     """Delete a technician assignment from Supabase"""
     supabase.table("technician_assignments").delete().eq("id", assignment_id).execute()
+    invalidate_cache("technician_assignments")
 
 
 # ============================================================================
@@ -356,8 +1006,10 @@ def delete_technician_assignment(assignment_id: str):
 
 def load_client_machines(force_refresh: bool = False) -> Dict[str, Any]:
     """Load assigned machines (status='assigned') from Supabase"""
-    response = supabase.table("machine_instances").select("*").eq("status", "assigned").execute()
-    assigned_machines = response.data if response.data else []
+    def _load():
+        response = supabase.table("machine_instances").select("*").eq("status", "assigned").execute()
+        return response.data if response.data else []
+    assigned_machines = _cached_load("machine_instances", "assigned", _load, force_refresh)
     
     return {"client_machines": assigned_machines}
 
@@ -369,6 +1021,7 @@ def save_client_machines(data: Dict[str, Any]):
         return
     
     supabase.table("machine_instances").upsert(assigned_machines, on_conflict="id").execute()
+    invalidate_cache("machine_instances")
 
 
 # ============================================================================
@@ -414,15 +1067,31 @@ def save_dispensers(dispensers: List[Dict[str, Any]]):
 
 
 # ============================================================================
-# CACHE MANAGEMENT (for compatibility with gsheets_service)
+# CACHE MANAGEMENT
 # ============================================================================
 
 def clear_data_cache():
-    """Clear cache - no-op for Supabase (data is always fresh)"""
-    pass
+    """Drop every cached table and compiled schedule in this process (hit/miss counters are kept)"""
+    for cache in _caches.values():
+        cache.clear()
+    invalidate_compiled_schedule()
 
 
 def invalidate_cache(cache_key: str = None):
-    """Invalidate cache - no-op for Supabase"""
-    pass
+    """Invalidate the cache for one table, or all tables if no key is given
+
+    Bumps the table's version, so every worker sharing CACHE_VERSIONS_FILE
+    drops its entries for the table too.
+    """
+    if cache_key is None:
+        for table in _caches:
+            table_versions.bump(table)
+        clear_data_cache()
+        return
+    table_versions.bump(cache_key)
+    cache = _caches.get(cache_key)
+    if cache:
+        cache.clear()
+    if cache_key == "schedules":
+        invalidate_compiled_schedule()
 
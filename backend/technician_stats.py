@@ -0,0 +1,251 @@
+"""
+Technician statistics rollups
+
+Per-technician, per-day buckets of assignment and refill counts, kept
+current by the assignment and refill write endpoints. Stats for any date
+range are the sum of the day buckets in that range (found by bisect over
+each technician's sorted day keys), so no request rescans the raw
+assignment and refill history. Writes to those tables from other workers
+(seen through the shared table versions) trigger a full rebuild on the
+next query.
+
+Days are UTC calendar days ("YYYY-MM-DD"); assignments are bucketed by
+assigned_date and refills by timestamp, matching the fields the per-
+technician stats endpoint has always filtered on.
+"""
+
+import os
+import threading
+import time
+from bisect import bisect_left, bisect_right, insort
+from collections import Counter
+from typing import Any, Dict, List, Optional
+
+from supabase_service import load_time_index, table_versions
+from timestamps import epoch_us_to_day, to_epoch_us
+
+TECHNICIAN_STATS_TTL_SECONDS = int(os.getenv("TECHNICIAN_STATS_TTL_SECONDS", "300"))
+
+# Tables the rollups are built from
+_SOURCE_TABLES = ("technician_assignments", "refill_logs")
+
+# Loads a rebuild retries when incremental updates land while it is loading
+_REBUILD_ATTEMPTS = 3
+
+# Rows with no date fall into the epoch bucket, as the old string filters did
+_NO_DATE_DAY = "1970-01-01"
+
+
+def day_key(value: Optional[str]) -> str:
+    """UTC calendar day of an ISO timestamp, as "YYYY-MM-DD" """
+    epoch_us = to_epoch_us(value)
+    return epoch_us_to_day(epoch_us) if epoch_us is not None else _NO_DATE_DAY
+
+
+def _technician(row: Dict[str, Any]) -> str:
+    return str(row.get("technician_username") or "").strip()
+
+
+class _DayBucket:
+    __slots__ = ("assigned", "completed", "pending", "cancelled", "refills", "ml_refilled", "visits")
+
+    def __init__(self):
+        self.assigned = 0
+        self.completed = 0
+        self.pending = 0
+        self.cancelled = 0
+        self.refills = 0
+        self.ml_refilled = 0.0
+        self.visits = Counter()  # "<dispenser_id>_<completed day>" -> completed assignments
+
+
+class TechnicianStatsRollup:
+    """Day-bucketed assignment/refill counters for every technician"""
+
+    def __init__(self, ttl_seconds: int = TECHNICIAN_STATS_TTL_SECONDS):
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.RLock()
+        self._built_at: Optional[float] = None
+        self._foreign_writes = 0  # Other workers' source writes at build time
+        self._generation = 0      # Bumped by every incremental update
+        self._buckets: Dict[str, Dict[str, _DayBucket]] = {}   # technician -> day -> bucket
+        self._days: Dict[str, List[str]] = {}                  # technician -> sorted day keys
+        self._refills_by_dispenser: Dict[str, List[tuple]] = {}  # dispenser_id -> [(technician, day, ml)]
+
+    # ------------------------------------------------------------------
+    # Building
+    # ------------------------------------------------------------------
+
+    def rebuild(self) -> None:
+        """Rebuild every bucket from the assignment and refill tables
+
+        Uses the pre-parsed time indexes, so each row's day comes from its
+        epoch value instead of parsing the ISO string again. The indexes are
+        loaded without holding the lock; if an incremental update lands
+        meanwhile the load is repeated, and if updates keep landing the
+        rollup is left marked stale so the next query rebuilds again.
+        """
+        for attempt in range(_REBUILD_ATTEMPTS):
+            with self._lock:
+                generation = self._generation
+            foreign_writes = table_versions.foreign_writes(_SOURCE_TABLES)
+            assignments = load_time_index("technician_assignments", "assigned_date")
+            refill_logs = load_time_index("refill_logs", "timestamp")
+            with self._lock:
+                raced = self._generation != generation
+                if raced and attempt + 1 < _REBUILD_ATTEMPTS:
+                    continue
+                self._buckets = {}
+                self._days = {}
+                self._refills_by_dispenser = {}
+                for epoch_us, assignment in assignments.items():
+                    self._apply_assignment(assignment, 1, epoch_us_to_day(epoch_us))
+                for assignment in assignments.undated:
+                    self._apply_assignment(assignment, 1, _NO_DATE_DAY)
+                for epoch_us, refill in refill_logs.items():
+                    self._apply_refill(refill, epoch_us_to_day(epoch_us))
+                for refill in refill_logs.undated:
+                    self._apply_refill(refill, _NO_DATE_DAY)
+                self._foreign_writes = foreign_writes
+                self._built_at = None if raced else time.time()
+                return
+
+    def _ensure_fresh(self) -> None:
+        if (self._built_at is None or time.time() - self._built_at > self.ttl_seconds
+                or table_versions.foreign_writes(_SOURCE_TABLES) != self._foreign_writes):
+            self.rebuild()
+
+    def invalidate(self) -> None:
+        """Force a full rebuild on the next query"""
+        with self._lock:
+            self._built_at = None
+
+    # ------------------------------------------------------------------
+    # Incremental updates (no-ops until the first query builds the rollup)
+    # ------------------------------------------------------------------
+
+    def add_assignment(self, assignment: Dict[str, Any]) -> None:
+        with self._lock:
+            self._generation += 1
+            if self._built_at is not None:
+                self._apply_assignment(assignment, 1)
+
+    def replace_assignment(self, old: Dict[str, Any], new: Dict[str, Any]) -> None:
+        """Move an assignment's contribution after an update or completion"""
+        with self._lock:
+            self._generation += 1
+            if self._built_at is not None:
+                self._apply_assignment(old, -1)
+                self._apply_assignment(new, 1)
+
+    def remove_assignment(self, assignment: Dict[str, Any]) -> None:
+        with self._lock:
+            self._generation += 1
+            if self._built_at is not None:
+                self._apply_assignment(assignment, -1)
+
+    def add_refill(self, refill: Dict[str, Any]) -> None:
+        with self._lock:
+            self._generation += 1
+            if self._built_at is not None:
+                self._apply_refill(refill)
+
+    def remove_refills_for_dispenser(self, dispenser_id: str) -> None:
+        """Subtract every refill of a machine whose logs were deleted"""
+        with self._lock:
+            self._generation += 1
+            for technician, day, ml in self._refills_by_dispenser.pop(dispenser_id, []):
+                bucket = self._buckets[technician][day]
+                bucket.refills -= 1
+                bucket.ml_refilled -= ml
+
+    # ------------------------------------------------------------------
+    # Queries
+    # ------------------------------------------------------------------
+
+    def stats_for(self, technician_username: str, start_date: Optional[str] = None,
+                  end_date: Optional[str] = None) -> Dict[str, Any]:
+        """Stats for one technician over [start_date, end_date] (whole UTC days, inclusive)"""
+        self._ensure_fresh()
+        with self._lock:
+            return self._sum(str(technician_username or "").strip(), technician_username, start_date, end_date)
+
+    def stats_for_all(self, start_date: Optional[str] = None, end_date: Optional[str] = None,
+                      technicians: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        """Stats for every technician with activity, plus any extra usernames given"""
+        self._ensure_fresh()
+        with self._lock:
+            names = set(self._buckets)
+            names.update(str(name).strip() for name in technicians or [])
+            names.discard("")
+            return [self._sum(name, name, start_date, end_date) for name in sorted(names)]
+
+    # ------------------------------------------------------------------
+    # Internals (callers hold the lock)
+    # ------------------------------------------------------------------
+
+    def _bucket(self, technician: str, day: str) -> _DayBucket:
+        days = self._buckets.setdefault(technician, {})
+        bucket = days.get(day)
+        if bucket is None:
+            bucket = days[day] = _DayBucket()
+            insort(self._days.setdefault(technician, []), day)
+        return bucket
+
+    def _apply_assignment(self, assignment: Dict[str, Any], sign: int, day: Optional[str] = None) -> None:
+        bucket = self._bucket(_technician(assignment), day or day_key(assignment.get("assigned_date")))
+        bucket.assigned += sign
+        status = assignment.get("status")
+        if status == "completed":
+            bucket.completed += sign
+            if assignment.get("completed_date"):
+                visit_key = f"{assignment.get('dispenser_id')}_{assignment.get('completed_date', '')[:10]}"
+                bucket.visits[visit_key] += sign
+                if bucket.visits[visit_key] <= 0:
+                    del bucket.visits[visit_key]
+        elif status == "pending":
+            bucket.pending += sign
+        elif status == "cancelled":
+            bucket.cancelled += sign
+
+    def _apply_refill(self, refill: Dict[str, Any], day: Optional[str] = None) -> None:
+        technician = _technician(refill)
+        day = day or day_key(refill.get("timestamp"))
+        ml = float(refill.get("refill_amount_ml") or 0)
+        bucket = self._bucket(technician, day)
+        bucket.refills += 1
+        bucket.ml_refilled += ml
+        self._refills_by_dispenser.setdefault(refill.get("dispenser_id"), []).append((technician, day, ml))
+
+    def _sum(self, technician: str, label: str, start_date: Optional[str], end_date: Optional[str]) -> Dict[str, Any]:
+        days = self._days.get(technician, [])
+        lo = bisect_left(days, day_key(start_date)) if start_date else 0
+        hi = bisect_right(days, day_key(end_date)) if end_date else len(days)
+
+        assigned = completed = pending = cancelled = refills = 0
+        ml_refilled = 0.0
+        visits = set()
+        buckets = self._buckets.get(technician, {})
+        for day in days[lo:hi]:
+            bucket = buckets[day]
+            assigned += bucket.assigned
+            completed += bucket.completed
+            pending += bucket.pending
+            cancelled += bucket.cancelled
+            refills += bucket.refills
+            ml_refilled += bucket.ml_refilled
+            visits.update(bucket.visits)
+
+        return {
+            "technician_username": label,
+            "machines_assigned": assigned,
+            "refills_completed": refills,
+            "pending_refills": pending,
+            "completed_tasks": completed,
+            "cancelled_tasks": cancelled,
+            "visit_count": len(visits),
+            "total_ml_refilled": round(ml_refilled, 2)
+        }
+
+
+technician_stats = TechnicianStatsRollup()
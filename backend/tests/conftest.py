@@ -0,0 +1,70 @@
+"""
+Shared fixtures: every test runs the real app against a fresh in-memory
+Supabase stand-in (tests/fake_supabase.py) with empty caches and indexes.
+"""
+
+import os
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+# supabase_service refuses to import without credentials; the client is replaced below
+os.environ.setdefault("SUPABASE_URL", "https://test.supabase.co")
+os.environ.setdefault("SUPABASE_SERVICE_ROLE_KEY", "eyJhbGciOiJIUzI1NiJ9.e30.test")
+os.environ.setdefault("TOKEN_SECRET", "test-secret")
+
+import bcrypt
+import pytest
+from fastapi.testclient import TestClient
+
+# Minimum-cost bcrypt so logins don't dominate the suite's run time
+_gensalt = bcrypt.gensalt
+bcrypt.gensalt = lambda rounds=12, prefix=b"2b": _gensalt(4, prefix)
+
+import supabase_service
+import main
+from fake_supabase import FakeSupabase
+from refill_index import refill_index
+from technician_stats import technician_stats
+
+
+def _reset_state():
+    supabase_service.clear_data_cache()
+    supabase_service.invalidate_compiled_schedule()
+    refill_index.invalidate()
+    technician_stats.invalidate()
+    main._verified_tokens.clear()
+
+
+@pytest.fixture
+def fake_db(monkeypatch):
+    db = FakeSupabase()
+    monkeypatch.setattr(supabase_service, "supabase", db)
+    _reset_state()
+    yield db
+    _reset_state()
+
+
+@pytest.fixture
+def client(fake_db):
+    """TestClient with the startup handler run (default users and schedules seeded)"""
+    with TestClient(main.app) as test_client:
+        yield test_client
+
+
+def login(client, username, password):
+    response = client.post("/api/login", json={"username": username, "password": password})
+    assert response.status_code == 200, response.text
+    return {"Authorization": f"Bearer {response.json()['token']}"}
+
+
+@pytest.fixture
+def admin_headers(client):
+    return login(client, "admin1", "admin123")
+
+
+@pytest.fixture
+def technician_headers(client):
+    return login(client, "tech1", "tech123")
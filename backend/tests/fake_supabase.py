@@ -0,0 +1,203 @@
+"""
+In-memory stand-in for the synchronous Supabase client.
+
+Implements the subset of the PostgREST query builder the data layer uses
+(select/insert/upsert/update/delete, eq/neq/in_/gte/lte/lt/gt/is_, or_,
+order with nulls last, limit/range and exact counts) over plain lists of
+dicts, so endpoint tests run without a database.
+"""
+
+import copy
+import re
+import threading
+from typing import Any, Dict, List, Optional
+
+_OR_CLAUSE = re.compile(r'and\((?:[^()"]|"(?:[^"\\]|\\.)*")*\)|(?:[^,"]|"(?:[^"\\]|\\.)*")+')
+_AND_PART = re.compile(r'(?:[^,"]|"(?:[^"\\]|\\.)*")+')
+
+
+def _unquote(value: str) -> str:
+    if len(value) >= 2 and value[0] == value[-1] == '"':
+        return re.sub(r'\\(.)', r'\1', value[1:-1])
+    return value
+
+
+def _compare(op: str, actual: Any, expected: Any) -> bool:
+    if op == "is":
+        return actual is None
+    if actual is None:
+        return False
+    if not isinstance(actual, str):
+        actual = str(actual)
+    return {
+        "eq": actual == expected,
+        "neq": actual != expected,
+        "lt": actual < expected,
+        "lte": actual <= expected,
+        "gt": actual > expected,
+        "gte": actual >= expected,
+    }[op]
+
+
+class FakeResponse:
+    def __init__(self, data: List[Dict[str, Any]], count: Optional[int] = None):
+        self.data = data
+        self.count = count
+
+
+class FakeQuery:
+    """Chainable query over one table of a FakeSupabase"""
+
+    def __init__(self, db: "FakeSupabase", table: str):
+        self.db = db
+        self.table = table
+        self.op = "select"
+        self.filters = []
+        self.orders = []
+        self.row_limit = None
+        self.row_offset = 0
+        self.payload = None
+        self.count = None
+        self.head = False
+        self.on_conflict = "id"
+
+    # Operations
+    def select(self, *columns, count=None, head=None):
+        self.op, self.count, self.head = "select", count, bool(head)
+        return self
+
+    def insert(self, json, **kwargs):
+        self.op, self.payload = "insert", json
+        return self
+
+    def upsert(self, json, on_conflict="id", **kwargs):
+        self.op, self.payload, self.on_conflict = "upsert", json, on_conflict or "id"
+        return self
+
+    def update(self, json, **kwargs):
+        self.op, self.payload = "update", json
+        return self
+
+    def delete(self, **kwargs):
+        self.op = "delete"
+        return self
+
+    # Filters
+    def eq(self, column, value):
+        self.filters.append(lambda row: row.get(column) == value)
+        return self
+
+    def neq(self, column, value):
+        self.filters.append(lambda row: row.get(column) != value)
+        return self
+
+    def in_(self, column, values):
+        values = list(values)
+        self.filters.append(lambda row: row.get(column) in values)
+        return self
+
+    def is_(self, column, value):
+        self.filters.append(lambda row: row.get(column) is None)
+        return self
+
+    def _range_filter(self, op, column, value):
+        self.filters.append(lambda row: _compare(op, row.get(column), value))
+        return self
+
+    def gt(self, column, value):
+        return self._range_filter("gt", column, value)
+
+    def gte(self, column, value):
+        return self._range_filter("gte", column, value)
+
+    def lt(self, column, value):
+        return self._range_filter("lt", column, value)
+
+    def lte(self, column, value):
+        return self._range_filter("lte", column, value)
+
+    def or_(self, expression):
+        """PostgREST or=(...) with column.op.value terms and nested and(...) groups"""
+        clauses = []
+        for clause in _OR_CLAUSE.findall(expression):
+            terms = _AND_PART.findall(clause[4:-1]) if clause.startswith("and(") else [clause]
+            parsed = []
+            for term in terms:
+                column, op, value = term.split(".", 2)
+                parsed.append((column, op, _unquote(value)))
+            clauses.append(parsed)
+
+        def matches(row):
+            return any(all(_compare(op, row.get(column), value) for column, op, value in terms) for terms in clauses)
+        self.filters.append(matches)
+        return self
+
+    # Modifiers
+    def order(self, column, desc=False, nullsfirst=False, **kwargs):
+        self.orders.append((column, desc, nullsfirst))
+        return self
+
+    def limit(self, count):
+        self.row_limit = count
+        return self
+
+    def range(self, start, end):
+        self.row_offset, self.row_limit = start, end - start + 1
+        return self
+
+    def _matching(self, rows):
+        return [row for row in rows if all(f(row) for f in self.filters)]
+
+    def execute(self) -> FakeResponse:
+        with self.db.lock:
+            self.db.queries.append((self.table, self.op))
+            rows = self.db.tables.setdefault(self.table, [])
+            if self.op == "select":
+                out = self._matching(rows)
+                for column, desc, nullsfirst in reversed(self.orders):
+                    present = sorted((r for r in out if r.get(column) is not None),
+                                     key=lambda r: r.get(column), reverse=desc)
+                    missing = [r for r in out if r.get(column) is None]
+                    out = missing + present if nullsfirst else present + missing
+                total = len(out)
+                out = out[self.row_offset:]
+                if self.row_limit is not None:
+                    out = out[:self.row_limit]
+                return FakeResponse([] if self.head else copy.deepcopy(out), total if self.count else None)
+
+            if self.op in ("insert", "upsert"):
+                items = self.payload if isinstance(self.payload, list) else [self.payload]
+                for item in items:
+                    existing = None
+                    if self.op == "upsert":
+                        existing = next((r for r in rows if r.get(self.on_conflict) == item.get(self.on_conflict)), None)
+                    if existing is not None:
+                        existing.update(copy.deepcopy(item))
+                    else:
+                        rows.append(copy.deepcopy(item))
+                return FakeResponse(copy.deepcopy(items))
+
+            matched = self._matching(rows)
+            if self.op == "update":
+                for row in matched:
+                    row.update(copy.deepcopy(self.payload))
+                return FakeResponse(copy.deepcopy(matched))
+
+            # delete
+            rows[:] = [row for row in rows if row not in matched]
+            return FakeResponse(copy.deepcopy(matched))
+
+
+class FakeSupabase:
+    """Tables are lists of row dicts; queries lists every executed (table, operation)"""
+
+    def __init__(self):
+        self.tables: Dict[str, List[Dict[str, Any]]] = {}
+        self.queries: List[tuple] = []
+        self.lock = threading.RLock()
+
+    def table(self, name: str) -> FakeQuery:
+        return FakeQuery(self, name)
+
+    def rpc(self, fn, params=None):
+        raise NotImplementedError(f"rpc {fn} is not supported by the fake client")
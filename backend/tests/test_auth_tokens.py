@@ -0,0 +1,145 @@
+"""Access/refresh token issuing, renewal and key-ring verification"""
+
+import base64
+import hashlib
+import hmac
+import time
+
+import pytest
+
+import main
+from conftest import login
+from token_keys import KeyRing
+
+
+def legacy_token(payload, secret="test-secret"):
+    """A token in the pre-key-ring format: <base64 payload>.<signature>"""
+    signature = hmac.new(secret.encode(), payload.encode(), hashlib.sha256).hexdigest()
+    return f"{base64.urlsafe_b64encode(payload.encode()).decode()}.{signature}"
+
+
+def bearer(token):
+    return {"Authorization": f"Bearer {token}"}
+
+
+@pytest.fixture
+def ring(monkeypatch):
+    ring = KeyRing({"new": "new-secret", "old": "old-secret", "default": "test-secret"}, "new")
+    monkeypatch.setattr(main, "key_ring", ring)
+    return ring
+
+
+def test_login_returns_working_access_and_refresh_tokens(client):
+    response = client.post("/api/login", json={"username": "admin1", "password": "admin123"}).json()
+    assert client.get("/api/users", headers=bearer(response["token"])).status_code == 200
+
+    renewed = client.post("/api/token/refresh", json={"refresh_token": response["refresh_token"]})
+    assert renewed.status_code == 200
+    assert renewed.json()["username"] == "admin1" and renewed.json()["role"] == "admin"
+    assert client.get("/api/users", headers=bearer(renewed.json()["token"])).status_code == 200
+
+
+def test_tokens_cannot_stand_in_for_each_other(client):
+    response = client.post("/api/login", json={"username": "tech1", "password": "tech123"}).json()
+    assert client.get("/api/schedules", headers=bearer(response["refresh_token"])).status_code == 401
+    assert client.post("/api/token/refresh", json={"refresh_token": response["token"]}).status_code == 401
+
+
+def test_expired_tokens_are_rejected(client, monkeypatch):
+    response = client.post("/api/login", json={"username": "tech1", "password": "tech123"}).json()
+    later = time.time() + main.REFRESH_TOKEN_TTL_SECONDS + 1
+    monkeypatch.setattr(main.time, "time", lambda: later)
+    assert client.get("/api/schedules", headers=bearer(response["token"])).status_code == 401
+    assert client.post("/api/token/refresh", json={"refresh_token": response["refresh_token"]}).status_code == 401
+
+
+def test_renewal_does_not_extend_the_session(client, monkeypatch):
+    started = time.time()
+    refresh_token = client.post("/api/login", json={"username": "tech1", "password": "tech123"}).json()["refresh_token"]
+    # Renew every 10 days: each renewal works until 30 days after the login, then the session is over
+    for days in (10, 20, 29):
+        monkeypatch.setattr(main.time, "time", lambda days=days: started + days * 86400)
+        renewed = client.post("/api/token/refresh", json={"refresh_token": refresh_token})
+        assert renewed.status_code == 200
+        refresh_token = renewed.json()["refresh_token"]
+
+    monkeypatch.setattr(main.time, "time", lambda: started + main.REFRESH_TOKEN_TTL_SECONDS + 1)
+    assert client.post("/api/token/refresh", json={"refresh_token": refresh_token}).status_code == 401
+
+
+def test_deleted_users_cannot_renew(client, admin_headers):
+    refresh_token = client.post("/api/login", json={"username": "tech1", "password": "tech123"}).json()["refresh_token"]
+    assert client.post("/api/token/refresh", json={"refresh_token": refresh_token}).status_code == 200
+
+    assert client.delete("/api/users/tech1", headers=admin_headers).status_code == 200
+    assert client.post("/api/token/refresh", json={"refresh_token": refresh_token}).status_code == 401
+
+
+def test_demoted_users_cannot_renew_with_their_old_role(client, admin_headers):
+    created = client.post("/api/users", json={"username": "boss", "password": "boss123", "role": "admin"},
+                          headers=admin_headers)
+    assert created.status_code == 200, created.text
+    refresh_token = client.post("/api/login", json={"username": "boss", "password": "boss123"}).json()["refresh_token"]
+
+    assert client.put("/api/users/boss", json={"role": "technician"}, headers=admin_headers).status_code == 200
+    assert client.post("/api/token/refresh", json={"refresh_token": refresh_token}).status_code == 401
+
+    relogin = client.post("/api/login", json={"username": "boss", "password": "boss123"}).json()
+    renewed = client.post("/api/token/refresh", json={"refresh_token": relogin["refresh_token"]})
+    assert renewed.status_code == 200 and renewed.json()["role"] == "technician"
+
+
+def test_a_password_change_ends_existing_sessions(client, admin_headers):
+    old_session = client.post("/api/login", json={"username": "tech1", "password": "tech123"}).json()["refresh_token"]
+    renewed = client.post("/api/token/refresh", json={"refresh_token": old_session}).json()["refresh_token"]
+
+    assert client.put("/api/users/tech1", json={"password": "changed456"}, headers=admin_headers).status_code == 200
+    for token in (old_session, renewed):
+        assert client.post("/api/token/refresh", json={"refresh_token": token}).status_code == 401
+
+    new_session = client.post("/api/login", json={"username": "tech1", "password": "changed456"}).json()["refresh_token"]
+    assert client.post("/api/token/refresh", json={"refresh_token": new_session}).status_code == 200
+
+
+def test_deleted_clients_cannot_renew(client, fake_db):
+    import supabase_service
+
+    fake_db.tables["clients"] = [{"id": "C1", "name": "One", "password": main.hash_password("client123")}]
+    response = client.post("/api/client-login", json={"username": "C1", "password": "client123"})
+    assert response.status_code == 200, response.text
+    refresh_token = response.json()["refresh_token"]
+    renewed = client.post("/api/token/refresh", json={"refresh_token": refresh_token})
+    assert renewed.status_code == 200 and renewed.json()["client_id"] == "C1"
+
+    fake_db.tables["clients"] = []
+    supabase_service.invalidate_cache("clients")
+    assert client.post("/api/token/refresh", json={"refresh_token": refresh_token}).status_code == 401
+
+
+def test_tokens_name_the_active_key(client, ring):
+    token = login(client, "tech1", "tech123")["Authorization"][7:]
+    assert token.split(".")[0] == "new"
+
+
+def test_older_keys_in_the_ring_still_verify(client, ring):
+    payload = f"tech1|technician|{int(time.time())}"
+    token = f"old.{base64.urlsafe_b64encode(payload.encode()).decode()}.{ring.sign(payload, 'old')}"
+    assert client.get("/api/schedules", headers=bearer(token)).status_code == 200
+
+
+def test_unknown_key_ids_and_bad_signatures_are_rejected(client, ring):
+    payload = f"tech1|technician|{int(time.time())}"
+    encoded = base64.urlsafe_b64encode(payload.encode()).decode()
+    assert client.get("/api/schedules", headers=bearer(f"gone.{encoded}.{ring.sign(payload)}")).status_code == 401
+    assert client.get("/api/schedules", headers=bearer(f"new.{encoded}.{ring.sign(payload, 'old')}")).status_code == 401
+
+
+def test_legacy_two_part_tokens_verify_under_the_default_key(client, ring):
+    token = legacy_token(f"tech1|technician|{int(time.time())}")
+    assert client.get("/api/schedules", headers=bearer(token)).status_code == 200
+
+    forged = legacy_token(f"tech1|technician|{int(time.time())}", secret="someone-else")
+    assert client.get("/api/schedules", headers=bearer(forged)).status_code == 401
+
+    refresh = legacy_token(f"refresh|tech1|technician|{int(time.time())}")
+    assert client.post("/api/token/refresh", json={"refresh_token": refresh}).status_code == 200
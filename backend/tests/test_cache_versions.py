@@ -0,0 +1,66 @@
+"""Writes in one worker invalidate the other workers' caches through the shared version file"""
+
+import pytest
+
+import refill_index
+import supabase_service
+import technician_stats
+from cache_versions import TableVersions
+
+TABLES = tuple(supabase_service.CACHE_TTL_SECONDS)
+
+
+@pytest.fixture
+def versions_file(tmp_path, monkeypatch):
+    """Point this process (worker A) at a shared version file and return its path"""
+    path = str(tmp_path / "cache-versions")
+    worker_a = TableVersions(TABLES, path)
+    for module in (supabase_service, refill_index, technician_stats):
+        monkeypatch.setattr(module, "table_versions", worker_a)
+    return path
+
+
+def test_counters_are_shared_between_processes(tmp_path):
+    path = str(tmp_path / "cache-versions")
+    worker_a, worker_b = TableVersions(TABLES, path), TableVersions(TABLES, path)
+
+    worker_b.bump("users")
+    worker_b.bump("users")
+    worker_a.bump("users")
+
+    assert worker_a.get("users") == worker_b.get("users") == 3
+    assert worker_a.foreign_writes(["users"]) == 2
+    assert worker_b.foreign_writes(["users"]) == 1
+    assert worker_a.get("clients") == 0
+
+
+def test_another_workers_write_invalidates_cached_rows_and_misses(fake_db, versions_file):
+    fake_db.tables["clients"] = [{"id": "C1", "name": "One"}]
+    fake_db.tables["users"] = []
+    assert supabase_service.load_clients() == [{"id": "C1", "name": "One"}]
+    assert supabase_service.get_user_by_username("new_tech") is None
+
+    # Worker B writes both tables
+    worker_b = TableVersions(TABLES, versions_file)
+    fake_db.tables["clients"][0]["name"] = "Renamed"
+    fake_db.tables["users"].append({"username": "new_tech", "role": "technician"})
+    worker_b.bump("clients")
+    worker_b.bump("users")
+
+    assert supabase_service.load_clients() == [{"id": "C1", "name": "Renamed"}]
+    assert supabase_service.get_user_by_username("new_tech")["role"] == "technician"
+
+
+def test_another_workers_refill_rebuilds_the_stats_rollup(fake_db, versions_file):
+    fake_db.tables["technician_assignments"] = []
+    fake_db.tables["refill_logs"] = [
+        {"id": "r1", "dispenser_id": "m1", "technician_username": "tech1", "refill_amount_ml": 50,
+         "timestamp": "2026-10-01T08:00:00+00:00"},
+    ]
+    assert technician_stats.technician_stats.stats_for("tech1")["refills_completed"] == 1
+
+    fake_db.tables["refill_logs"].append({"id": "r2", "dispenser_id": "m1", "technician_username": "tech1",
+                                          "refill_amount_ml": 50, "timestamp": "2026-10-02T08:00:00+00:00"})
+    TableVersions(TABLES, versions_file).bump("refill_logs")
+
+    assert technician_stats.technician_stats.stats_for("tech1")["refills_completed"] == 2
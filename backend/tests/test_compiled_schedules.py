@@ -0,0 +1,46 @@
+"""Compiled schedules are reused without reloading raw rows until a schedule changes"""
+
+import supabase_service
+
+
+def seed(fake_db):
+    fake_db.tables["schedules"] = [{"id": "s1", "name": "One"}, {"id": "s2", "name": "Two"}]
+    fake_db.tables["schedule_intervals"] = [
+        {"schedule_id": "s1", "spray_seconds": 10, "pause_seconds": 5},
+        {"schedule_id": "s2", "spray_seconds": 20, "pause_seconds": 5},
+    ]
+
+
+def count_loads(monkeypatch):
+    calls = []
+    load_schedules = supabase_service.load_schedules
+
+    def counting_load_schedules(*args, **kwargs):
+        calls.append(kwargs.get("schedule_ids"))
+        return load_schedules(*args, **kwargs)
+
+    monkeypatch.setattr(supabase_service, "load_schedules", counting_load_schedules)
+    return calls
+
+
+def test_fresh_compiled_schedules_skip_the_raw_rows(fake_db, monkeypatch):
+    seed(fake_db)
+    calls = count_loads(monkeypatch)
+
+    first = supabase_service.load_compiled_schedules(["s1", "s2"])
+    second = supabase_service.load_compiled_schedules(["s1", "s2"])
+    partly_new = supabase_service.load_compiled_schedules(["s2", "s3"])
+
+    assert calls == [["s1", "s2"], ["s3"]]
+    assert second["s1"] is first["s1"] and partly_new["s2"] is first["s2"]
+    assert "s3" not in partly_new
+
+
+def test_saving_a_schedule_recompiles_it(fake_db):
+    seed(fake_db)
+    before = supabase_service.load_compiled_schedules(["s1"])["s1"]
+
+    supabase_service.save_schedule({"id": "s1", "name": "One", "intervals": [{"spray_seconds": 30, "pause_seconds": 5}]})
+    after = supabase_service.load_compiled_schedules(["s1"])["s1"]
+
+    assert (before.interval_spray_seconds, after.interval_spray_seconds) == (10.0, 30.0)
@@ -0,0 +1,68 @@
+"""Identical concurrent reads share one query on the event loop"""
+
+import asyncio
+import threading
+
+import supabase_async
+
+
+def test_concurrent_identical_reads_issue_one_query(fake_db):
+    fake_db.tables["clients"] = [{"id": "C1", "name": "One"}]
+
+    async def read_concurrently():
+        return await asyncio.gather(*(supabase_async.load_clients() for _ in range(5)))
+
+    results = asyncio.run(read_concurrently())
+
+    assert fake_db.queries.count(("clients", "select")) == 1
+    assert all(rows == [{"id": "C1", "name": "One"}] for rows in results)
+    results[0][0]["name"] = "Changed"
+    assert results[1][0]["name"] == "One"
+    assert not supabase_async._inflight
+
+
+def test_reads_with_different_arguments_are_not_shared(fake_db):
+    fake_db.tables["clients"] = [{"id": "C1", "name": "One"}, {"id": "C2", "name": "Two"}]
+
+    async def read_concurrently():
+        return await asyncio.gather(supabase_async.get_client_by_id("C1"), supabase_async.get_client_by_id("C2"))
+
+    first, second = asyncio.run(read_concurrently())
+
+    assert (first["name"], second["name"]) == ("One", "Two")
+
+
+def test_a_read_after_a_write_does_not_join_an_older_read(fake_db, monkeypatch):
+    fake_db.tables["clients"] = [{"id": "C1", "name": "One"}]
+    loaded, release = threading.Event(), threading.Event()
+    table = fake_db.table
+
+    def table_with_slow_first_read(name):
+        query = table(name)
+        if name == "clients" and not loaded.is_set():
+            execute = query.execute
+
+            def execute_then_wait():
+                response = execute()  # Rows from before the write
+                loaded.set()
+                release.wait(5)
+                return response
+            query.execute = execute_then_wait
+        return query
+
+    monkeypatch.setattr(fake_db, "table", table_with_slow_first_read)
+
+    async def write_during_read():
+        before = asyncio.ensure_future(supabase_async.load_clients())
+        await asyncio.get_running_loop().run_in_executor(None, loaded.wait, 5)
+        await supabase_async.patch_client("C1", {"name": "Two"})
+        after = asyncio.ensure_future(supabase_async.load_clients())
+        await asyncio.sleep(0)  # Starts the second read while the first is still in flight
+        release.set()
+        return await before, await after
+
+    before, after = asyncio.run(write_during_read())
+
+    assert before[0]["name"] == "One"
+    assert after[0]["name"] == "Two"
+    assert not supabase_async._inflight
@@ -0,0 +1,83 @@
+"""Refill-due projections and the dashboard count served from the same index"""
+
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+
+def iso(days_ago):
+    return (datetime.now(timezone.utc) - timedelta(days=days_ago)).isoformat()
+
+
+@pytest.fixture
+def fleet(fake_db):
+    # 20 s of spray at 0.1 ml/s, 5 times a day: 10 ml/day
+    fake_db.tables["schedules"] = [{"id": "s1", "name": "Five a day", "daily_cycles": 5}]
+    fake_db.tables["schedule_intervals"] = [{"schedule_id": "s1", "spray_seconds": 20, "pause_seconds": 10}]
+    machine = {"client_id": "C1", "status": "installed", "current_schedule_id": "s1",
+               "refill_capacity_ml": 500, "current_level_ml": 50}
+    fake_db.tables["machine_instances"] = [
+        {**machine, "id": "refilled", "last_refill_date": iso(3)},
+        {**machine, "id": "installed_only", "last_refill_date": None, "installation_date": iso(4)},
+        {**machine, "id": "undated", "last_refill_date": None, "installation_date": None},
+        {**machine, "id": "fresh_install", "last_refill_date": None, "installation_date": iso(0), "client_id": "C2"},
+    ]
+    fake_db.tables["clients"] = [{"id": "C1", "name": "One"}, {"id": "C2", "name": "Two"}]
+
+
+def test_never_refilled_machines_drain_from_installation(client, fleet, admin_headers):
+    due = client.get("/api/dispensers/refill-due", params={"within_days": 3}, headers=admin_headers).json()
+    by_id = {row["dispenser_id"]: row for row in due}
+
+    # 50 ml at 10 ml/day: empty 5 days after the refill/installation
+    assert set(by_id) == {"refilled", "installed_only"}
+    assert by_id["installed_only"]["days_until_empty"] == pytest.approx(1, abs=0.01)
+    assert by_id["refilled"]["days_until_empty"] == pytest.approx(2, abs=0.01)
+
+
+def test_dashboard_counts_the_refill_due_machines(client, fleet, admin_headers):
+    due = client.get("/api/dispensers/refill-due", params={"client_id": "C1"}, headers=admin_headers).json()
+    dashboard = client.get("/api/clients/C1/dashboard", headers=admin_headers).json()
+
+    assert dashboard["summary"]["machines_needing_refill"] == len(due) == 2
+
+
+def test_dashboard_survives_unparsable_levels_and_counts_this_month(client, fleet, fake_db, admin_headers):
+    fake_db.tables["machine_instances"][0]["current_level_ml"] = "n/a"
+    fake_db.tables["refill_logs"] = [
+        {"id": "r1", "client_id": "C1", "dispenser_id": "refilled", "timestamp": iso(0)},
+        {"id": "r2", "client_id": "C1", "dispenser_id": "refilled", "timestamp": "2020-01-01T00:00:00+00:00"},
+    ]
+
+    response = client.get("/api/clients/C1/dashboard", headers=admin_headers)
+
+    assert response.status_code == 200
+    assert response.json()["quick_stats"]["refills_this_month"] == 1
+    assert response.json()["quick_stats"]["total_refills"] == 2
+
+
+def test_a_refill_during_a_rebuild_is_not_lost(fleet, fake_db, monkeypatch):
+    import refill_index as module
+    import supabase_service
+
+    index = module.RefillDueIndex()
+    index.rebuild()
+    load_machine_instances = module.load_machine_instances
+    raced = []
+
+    def load_then_refill():
+        rows = load_machine_instances()
+        if not raced:
+            # A refill in this worker commits after the rebuild read the rows
+            raced.append(True)
+            machine = next(m for m in fake_db.tables["machine_instances"] if m["id"] == "refilled")
+            machine.update(current_level_ml=500, last_refill_date=iso(0))
+            supabase_service.invalidate_cache("machine_instances")
+            index.upsert_machine(dict(machine))
+        return rows
+
+    monkeypatch.setattr(module, "load_machine_instances", load_then_refill)
+    index.rebuild()
+
+    due = {row["dispenser_id"] for row in index.due_within(3 * 86400)}
+    assert raced and "refilled" not in due and "installed_only" in due
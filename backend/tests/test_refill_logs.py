@@ -0,0 +1,136 @@
+"""Keyset pagination and filters of GET /api/refill-logs"""
+
+import random
+
+import pytest
+
+
+def seed_logs(fake_db, count=57, seed=7):
+    rng = random.Random(seed)
+    rows = []
+    for i in range(count):
+        # Few distinct timestamps so many rows tie and the id tiebreak matters
+        timestamp = None if rng.random() < 0.1 else f"2026-10-{rng.randint(1, 4):02d}T{rng.choice([8, 12]):02d}:00:00+00:00"
+        rows.append({
+            "id": f"refill_{i:03d}",
+            "dispenser_id": rng.choice(["m1", "m2", "m3"]),
+            "client_id": rng.choice(["C1", "C2"]),
+            "technician_username": rng.choice(["tech1", "tech2"]),
+            "fragrance_code": rng.choice(["F1", "F2", None]),
+            "refill_amount_ml": 10.0,
+            "timestamp": timestamp,
+        })
+    fake_db.tables["refill_logs"] = rows
+    return rows
+
+
+def newest_first(rows):
+    dated = sorted((r for r in rows if r["timestamp"]), key=lambda r: (r["timestamp"], r["id"]), reverse=True)
+    undated = sorted((r for r in rows if not r["timestamp"]), key=lambda r: r["id"], reverse=True)
+    return dated + undated
+
+
+def read_all_pages(client, headers, limit, **params):
+    ids, cursor, pages = [], None, 0
+    while True:
+        query = dict(params, limit=limit)
+        if cursor:
+            query["cursor"] = cursor
+        response = client.get("/api/refill-logs", params=query, headers=headers)
+        assert response.status_code == 200, response.text
+        page = response.json()
+        assert len(page["items"]) <= limit
+        ids.extend(row["id"] for row in page["items"])
+        pages += 1
+        cursor = page["next_cursor"]
+        if not cursor:
+            return ids, pages
+
+
+@pytest.mark.parametrize("limit", [1, 5, 8, 100])
+def test_cursor_round_trip_visits_every_row_once_in_order(client, fake_db, admin_headers, limit):
+    rows = seed_logs(fake_db)
+    ids, pages = read_all_pages(client, admin_headers, limit)
+    assert ids == [r["id"] for r in newest_first(rows)]
+    assert pages == max(1, -(-len(rows) // limit))
+
+
+@pytest.mark.parametrize("params", [
+    {"dispenser_id": "m2"},
+    {"client_id": "C1", "technician_username": "tech2"},
+    {"fragrance_code": "F1"},
+    {"start_date": "2026-10-02T00:00:00+00:00", "end_date": "2026-10-03T23:59:59+00:00"},
+    {"dispenser_id": "m1", "start_date": "2026-10-03T00:00:00+00:00"},
+])
+def test_filters_apply_to_every_page(client, fake_db, admin_headers, params):
+    rows = seed_logs(fake_db)
+
+    def keep(row):
+        for column in ("dispenser_id", "client_id", "technician_username", "fragrance_code"):
+            if column in params and row[column] != params[column]:
+                return False
+        if "start_date" in params and not (row["timestamp"] and row["timestamp"] >= params["start_date"]):
+            return False
+        if "end_date" in params and not (row["timestamp"] and row["timestamp"] <= params["end_date"]):
+            return False
+        return True
+
+    ids, _ = read_all_pages(client, admin_headers, 4, **params)
+    assert ids == [r["id"] for r in newest_first(rows) if keep(r)]
+
+
+def test_technicians_only_page_through_their_own_logs(client, fake_db, technician_headers):
+    rows = seed_logs(fake_db)
+    ids, _ = read_all_pages(client, technician_headers, 6, technician_username="tech2")
+    assert ids == [r["id"] for r in newest_first(rows) if r["technician_username"] == "tech1"]
+
+
+def test_invalid_cursor_and_limit_are_rejected(client, fake_db, admin_headers):
+    seed_logs(fake_db)
+    assert client.get("/api/refill-logs", params={"cursor": "not-a-cursor"}, headers=admin_headers).status_code == 400
+    assert client.get("/api/refill-logs", params={"limit": 0}, headers=admin_headers).status_code == 400
+
+
+def test_unpaged_requests_return_at_most_one_full_page(client, fake_db, admin_headers, monkeypatch):
+    import main
+
+    rows = seed_logs(fake_db)
+    monkeypatch.setattr(main, "REFILL_LOGS_MAX_PAGE_SIZE", 20)
+
+    first = client.get("/api/refill-logs", headers=admin_headers)
+    assert [r["id"] for r in first.json()] == [r["id"] for r in newest_first(rows)][:20]
+
+    rest, _ = read_all_pages(client, admin_headers, 20, cursor=first.headers["X-Next-Cursor"])
+    assert [r["id"] for r in first.json()] + rest == [r["id"] for r in newest_first(rows)]
+
+    few = client.get("/api/refill-logs", params={"dispenser_id": "m1", "fragrance_code": "F1"}, headers=admin_headers)
+    assert len(few.json()) < 20 and "X-Next-Cursor" not in few.headers
+
+
+def test_total_counts_every_matching_row_on_every_page(client, fake_db, admin_headers):
+    rows = seed_logs(fake_db)
+    expected = sum(1 for r in rows if r["dispenser_id"] == "m1")
+    params = {"dispenser_id": "m1", "limit": 3, "include_total": True}
+
+    totals = []
+    while True:
+        page = client.get("/api/refill-logs", params=params, headers=admin_headers).json()
+        totals.append(page["total"])
+        if not page["next_cursor"]:
+            break
+        params["cursor"] = page["next_cursor"]
+
+    assert len(totals) > 1 and set(totals) == {expected}
+
+
+def test_date_bounds_match_the_same_instants_with_or_without_filters(client, fake_db, admin_headers):
+    rows = seed_logs(fake_db)
+    # 2026-10-02T00:00Z to 2026-10-03T12:00Z, written with a +05:30 offset
+    bounds = {"start_date": "2026-10-02T05:30:00+05:30", "end_date": "2026-10-03T17:30:00+05:30"}
+    expected = [r["id"] for r in newest_first(rows)
+                if r["timestamp"] and "2026-10-02T00:00:00+00:00" <= r["timestamp"] <= "2026-10-03T12:00:00+00:00"]
+
+    unfiltered = client.get("/api/refill-logs", params=bounds, headers=admin_headers).json()
+    paged, _ = read_all_pages(client, admin_headers, 5, **bounds)
+
+    assert [r["id"] for r in unfiltered] == paged == expected
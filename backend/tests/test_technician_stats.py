@@ -0,0 +1,147 @@
+"""The per-day technician rollups must agree with a recount of the raw rows"""
+
+import random
+
+from technician_stats import day_key
+
+TECHNICIANS = ["tech1", "tech2", " tech3 "]
+RANGES = [
+    (None, None),
+    ("2026-10-02T00:00:00+00:00", None),
+    (None, "2026-10-03T23:59:59.999999+00:00"),
+    ("2026-10-02T00:00:00+00:00", "2026-10-02T23:59:59.999999+00:00"),
+]
+
+
+def seed(fake_db, seed=3):
+    rng = random.Random(seed)
+    fake_db.tables["technician_assignments"] = [
+        {
+            "id": f"a{i}",
+            "dispenser_id": rng.choice(["m1", "m2", "m3"]),
+            "technician_username": rng.choice(TECHNICIANS),
+            "assigned_by": "admin1",
+            "assigned_date": f"2026-10-{rng.randint(1, 4):02d}T{rng.randint(0, 23):02d}:00:00+00:00",
+            "status": rng.choice(["pending", "completed", "cancelled", "assigned"]),
+            "completed_date": f"2026-10-{rng.randint(1, 5):02d}T10:00:00" if rng.random() < 0.7 else None,
+            "task_type": "refill",
+        }
+        for i in range(80)
+    ]
+    fake_db.tables["refill_logs"] = [
+        {
+            "id": f"r{i}",
+            "dispenser_id": rng.choice(["m1", "m2", "m3"]),
+            "technician_username": rng.choice(TECHNICIANS),
+            "refill_amount_ml": rng.choice([10, 25.5, 100]),
+            "timestamp": f"2026-10-{rng.randint(1, 4):02d}T{rng.randint(0, 23):02d}:30:00+00:00",
+        }
+        for i in range(120)
+    ]
+
+
+def recount(fake_db, technician, start_date, end_date):
+    """Stats straight from the table rows, selecting whole UTC days like the rollups"""
+    name = technician.strip()
+
+    def in_range(value):
+        day = day_key(value)
+        return (not start_date or day >= day_key(start_date)) and (not end_date or day <= day_key(end_date))
+
+    assignments = [a for a in fake_db.tables["technician_assignments"]
+                   if a["technician_username"].strip() == name and in_range(a["assigned_date"])]
+    refills = [r for r in fake_db.tables["refill_logs"]
+               if r["technician_username"].strip() == name and in_range(r["timestamp"])]
+    visits = {f"{a['dispenser_id']}_{a['completed_date'][:10]}"
+              for a in assignments if a["status"] == "completed" and a.get("completed_date")}
+    return {
+        "technician_username": technician,
+        "machines_assigned": len(assignments),
+        "refills_completed": len(refills),
+        "pending_refills": sum(a["status"] == "pending" for a in assignments),
+        "completed_tasks": sum(a["status"] == "completed" for a in assignments),
+        "cancelled_tasks": sum(a["status"] == "cancelled" for a in assignments),
+        "visit_count": len(visits),
+        "total_ml_refilled": round(sum(r["refill_amount_ml"] for r in refills), 2),
+    }
+
+
+def assert_matches_recount(client, fake_db, headers):
+    for start_date, end_date in RANGES:
+        params = {k: v for k, v in (("start_date", start_date), ("end_date", end_date)) if v}
+        for technician in ("tech1", "tech2", "tech3"):
+            response = client.get(f"/api/technician-stats/{technician}", params=params, headers=headers)
+            assert response.status_code == 200, response.text
+            assert response.json() == recount(fake_db, technician, start_date, end_date)
+
+
+def test_rollups_match_raw_recount(client, fake_db, admin_headers):
+    seed(fake_db)
+    assert_matches_recount(client, fake_db, admin_headers)
+
+    everyone = client.get("/api/technician-stats", headers=admin_headers).json()
+    by_name = {row["technician_username"]: row for row in everyone}
+    for technician in ("tech1", "tech2", "tech3"):
+        assert by_name[technician] == recount(fake_db, technician, None, None)
+
+
+def test_rollups_follow_writes(client, fake_db, admin_headers):
+    seed(fake_db)
+    fake_db.tables["machine_instances"] = [
+        {"id": "m1", "client_id": "C1", "refill_capacity_ml": 500, "current_level_ml": 100, "status": "installed"},
+    ]
+    assert_matches_recount(client, fake_db, admin_headers)  # Builds the rollups
+
+    created = client.post("/api/technician-assignments", json={
+        "dispenser_id": "m1", "technician_username": "tech1", "assigned_by": "admin1",
+        "assigned_date": "2026-10-02T09:00:00+00:00", "status": "pending",
+    }, headers=admin_headers).json()
+    client.post(f"/api/technician-assignments/{created['id']}/complete", json={"notes": "done"}, headers=admin_headers)
+    client.put("/api/technician-assignments/a1", json={"status": "cancelled"}, headers=admin_headers)
+    client.delete("/api/technician-assignments/a2", headers=admin_headers)
+    refill = client.post("/api/dispensers/m1/refill", json={
+        "technician_username": "tech2", "refill_amount_ml": 40, "timestamp": "2026-10-03T15:00:00+00:00",
+    }, headers=admin_headers)
+    assert refill.status_code == 200, refill.text
+
+    assert_matches_recount(client, fake_db, admin_headers)
+
+
+def test_stats_access_and_date_validation(client, fake_db, admin_headers, technician_headers):
+    seed(fake_db)
+    assert client.get("/api/technician-stats", headers=technician_headers).status_code == 403
+    assert client.get("/api/technician-stats/tech2", headers=technician_headers).status_code == 403
+    assert client.get("/api/technician-stats/tech1", headers=technician_headers).status_code == 200
+
+    for path in ("/api/technician-stats", "/api/technician-stats/tech1"):
+        assert client.get(path, params={"start_date": "yesterday"}, headers=admin_headers).status_code == 400
+        assert client.get(path, params={"end_date": "2026-13-45"}, headers=admin_headers).status_code == 400
+
+
+def test_a_refill_during_a_rebuild_is_not_lost(fake_db, monkeypatch):
+    import supabase_service
+    import technician_stats as module
+
+    seed(fake_db)
+    rollup = module.TechnicianStatsRollup()
+    rollup.rebuild()
+    before = rollup.stats_for("tech1")["refills_completed"]
+    load_time_index = module.load_time_index
+    raced = []
+
+    def load_then_refill(table, column):
+        index = load_time_index(table, column)
+        if table == "refill_logs" and not raced:
+            # A refill in this worker commits after the rebuild read the logs
+            raced.append(True)
+            refill = {"id": "late", "dispenser_id": "m1", "technician_username": "tech1",
+                      "refill_amount_ml": 10, "timestamp": "2026-10-04T12:00:00+00:00"}
+            fake_db.tables["refill_logs"].append(refill)
+            supabase_service.invalidate_cache("refill_logs")
+            rollup.add_refill(refill)
+        return index
+
+    monkeypatch.setattr(module, "load_time_index", load_then_refill)
+    rollup.rebuild()
+
+    assert raced and rollup.stats_for("tech1")["refills_completed"] == before + 1
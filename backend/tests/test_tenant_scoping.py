@@ -0,0 +1,60 @@
+"""Client logins must only ever see their own machines, assignments and client record"""
+
+import pytest
+
+import main
+from conftest import login
+
+
+@pytest.fixture
+def tenants(client, fake_db):
+    fake_db.tables["clients"] = [
+        {"id": "C1", "name": "Client One", "password": main.hash_password("one-pass")},
+        {"id": "C2", "name": "Client Two", "password": main.hash_password("two-pass")},
+    ]
+    fake_db.tables["machine_instances"] = [
+        {"id": "m1", "client_id": "C1", "status": "installed", "current_schedule_id": "universal_schedule",
+         "refill_capacity_ml": 500, "current_level_ml": 300},
+        {"id": "m2", "client_id": "C2", "status": "installed", "current_schedule_id": "universal_schedule",
+         "refill_capacity_ml": 500, "current_level_ml": 300},
+    ]
+    fake_db.tables["technician_assignments"] = [
+        {"id": "a1", "dispenser_id": "m1", "technician_username": "tech1", "assigned_by": "admin1",
+         "assigned_date": "2026-10-01T00:00:00+00:00", "status": "pending"},
+        {"id": "a2", "dispenser_id": "m2", "technician_username": "tech1", "assigned_by": "admin1",
+         "assigned_date": "2026-10-01T00:00:00+00:00", "status": "pending"},
+    ]
+    return login(client, "C1", "one-pass")
+
+
+@pytest.mark.parametrize("path", [
+    "/api/dispensers/m2",
+    "/api/clients/C2",
+    "/api/technician-assignments/a2",
+    "/api/dispensers/m2/usage-calculation",
+])
+def test_other_tenants_rows_are_not_found(client, tenants, path):
+    assert client.get(path, headers=tenants).status_code == 404
+
+
+@pytest.mark.parametrize("path", [
+    "/api/dispensers/m1",
+    "/api/clients/C1",
+    "/api/technician-assignments/a1",
+    "/api/dispensers/m1/usage-calculation",
+])
+def test_own_rows_are_visible(client, tenants, path):
+    assert client.get(path, headers=tenants).status_code == 200
+
+
+def test_lists_and_batch_usage_are_scoped(client, tenants):
+    assignments = client.get("/api/technician-assignments", headers=tenants).json()
+    assert [a["id"] for a in assignments] == ["a1"]
+
+    usage = client.post("/api/dispensers/usage-calculation", json={"dispenser_ids": ["m1", "m2"]}, headers=tenants).json()
+    assert usage["m1"] is not None
+    assert "m2" not in usage
+
+
+def test_client_password_is_never_returned(client, tenants):
+    assert "password" not in client.get("/api/clients/C1", headers=tenants).json()
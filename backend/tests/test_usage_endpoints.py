@@ -0,0 +1,50 @@
+"""The single-machine and batch usage endpoints must agree"""
+
+import pytest
+
+
+@pytest.fixture
+def fleet(fake_db):
+    fake_db.tables["schedules"] = [
+        {"id": "sched_a", "name": "Time ranges saved under the dashed id", "ml_per_hour": None},
+        {"id": "sched_b", "name": "Intervals", "daily_cycles": 4},
+    ]
+    fake_db.tables["schedule_time_ranges"] = [
+        {"schedule_id": "sched-a", "start_time": "08:00", "end_time": "18:00", "spray_seconds": 10, "pause_seconds": 50},
+    ]
+    fake_db.tables["schedule_intervals"] = [
+        {"schedule_id": "sched_b", "spray_seconds": 20, "pause_seconds": 40},
+    ]
+    fake_db.tables["machine_instances"] = [
+        {"id": "m1", "client_id": "C1", "status": "installed", "current_schedule_id": "sched_a",
+         "refill_capacity_ml": 500, "current_level_ml": 400},
+        {"id": "m2", "client_id": "C1", "status": "installed", "current_schedule_id": "sched_b",
+         "refill_capacity_ml": 500, "current_level_ml": 400},
+        {"id": "m3", "client_id": "C1", "status": "installed", "current_schedule_id": None,
+         "refill_capacity_ml": 500, "current_level_ml": 400},
+    ]
+
+
+def test_batch_matches_single_machine_usage(client, fleet, admin_headers):
+    batch = client.post("/api/dispensers/usage-calculation", json={"dispenser_ids": ["m1", "m2", "m3"]},
+                        headers=admin_headers).json()
+    for machine_id in ("m1", "m2", "m3"):
+        single = client.get(f"/api/dispensers/{machine_id}/usage-calculation", headers=admin_headers).json()
+        assert batch[machine_id] == single
+
+
+def test_batch_falls_back_to_time_ranges_under_id_variants(client, fleet, admin_headers):
+    batch = client.post("/api/dispensers/usage-calculation", json={"dispenser_ids": ["m1"]}, headers=admin_headers).json()
+    # 600 cycles of a 10 s spray in 10 h, at 0.1 ml/s
+    assert batch["m1"]["daily_usage_ml"] == 600.0
+
+
+def test_bad_schedule_is_reported_per_machine(client, fleet, fake_db, admin_headers):
+    fake_db.tables["schedule_intervals"].append({"schedule_id": "sched_b", "spray_seconds": "n/a", "pause_seconds": 40})
+
+    response = client.post("/api/dispensers/usage-calculation", json={"dispenser_ids": ["m1", "m2"]}, headers=admin_headers)
+
+    assert response.status_code == 200
+    assert response.json()["m1"]["daily_usage_ml"] == 600.0
+    assert response.json()["m2"]["error"]
+    assert client.get("/api/dispensers/m2/usage-calculation", headers=admin_headers).json() == response.json()["m2"]
@@ -0,0 +1,197 @@
+"""The vectorized usage engine must match the original per-machine calculation exactly"""
+
+import json
+import random
+from datetime import datetime, timezone
+
+from usage_engine import calculate_fleet_usage, compile_schedule, parse_days_of_week, project_empty_times
+
+NOW = datetime(2026, 10, 16, 12, 34, 56, 789012, tzinfo=timezone.utc)
+
+
+def scalar_time_range_usage(time_ranges, ml_per_hour=None, days_of_week=None):
+    """The per-machine time-range calculation the engine replaced"""
+    active_days = parse_days_of_week(days_of_week)
+    active_days_count = 7 if not active_days else len(active_days)
+    total_usage_per_day_ml = 0
+    total_run_time_hours_per_day = 0
+    for time_range in time_ranges:
+        try:
+            start_h, start_m = map(int, str(time_range.get("start_time", "00:00")).split(":"))
+            end_h, end_m = map(int, str(time_range.get("end_time", "23:59")).split(":"))
+            start_minutes = start_h * 60 + start_m
+            end_minutes = end_h * 60 + end_m
+            if end_minutes < start_minutes:
+                end_minutes += 24 * 60
+            duration_seconds = (end_minutes - start_minutes) * 60
+            spray_seconds = float(time_range.get("spray_seconds", 0))
+            pause_seconds = float(time_range.get("pause_seconds", 0))
+            cycle_duration = spray_seconds + pause_seconds
+            if cycle_duration == 0:
+                continue
+            cycles = duration_seconds / cycle_duration
+            if ml_per_hour:
+                total_run_time_hours_per_day += cycles * spray_seconds / 3600
+            else:
+                total_usage_per_day_ml += spray_seconds * 0.1 * cycles
+        except (ValueError, KeyError, TypeError):
+            continue
+    if ml_per_hour:
+        total_usage_per_day_ml = total_run_time_hours_per_day * ml_per_hour
+    return total_usage_per_day_ml * active_days_count / 7
+
+
+def scalar_usage(dispenser, schedule, now):
+    """The per-machine usage calculation the engine replaced"""
+    if not schedule:
+        return {"daily_usage_ml": 0, "days_until_empty": None}
+    ml_per_hour = dispenser.get("ml_per_hour") or schedule.get("ml_per_hour")
+    time_ranges = schedule.get("time_ranges")
+    if time_ranges:
+        daily_usage_ml = scalar_time_range_usage(time_ranges, ml_per_hour, schedule.get("days_of_week"))
+        cycle_usage_ml = daily_usage_ml / 24
+    else:
+        cycle_usage_ml = 0
+        for interval in schedule.get("intervals", []):
+            cycle_usage_ml += interval["spray_seconds"] if ml_per_hour else interval["spray_seconds"] * 0.1
+        if ml_per_hour:
+            cycle_usage_ml = cycle_usage_ml / 3600 * ml_per_hour
+        daily_cycles = schedule.get("daily_cycles")
+        daily_usage_ml = cycle_usage_ml * (1 if daily_cycles is None else daily_cycles)
+
+    since_refill = 0
+    if daily_usage_ml > 0 and dispenser.get("last_refill_date"):
+        try:
+            last_refill = datetime.fromisoformat(dispenser["last_refill_date"].replace("Z", "+00:00"))
+            if last_refill.tzinfo is None:
+                last_refill = last_refill.replace(tzinfo=timezone.utc)
+            hours = (now - last_refill).total_seconds() / 3600
+            if time_ranges and ml_per_hour:
+                since_refill = hours * (daily_usage_ml / 24)
+            else:
+                since_refill = hours / 24 * daily_usage_ml
+        except Exception:
+            pass
+
+    days_until_empty = None
+    if daily_usage_ml > 0:
+        level = dispenser.get("current_level_ml", 0)
+        try:
+            level = float(level) if level is not None else 0.0
+        except (TypeError, ValueError):
+            level = 0.0
+        if since_refill > 0:
+            level = max(0, level - since_refill)
+        days_until_empty = level / daily_usage_ml if level > 0 else 0
+
+    return {
+        "daily_usage_ml": round(daily_usage_ml, 2),
+        "days_until_empty": round(days_until_empty, 2) if days_until_empty else None,
+        "cycle_usage_ml": round(cycle_usage_ml, 2),
+        "usage_since_refill": round(since_refill, 2) if since_refill > 0 else None,
+    }
+
+
+def random_fleet(seed, schedule_count=150, machine_count=1500):
+    rng = random.Random(seed)
+
+    def clock():
+        return f"{rng.randint(0, 23):02d}:{rng.choice([0, 5, 15, 30, 45, 59]):02d}"
+
+    schedules = []
+    for i in range(schedule_count):
+        if rng.random() < 0.6:
+            time_ranges = [
+                {
+                    "start_time": clock(),
+                    "end_time": clock(),
+                    "spray_seconds": rng.choice([0, 1, 5, 20, "7", 30.5, "x"]),
+                    "pause_seconds": rng.choice([0, 10, 40, 55, "3"]),
+                }
+                for _ in range(rng.randint(1, 8))
+            ]
+            schedules.append({
+                "id": f"s{i}", "time_ranges": time_ranges, "intervals": [],
+                "days_of_week": rng.choice([None, [0, 1, 2], ["0", "3"], '["1","2","3"]', "0,1,2,3,4", [], "[]"]),
+                "ml_per_hour": rng.choice([None, 0, 3.3]),
+            })
+        else:
+            schedules.append({
+                "id": f"s{i}", "time_ranges": [],
+                "intervals": [{"spray_seconds": rng.choice([1, 5, 20, 7.5]), "pause_seconds": 5}
+                              for _ in range(rng.randint(0, 4))],
+                "daily_cycles": rng.choice([None, 1, 4, 24]),
+                "ml_per_hour": rng.choice([None, 2.5]),
+            })
+
+    machines = [
+        {
+            "id": f"m{i}",
+            "current_schedule_id": rng.choice([None, "missing"] + [s["id"] for s in schedules] * 3),
+            "ml_per_hour": rng.choice([None, 0, 1.7, 2, 12.25]),
+            "current_level_ml": rng.choice([None, 0, "250", 499.9, "bad", 1000]),
+            "last_refill_date": rng.choice([
+                None, "2026-10-01T10:00:00Z", "2026-09-15T08:13:27.123456+05:30",
+                "2026-10-16T12:00:00", "garbage", "2026-10-16",
+            ]),
+        }
+        for i in range(machine_count)
+    ]
+    return schedules, machines
+
+
+def test_engine_matches_scalar_baseline():
+    schedules, machines = random_fleet(seed=1)
+    by_id = {s["id"]: s for s in schedules}
+
+    expected = {
+        m["id"]: scalar_usage(m, json.loads(json.dumps(by_id.get(m["current_schedule_id"]))), NOW)
+        for m in machines
+    }
+    actual = calculate_fleet_usage(machines, [compile_schedule(s) for s in schedules], now=NOW)
+
+    mismatches = {k: (expected[k], actual.get(k)) for k in expected if expected[k] != actual.get(k)}
+    assert not mismatches, list(mismatches.items())[:3]
+
+
+def test_machines_without_schedule_report_zero_usage():
+    usage = calculate_fleet_usage([{"id": "m1", "current_schedule_id": None}], [], now=NOW)
+    assert usage == {"m1": {"daily_usage_ml": 0, "days_until_empty": None}}
+
+
+def test_bad_interval_schedule_only_fails_its_own_machines():
+    schedules = [
+        compile_schedule({"id": "bad", "time_ranges": [], "intervals": [{"spray_seconds": 5}, {"spray_seconds": "abc"}]}),
+        compile_schedule({"id": "good", "time_ranges": [], "intervals": [{"spray_seconds": "5"}], "daily_cycles": 2}),
+    ]
+    usage = calculate_fleet_usage([
+        {"id": "m1", "current_schedule_id": "bad", "current_level_ml": 100},
+        {"id": "m2", "current_schedule_id": "good", "current_level_ml": 100},
+    ], schedules, now=NOW)
+
+    assert usage["m1"]["daily_usage_ml"] == 0 and usage["m1"]["days_until_empty"] is None
+    assert "abc" in usage["m1"]["error"]
+    assert usage["m2"]["daily_usage_ml"] == 1.0 and "error" not in usage["m2"]
+
+
+def test_bad_machine_rows_and_days_of_week_only_fail_their_own_machines():
+    schedules = [
+        compile_schedule({"id": "good", "time_ranges": [], "intervals": [{"spray_seconds": 5}], "daily_cycles": 2}),
+        compile_schedule({"id": "bad_days", "days_of_week": ["mon"],
+                          "time_ranges": [{"start_time": "08:00", "end_time": "09:00", "spray_seconds": 10, "pause_seconds": 50}]}),
+    ]
+    machines = [
+        {"id": "ok", "current_schedule_id": "good", "current_level_ml": 100, "last_refill_date": "2026-10-15T00:00:00+00:00"},
+        {"id": "bad_rate", "current_schedule_id": "good", "ml_per_hour": "abc", "current_level_ml": 100,
+         "last_refill_date": "2026-10-15T00:00:00+00:00"},
+        {"id": "on_bad_days", "current_schedule_id": "bad_days", "current_level_ml": 100,
+         "last_refill_date": "2026-10-15T00:00:00+00:00"},
+    ]
+
+    usage = calculate_fleet_usage(machines, schedules, now=NOW)
+    empty_times = project_empty_times(machines, schedules)
+
+    assert usage["ok"]["daily_usage_ml"] == 1.0 and "error" not in usage["ok"]
+    assert "abc" in usage["bad_rate"]["error"] and usage["bad_rate"]["daily_usage_ml"] == 0
+    assert "days_of_week" in usage["on_bad_days"]["error"]
+    assert set(empty_times) == {"ok"}
@@ -0,0 +1,205 @@
+"""Read-modify-write endpoints re-read and retry on a conflicting write, then give up with 409"""
+
+import asyncio
+
+import pytest
+
+import main
+import supabase_service
+
+
+def interfere(monkeypatch, fake_db, table, row_id, changes, times):
+    """Apply another writer's changes to the row just before each of the first `times` conditional updates"""
+    calls = {"count": 0}
+    patch_row_if = supabase_service._patch_row_if
+
+    def racing_patch_row_if(*args, **kwargs):
+        calls["count"] += 1
+        if calls["count"] <= times:
+            row = next(r for r in fake_db.tables[table] if r["id"] == row_id)
+            row.update(changes(calls["count"]) if callable(changes) else changes)
+        return patch_row_if(*args, **kwargs)
+
+    monkeypatch.setattr(supabase_service, "_patch_row_if", racing_patch_row_if)
+    return calls
+
+
+def seed_machine(fake_db, **fields):
+    fake_db.tables["machine_instances"] = [{
+        "id": "m1", "unique_code": "M-1", "client_id": None, "status": "assigned",
+        "refill_capacity_ml": 500, "current_level_ml": 100, "last_refill_date": "2026-10-01T08:00:00+00:00",
+        **fields,
+    }]
+    return fake_db.tables["machine_instances"][0]
+
+
+def other_refill(attempt):
+    return {"current_level_ml": 400 + attempt, "last_refill_date": f"2026-10-10T0{attempt}:00:00+00:00"}
+
+
+def test_refill_retries_on_top_of_a_concurrent_refill(client, fake_db, monkeypatch, admin_headers):
+    machine = seed_machine(fake_db)
+    calls = interfere(monkeypatch, fake_db, "machine_instances", "m1", other_refill, times=1)
+
+    response = client.post("/api/dispensers/m1/refill", json={
+        "technician_username": "tech1", "refill_amount_ml": 50, "timestamp": "2026-10-10T09:00:00+00:00",
+    }, headers=admin_headers)
+
+    assert response.status_code == 200, response.text
+    assert calls["count"] == 2
+    # The retry started from the other writer's level, not the stale one
+    assert response.json()["level_before_refill"] == 401
+    assert machine["current_level_ml"] == 451
+
+
+def test_two_concurrent_refills_both_land(fake_db):
+    machine = seed_machine(fake_db)
+    refills = [main.RefillLog(technician_username="tech1", refill_amount_ml=50, timestamp=f"2026-10-10T0{hour}:00:00+00:00")
+               for hour in (8, 9)]
+
+    async def refill_concurrently():
+        # Both read the same row before either writes; the loser re-reads and refills on top
+        return await asyncio.gather(*(main.log_refill("m1", refill) for refill in refills))
+
+    logs = asyncio.run(refill_concurrently())
+
+    assert sorted(log["level_before_refill"] for log in logs) == [100, 150]
+    assert machine["current_level_ml"] == 200
+    assert len(fake_db.tables["refill_logs"]) == 2
+
+
+def test_refill_gives_up_with_409(client, fake_db, monkeypatch, admin_headers):
+    machine = seed_machine(fake_db)
+    calls = interfere(monkeypatch, fake_db, "machine_instances", "m1", other_refill, times=100)
+
+    response = client.post("/api/dispensers/m1/refill", json={
+        "technician_username": "tech1", "refill_amount_ml": 50, "timestamp": "2026-10-10T09:00:00+00:00",
+    }, headers=admin_headers)
+
+    assert response.status_code == 409
+    assert calls["count"] == main.WRITE_CONFLICT_ATTEMPTS
+    assert machine["last_refill_date"] != "2026-10-10T09:00:00+00:00"
+    assert not fake_db.tables.get("refill_logs")
+
+
+def test_machine_update_rechecks_a_client_assigned_meanwhile(client, fake_db, monkeypatch, admin_headers):
+    machine = seed_machine(fake_db)
+    interfere(monkeypatch, fake_db, "machine_instances", "m1", {"client_id": "C9"}, times=1)
+
+    response = client.put("/api/machine-instances/m1", json={
+        "id": "m1", "unique_code": "M-1", "sku": "SKU", "client_id": "C1", "location": "Lobby",
+        "refill_capacity_ml": 500, "ml_per_hour": 2, "status": "installed",
+    }, headers=admin_headers)
+
+    # The retry sees the machine now belongs to C9 and refuses to move it
+    assert response.status_code == 400
+    assert machine["client_id"] == "C9"
+
+
+def test_completion_retries_then_succeeds(client, fake_db, monkeypatch, admin_headers):
+    fake_db.tables["technician_assignments"] = [{
+        "id": "a1", "dispenser_id": "m1", "technician_username": "tech1", "assigned_by": "admin1",
+        "assigned_date": "2026-10-01T00:00:00+00:00", "status": "pending", "task_type": "refill", "notes": "x",
+    }]
+    calls = interfere(monkeypatch, fake_db, "technician_assignments", "a1", {"status": "assigned"}, times=1)
+
+    response = client.post("/api/technician-assignments/a1/complete", json={"notes": "done"}, headers=admin_headers)
+
+    assert response.status_code == 200, response.text
+    assert calls["count"] == 2
+    assert fake_db.tables["technician_assignments"][0]["status"] == "completed"
+
+
+
+def test_completion_is_not_blocked_by_a_notes_edit(client, fake_db, monkeypatch, admin_headers):
+    fake_db.tables["technician_assignments"] = [{
+        "id": "a1", "dispenser_id": "m1", "technician_username": "tech1", "assigned_by": "admin1",
+        "assigned_date": "2026-10-01T00:00:00+00:00", "status": "pending", "task_type": "refill", "notes": "x",
+    }]
+    calls = interfere(monkeypatch, fake_db, "technician_assignments", "a1", {"notes": "edited"}, times=1)
+
+    response = client.post("/api/technician-assignments/a1/complete", json={"notes": "done"}, headers=admin_headers)
+
+    assert response.status_code == 200, response.text
+    assert calls["count"] == 1
+
+
+def test_schedule_assignment_retries_on_top_of_a_concurrent_refill(client, fake_db, monkeypatch, admin_headers):
+    machine = seed_machine(fake_db, current_schedule_id="s1")
+    calls = interfere(monkeypatch, fake_db, "machine_instances", "m1", other_refill, times=1)
+
+    response = client.post("/api/dispensers/m1/assign-schedule", json={"schedule_id": "s2"}, headers=admin_headers)
+
+    assert response.status_code == 200, response.text
+    assert calls["count"] == 2
+    # The response (and the refill-due index) carry the other writer's refill, not the stale row
+    assert response.json()["current_level_ml"] == 401
+    assert machine["current_schedule_id"] == "s2"
+
+
+def test_schedule_assignment_gives_up_with_409(client, fake_db, monkeypatch, admin_headers):
+    machine = seed_machine(fake_db, current_schedule_id="s1")
+    calls = interfere(monkeypatch, fake_db, "machine_instances", "m1",
+                      lambda attempt: {"current_schedule_id": f"s{attempt + 2}"}, times=100)
+
+    response = client.post("/api/dispensers/m1/assign-schedule", json={"schedule_id": "s9"}, headers=admin_headers)
+
+    assert response.status_code == 409
+    assert calls["count"] == main.WRITE_CONFLICT_ATTEMPTS
+    assert machine["current_schedule_id"] != "s9"
+
+
+def test_dispenser_update_rechecks_a_client_assigned_meanwhile(client, fake_db, monkeypatch, admin_headers):
+    machine = seed_machine(fake_db)
+    calls = interfere(monkeypatch, fake_db, "machine_instances", "m1", {"client_id": "C9"}, times=1)
+
+    response = client.put("/api/dispensers/m1", json={
+        "id": "m1", "name": "M", "unique_code": "M-1", "sku": "SKU", "client_id": "C1", "location": "Lobby",
+        "refill_capacity_ml": 500, "current_level_ml": 100, "ml_per_hour": 2, "status": "installed",
+    }, headers=admin_headers)
+
+    # The retry sees the machine now belongs to C9 and refuses to move it
+    assert response.status_code == 400
+    assert calls["count"] == 1
+    assert machine["client_id"] == "C9" and machine.get("location") is None
+
+
+EDITS = {
+    "/api/machine-instances/m1": {"id": "m1", "unique_code": "M-1", "sku": "SKU", "client_id": "C1", "location": "Hall",
+                                  "refill_capacity_ml": 500, "ml_per_hour": 2, "status": "installed"},
+    "/api/dispensers/m1": {"id": "m1", "name": "M", "unique_code": "M-1", "sku": "SKU", "client_id": "C1", "location": "Hall",
+                           "refill_capacity_ml": 500, "ml_per_hour": 2, "status": "installed"},
+}
+
+
+@pytest.mark.parametrize("path", EDITS)
+def test_machine_edits_keep_a_refill_that_lands_before_the_write(client, fake_db, monkeypatch, admin_headers, path):
+    machine = seed_machine(fake_db, client_id="C1", status="installed")
+    interfere(monkeypatch, fake_db, "machine_instances", "m1", other_refill, times=1)
+
+    # The form sends back the level it loaded before the refill
+    response = client.put(path, json={**EDITS[path], "current_level_ml": 100,
+                                      "last_refill_date": "2026-10-01T08:00:00+00:00"}, headers=admin_headers)
+
+    assert response.status_code == 200, response.text
+    assert machine["location"] == "Hall"
+    assert (machine["current_level_ml"], machine["last_refill_date"]) == (401, "2026-10-10T01:00:00+00:00")
+    assert response.json()["current_level_ml"] == 401
+
+
+@pytest.mark.parametrize("path", EDITS)
+def test_a_level_correction_retries_and_yields_to_a_refill(client, fake_db, monkeypatch, admin_headers, path):
+    machine = seed_machine(fake_db, client_id="C1", status="installed")
+    edit = {**EDITS[path], "current_level_ml": 250, "last_refill_date": "2026-10-01T08:00:00+00:00"}
+
+    # Without a refill in between the correction is written
+    assert client.put(path, json=edit, headers=admin_headers).status_code == 200
+    assert machine["current_level_ml"] == 250
+
+    # A refill landing before the write makes the correction stale
+    calls = interfere(monkeypatch, fake_db, "machine_instances", "m1", other_refill, times=1)
+    response = client.put(path, json={**edit, "current_level_ml": 200}, headers=admin_headers)
+
+    assert response.status_code == 200, response.text
+    assert calls["count"] == 2
+    assert machine["current_level_ml"] == 401
@@ -0,0 +1,121 @@
+"""
+Timestamps Module
+Pre-parsed timestamp columns and sorted time indexes.
+
+ISO timestamp strings are converted to integer microseconds since the epoch
+once, when a table is loaded, and the rows are kept sorted by that value so
+a date-range query is two binary searches instead of parsing every row.
+"""
+
+from bisect import bisect_left, bisect_right
+from datetime import datetime, timezone, timedelta
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+_ONE_MICROSECOND = timedelta(microseconds=1)
+
+MICROSECONDS_PER_DAY = 86400 * 1_000_000
+
+# Timestamp columns of each table that get a time index
+TIMESTAMP_COLUMNS = {
+    "refill_logs": ("timestamp",),
+    "technician_assignments": ("assigned_date", "completed_date"),
+    "machine_instances": ("last_refill_date", "installation_date"),
+}
+
+
+def to_epoch_us(value) -> Optional[int]:
+    """ISO timestamp (or datetime) -> integer microseconds since the epoch
+
+    Naive values are taken as UTC. Returns None for empty or unparsable values.
+    """
+    if isinstance(value, datetime):
+        parsed = value
+    else:
+        try:
+            parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+        except Exception:
+            return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return (parsed - _EPOCH) // _ONE_MICROSECOND
+
+
+def epoch_us_to_day(epoch_us: int) -> str:
+    """UTC calendar day ("YYYY-MM-DD") of an epoch-microseconds value"""
+    return (_EPOCH + timedelta(microseconds=epoch_us)).date().isoformat()
+
+
+def to_utc_iso(value) -> Optional[str]:
+    """ISO timestamp (any offset, naive = UTC) -> the same instant as a UTC ISO string
+
+    Query bounds are normalized with this before they are sent to the
+    database, so a bound means the same instant there as in to_epoch_us.
+    """
+    epoch_us = to_epoch_us(value)
+    if epoch_us is None:
+        return None
+    return (_EPOCH + timedelta(microseconds=epoch_us)).isoformat()
+
+
+def days_since(epoch_us: Optional[int], now: Optional[datetime] = None) -> Optional[float]:
+    """Days elapsed between epoch_us and now (None when there is no timestamp)"""
+    if epoch_us is None:
+        return None
+    return (to_epoch_us(now or datetime.now(timezone.utc)) - epoch_us) / MICROSECONDS_PER_DAY
+
+
+class TimeIndex:
+    """Rows of one table sorted by a pre-parsed timestamp column
+
+    Rows whose column is empty or unparsable are kept apart in undated.
+    Treat the index as read-only; between() returns copies of the rows.
+    """
+
+    __slots__ = ("column", "epochs", "rows", "undated")
+
+    def __init__(self, rows: List[Dict[str, Any]], column: str):
+        self.column = column
+        dated = []
+        self.undated = []
+        for row in rows:
+            epoch_us = to_epoch_us(row.get(column))
+            if epoch_us is None:
+                self.undated.append(row)
+            else:
+                dated.append((epoch_us, row))
+        dated.sort(key=lambda pair: pair[0])
+        self.epochs = [epoch_us for epoch_us, _ in dated]
+        self.rows = [row for _, row in dated]
+
+    def __len__(self) -> int:
+        return len(self.epochs)
+
+    def _bounds(self, start_us: Optional[int], end_us: Optional[int]) -> Tuple[int, int]:
+        lo = bisect_left(self.epochs, start_us) if start_us is not None else 0
+        hi = bisect_right(self.epochs, end_us) if end_us is not None else len(self.epochs)
+        return lo, max(lo, hi)
+
+    def between(self, start_us: Optional[int] = None, end_us: Optional[int] = None,
+                newest_first: bool = False) -> List[Dict[str, Any]]:
+        """Copies of the rows with start_us <= column <= end_us (either bound optional)"""
+        lo, hi = self._bounds(start_us, end_us)
+        rows = [dict(row) for row in self.rows[lo:hi]]
+        if newest_first:
+            rows.reverse()
+        return rows
+
+    def count_between(self, start_us: Optional[int] = None, end_us: Optional[int] = None) -> int:
+        lo, hi = self._bounds(start_us, end_us)
+        return hi - lo
+
+    def items(self) -> Iterator[Tuple[int, Dict[str, Any]]]:
+        """(epoch_us, row) pairs in ascending time order (rows are not copied)"""
+        return zip(self.epochs, self.rows)
+
+    def latest_by(self, key_column: str) -> Dict[Any, int]:
+        """Most recent epoch_us per value of key_column (e.g. last refill per dispenser)"""
+        latest = {}
+        for epoch_us, row in zip(self.epochs, self.rows):
+            latest[row.get(key_column)] = epoch_us  # Ascending, so the last write wins
+        return latest
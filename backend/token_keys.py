@@ -0,0 +1,112 @@
+"""
+Token Keys Module
+Signing key ring for access and refresh tokens.
+
+Every token names the key that signed it (its key id), so any worker or
+instance holding the same ring can verify it. The ring has one active key,
+used to sign new tokens, and any number of older keys that are still
+accepted. To rotate without logging everyone out:
+
+1. Add the new key to the ring everywhere, keeping the old one active.
+2. Make the new key active.
+3. Drop the old key once the tokens it signed have expired
+   (REFRESH_TOKEN_TTL_SECONDS after step 2).
+
+Keys are loaded from, in order of precedence:
+- TOKEN_SIGNING_KEYS_FILE: JSON file {"active": "<kid>", "keys": {"<kid>": "<secret>", ...}}
+- TOKEN_SIGNING_KEYS: "<kid>:<secret>,<kid>:<secret>" with TOKEN_ACTIVE_KEY_ID
+  naming the signing key (default: the first one listed)
+- TOKEN_SECRET: a single key with id "default"
+
+TOKEN_SECRET, when set, is also accepted for verification under "default"
+so tokens issued before the ring existed (they carry no key id) stay valid.
+"""
+
+import hashlib
+import hmac
+import json
+import os
+import re
+import secrets
+from typing import Dict, Optional
+
+DEFAULT_KEY_ID = "default"
+_KEY_ID_PATTERN = re.compile(r"^[A-Za-z0-9_-]+$")
+
+
+class KeyRing:
+    """HMAC-SHA256 signing keys by key id, with one active signing key"""
+
+    def __init__(self, keys: Dict[str, str], active_kid: str):
+        if not keys:
+            raise ValueError("Key ring needs at least one key")
+        for kid, secret in keys.items():
+            if not _KEY_ID_PATTERN.match(kid):
+                raise ValueError(f"Invalid key id {kid!r} (use letters, digits, '_' and '-')")
+            if not secret:
+                raise ValueError(f"Key {kid!r} has an empty secret")
+        if active_kid not in keys:
+            raise ValueError(f"Active key {active_kid!r} is not in the key ring")
+        self._keys = {kid: secret.encode() for kid, secret in keys.items()}
+        self.active_kid = active_kid
+
+    @property
+    def key_ids(self):
+        return list(self._keys)
+
+    def sign(self, payload: str, kid: Optional[str] = None) -> str:
+        """Signature of payload with the given key (default: the active key)"""
+        key = self._keys[kid or self.active_kid]
+        return hmac.new(key, payload.encode(), hashlib.sha256).hexdigest()
+
+    def verify(self, kid: str, payload: str, signature: str) -> bool:
+        """True if signature is payload's signature under key kid (False for unknown keys)"""
+        if kid not in self._keys:
+            return False
+        return hmac.compare_digest(self.sign(payload, kid), signature)
+
+
+def _parse_key_list(value: str) -> Dict[str, str]:
+    keys = {}
+    for entry in value.split(","):
+        entry = entry.strip()
+        if not entry:
+            continue
+        kid, sep, secret = entry.partition(":")
+        if not sep:
+            raise ValueError("TOKEN_SIGNING_KEYS entries must look like <kid>:<secret>")
+        keys[kid.strip()] = secret.strip()
+    return keys
+
+
+def load_key_ring() -> KeyRing:
+    """Build the key ring from the environment (see module docstring)"""
+    legacy_secret = os.environ.get("TOKEN_SECRET")
+    keys_file = os.environ.get("TOKEN_SIGNING_KEYS_FILE")
+    keys_env = os.environ.get("TOKEN_SIGNING_KEYS")
+
+    if keys_file:
+        with open(keys_file) as f:
+            config = json.load(f)
+        keys = dict(config.get("keys") or {})
+        active_kid = config.get("active") or next(iter(keys), None)
+    elif keys_env:
+        keys = _parse_key_list(keys_env)
+        active_kid = os.environ.get("TOKEN_ACTIVE_KEY_ID") or next(iter(keys), None)
+    elif legacy_secret:
+        keys = {}
+        active_kid = DEFAULT_KEY_ID
+    else:
+        # Tokens from this process won't verify in any other worker or instance
+        print("Warning: no TOKEN_SIGNING_KEYS, TOKEN_SIGNING_KEYS_FILE or TOKEN_SECRET set - "
+              "using a random per-process signing key (single worker only)")
+        keys = {}
+        legacy_secret = secrets.token_urlsafe(32)
+        active_kid = DEFAULT_KEY_ID
+
+    if legacy_secret:
+        keys.setdefault(DEFAULT_KEY_ID, legacy_secret)
+    return KeyRing(keys, active_kid)
+
+
+key_ring = load_key_ring()
@@ -0,0 +1,427 @@
+"""
+Usage Engine Module
+Vectorized (NumPy) fleet-wide usage calculation.
+
+Computes daily usage, cycle usage, usage since last refill and days until
+empty for many machine instances in one pass. The arithmetic mirrors the
+original per-machine usage calculation operation for operation (same order,
+same float types), so results are identical to the scalar code rather than
+merely close.
+
+A schedule that can't be compiled (e.g. a non-numeric interval
+spray_seconds or days_of_week) compiles to zero usage with an error
+message, and the machines on it get that error in their usage instead of
+failing the batch. A machine with a non-numeric ml_per_hour gets its own
+error the same way.
+"""
+
+import json
+from datetime import datetime, timezone
+from typing import List, Dict, Any, Optional
+
+import numpy as np
+
+from timestamps import to_epoch_us
+
+# Default dispense rate when neither the machine nor the schedule has ml_per_hour
+ML_PER_SECOND = 0.1
+
+
+def parse_days_of_week(days_of_week) -> Optional[List[Any]]:
+    """Parse days_of_week (JSON string, CSV string or list) into a list of day numbers
+
+    Returns None when no days are set or the value can't be parsed.
+    """
+    active_days = None
+    if days_of_week is not None:
+        if isinstance(days_of_week, str):
+            try:
+                # Try parsing as JSON string (e.g., '["0","1","2"]')
+                parsed = json.loads(days_of_week)
+                # Convert string numbers to integers
+                active_days = [int(d) if isinstance(d, str) else d for d in parsed]
+            except (json.JSONDecodeError, ValueError):
+                # If parsing fails, try to extract numbers from string
+                try:
+                    # Handle cases like "[0,1,2]" or "0,1,2"
+                    cleaned = days_of_week.strip('[]"')
+                    active_days = [int(d.strip()) for d in cleaned.split(',') if d.strip().isdigit()]
+                except:
+                    active_days = None
+        elif isinstance(days_of_week, list):
+            # Already a list, convert string numbers to integers if needed
+            active_days = [int(d) if isinstance(d, str) else d for d in days_of_week]
+    return active_days
+
+
+def active_days_count(days_of_week) -> int:
+    """Number of active days per week (7 if none are specified)"""
+    active_days = parse_days_of_week(days_of_week)
+    if active_days is None or len(active_days) == 0:
+        return 7
+    return len(active_days)
+
+
+def _parse_time_range(time_range: Dict[str, Any]):
+    """Parse one time range into (start_minutes, end_minutes, spray, pause) or None if invalid"""
+    try:
+        start_h, start_m = map(int, str(time_range.get("start_time", "00:00")).split(":"))
+        end_h, end_m = map(int, str(time_range.get("end_time", "23:59")).split(":"))
+        spray_seconds = float(time_range.get("spray_seconds", 0))
+        pause_seconds = float(time_range.get("pause_seconds", 0))
+    except (ValueError, KeyError, TypeError):
+        return None
+    return start_h * 60 + start_m, end_h * 60 + end_m, spray_seconds, pause_seconds
+
+
+def _interval_seconds(value):
+    """spray_seconds of an interval as a number (numeric strings allowed); raises ValueError otherwise"""
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return value
+    if isinstance(value, str):
+        try:
+            return float(value)
+        except ValueError:
+            pass
+    raise ValueError(f"invalid interval spray_seconds {value!r}")
+
+
+def _to_float(value) -> float:
+    """Convert value to float, handling strings and None (anything unparsable is 0.0)"""
+    if value is None:
+        return 0.0
+    try:
+        return float(value)
+    except (ValueError, TypeError):
+        return 0.0
+
+
+def _is_number(value) -> bool:
+    """Whether float(value) succeeds (numeric strings allowed)"""
+    try:
+        float(value)
+    except (ValueError, TypeError):
+        return False
+    return True
+
+
+def _schedule_fingerprint(schedule: Dict[str, Any]) -> int:
+    """Cheap version stamp of the fields that affect usage (no parsing)"""
+    return hash((
+        repr(schedule.get("days_of_week")),
+        schedule.get("ml_per_hour"),
+        schedule.get("daily_cycles"),
+        tuple(
+            (tr.get("start_time"), tr.get("end_time"), repr(tr.get("spray_seconds")), repr(tr.get("pause_seconds")))
+            for tr in schedule.get("time_ranges") or []
+        ),
+        tuple(repr(i.get("spray_seconds")) for i in schedule.get("intervals") or []),
+    ))
+
+
+class CompiledSchedule:
+    """Immutable, pre-parsed form of a schedule for usage calculations
+
+    Built once per schedule version: time strings, days_of_week and
+    spray/pause values are parsed here so usage calculations never touch
+    the raw rows again.
+    """
+
+    __slots__ = (
+        "id", "version", "is_time_based", "error",
+        "active_days", "ml_per_hour",
+        "range_start_minutes", "range_end_minutes", "range_cycle_seconds",
+        "spray_seconds_per_day", "spray_hours_per_day", "default_ml_per_day",
+        "interval_count", "interval_spray_seconds", "interval_default_ml", "daily_cycles",
+    )
+
+    def __init__(self, schedule: Dict[str, Any], version: Optional[int] = None):
+        values = {
+            "id": schedule.get("id"),
+            "version": _schedule_fingerprint(schedule) if version is None else version,
+            "ml_per_hour": schedule.get("ml_per_hour"),
+            "is_time_based": False,
+            "error": None,
+            "active_days": 7,
+            "range_start_minutes": np.zeros(0, dtype=np.int64),
+            "range_end_minutes": np.zeros(0, dtype=np.int64),
+            "range_cycle_seconds": np.zeros(0),
+            "spray_seconds_per_day": 0.0,
+            "spray_hours_per_day": 0.0,
+            "default_ml_per_day": 0.0,
+            "interval_count": 0,
+            "interval_spray_seconds": 0.0,
+            "interval_default_ml": 0.0,
+            "daily_cycles": 1.0,
+        }
+
+        time_ranges = schedule.get("time_ranges")
+        if time_ranges and len(time_ranges) > 0:
+            values["is_time_based"] = True
+            try:
+                active_days = parse_days_of_week(schedule.get("days_of_week"))
+            except (ValueError, TypeError) as e:
+                # Usage of this schedule stays zero; the error is reported per machine
+                values["error"] = f"Schedule {values['id']} can't be used for usage calculations: invalid days_of_week ({e})"
+            else:
+                if active_days:
+                    values["active_days"] = len(active_days)
+                parsed = [r for r in (_parse_time_range(tr) for tr in time_ranges) if r is not None]
+                values.update(self._compile_time_ranges(parsed))
+        else:
+            # Old format: interval-based schedule (summed in order, like the scalar code)
+            intervals = schedule.get("intervals") or []
+            spray_total = 0
+            default_total = 0
+            values["interval_count"] = len(intervals)
+            try:
+                for interval in intervals:
+                    spray_seconds = _interval_seconds(interval.get("spray_seconds"))
+                    spray_total += spray_seconds
+                    default_total += spray_seconds * ML_PER_SECOND
+                daily_cycles = schedule.get("daily_cycles")
+                values["daily_cycles"] = float(1 if daily_cycles is None else daily_cycles)
+            except (ValueError, TypeError, AttributeError) as e:
+                # Usage of this schedule stays zero; the error is reported per machine
+                values["error"] = f"Schedule {values['id']} can't be used for usage calculations: {e}"
+                spray_total = default_total = 0
+            values["interval_spray_seconds"] = float(spray_total)
+            values["interval_default_ml"] = float(default_total)
+
+        for name, value in values.items():
+            if isinstance(value, np.ndarray):
+                value.setflags(write=False)
+            object.__setattr__(self, name, value)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("CompiledSchedule is immutable")
+
+    @staticmethod
+    def _compile_time_ranges(parsed: List[tuple]) -> Dict[str, Any]:
+        """Per-range arrays and per-active-day totals for the valid time ranges"""
+        if not parsed:
+            return {}
+        start_minutes = np.asarray([r[0] for r in parsed], dtype=np.int64)
+        end_minutes = np.asarray([r[1] for r in parsed], dtype=np.int64)
+        spray = np.asarray([r[2] for r in parsed], dtype=np.float64)
+        pause = np.asarray([r[3] for r in parsed], dtype=np.float64)
+
+        # Handle overnight ranges (e.g., 23:59 to 00:00)
+        end_minutes = np.where(end_minutes < start_minutes, end_minutes + 24 * 60, end_minutes)
+        duration_seconds = (end_minutes - start_minutes) * 60
+        cycle_duration = spray + pause
+        valid = cycle_duration != 0  # Skip invalid cycles
+        cycles = np.divide(duration_seconds, cycle_duration, out=np.zeros_like(spray), where=valid)
+        range_spray_seconds = np.where(valid, cycles * spray, 0.0)
+        range_default_ml = np.where(valid, spray * ML_PER_SECOND * cycles, 0.0)
+
+        # Sum in range order so totals match the scalar loop exactly
+        spray_seconds_per_day = 0.0
+        spray_hours_per_day = 0.0
+        default_ml_per_day = 0.0
+        for i in range(len(parsed)):
+            spray_seconds_per_day += float(range_spray_seconds[i])
+            spray_hours_per_day += float(range_spray_seconds[i]) / 3600
+            default_ml_per_day += float(range_default_ml[i])
+
+        return {
+            "range_start_minutes": start_minutes,
+            "range_end_minutes": end_minutes,
+            "range_cycle_seconds": cycle_duration,
+            "spray_seconds_per_day": spray_seconds_per_day,
+            "spray_hours_per_day": spray_hours_per_day,
+            "default_ml_per_day": default_ml_per_day,
+        }
+
+
+def compile_schedule(schedule: Dict[str, Any]) -> CompiledSchedule:
+    """Compile a schedule dict (with time_ranges/intervals) for usage calculations"""
+    return CompiledSchedule(schedule)
+
+
+def schedule_version(schedule: Dict[str, Any]) -> int:
+    """Version stamp used to decide whether a cached CompiledSchedule is still current"""
+    return _schedule_fingerprint(schedule)
+
+
+class ScheduleArrays:
+    """Compiled schedules stacked into arrays, one slot per schedule"""
+
+    __slots__ = (
+        "index", "errors", "is_time_based", "active_days", "ml_per_hour",
+        "run_hours_per_day", "default_ml_per_day",
+        "interval_spray_seconds", "interval_default_ml", "daily_cycles",
+    )
+
+    def __init__(self, schedules: List[CompiledSchedule]):
+        self.index = {s.id: i for i, s in enumerate(schedules)}
+        self.errors = [s.error for s in schedules]
+        self.is_time_based = np.asarray([s.is_time_based for s in schedules], dtype=bool)
+        self.active_days = np.asarray([s.active_days for s in schedules], dtype=np.int64)
+        self.ml_per_hour = [s.ml_per_hour for s in schedules]
+        self.run_hours_per_day = np.asarray([s.spray_hours_per_day for s in schedules], dtype=np.float64)
+        self.default_ml_per_day = np.asarray([s.default_ml_per_day for s in schedules], dtype=np.float64)
+        self.interval_spray_seconds = np.asarray([s.interval_spray_seconds for s in schedules], dtype=np.float64)
+        self.interval_default_ml = np.asarray([s.interval_default_ml for s in schedules], dtype=np.float64)
+        self.daily_cycles = np.asarray([s.daily_cycles for s in schedules], dtype=np.float64)
+
+
+def _as_schedule_arrays(schedules) -> ScheduleArrays:
+    return schedules if isinstance(schedules, ScheduleArrays) else ScheduleArrays(list(schedules))
+
+
+def _machine_arrays(machines: List[Dict[str, Any]], table: ScheduleArrays):
+    """Per-machine arrays for machines whose schedule is in table
+
+    Returns (unscheduled_ids, scheduled_ids, arrays) where arrays holds the
+    schedule index, ml_per_hour rate, level and last refill of each
+    scheduled machine, and "errors": the schedule's or the machine's own
+    error message (None when its usage can be calculated).
+    """
+    unscheduled, rows, errors = [], [], []
+    schedule_idx, rate, has_rate, level, refill_us, has_refill = [], [], [], [], [], []
+    for machine in machines:
+        idx = table.index.get(machine.get("current_schedule_id")) if machine.get("current_schedule_id") else None
+        if idx is None:
+            unscheduled.append(machine.get("id"))
+            continue
+        # Machine-specific ml_per_hour takes priority over schedule-specific
+        ml_per_hour = machine.get("ml_per_hour") or table.ml_per_hour[idx]
+        last_refill = to_epoch_us(machine["last_refill_date"]) if machine.get("last_refill_date") else None
+        error = table.errors[idx]
+        if ml_per_hour and not _is_number(ml_per_hour):
+            error = error or f"Machine {machine.get('id')} has an invalid ml_per_hour {ml_per_hour!r}"
+            ml_per_hour = None
+        rows.append(machine.get("id"))
+        errors.append(error)
+        schedule_idx.append(idx)
+        rate.append(_to_float(ml_per_hour))
+        has_rate.append(bool(ml_per_hour))
+        level.append(_to_float(machine.get("current_level_ml", 0)))
+        refill_us.append(last_refill if last_refill is not None else 0)
+        has_refill.append(last_refill is not None)
+
+    arrays = {
+        "idx": np.asarray(schedule_idx, dtype=np.int64),
+        "rate": np.asarray(rate, dtype=np.float64),
+        "has_rate": np.asarray(has_rate, dtype=bool),
+        "level": np.asarray(level, dtype=np.float64),
+        "refill_us": np.asarray(refill_us, dtype=np.int64),
+        "has_refill": np.asarray(has_refill, dtype=bool),
+        "errors": errors,
+    }
+    return unscheduled, rows, arrays
+
+
+def _daily_usage(table: ScheduleArrays, arrays: Dict[str, np.ndarray]):
+    """Daily usage, cycle usage and time-based flag per scheduled machine"""
+    idx, rate, has_rate = arrays["idx"], arrays["rate"], arrays["has_rate"]
+    time_based = table.is_time_based[idx]
+
+    # Time-range schedules: per-day usage * active days / 7
+    per_active_day = np.where(has_rate, table.run_hours_per_day[idx] * rate, table.default_ml_per_day[idx])
+    time_range_daily = per_active_day * table.active_days[idx] / 7
+    # Interval schedules: one cycle's usage * daily cycles
+    interval_cycle = np.where(has_rate, table.interval_spray_seconds[idx] / 3600 * rate, table.interval_default_ml[idx])
+    daily = np.where(time_based, time_range_daily, interval_cycle * table.daily_cycles[idx])
+    cycle = np.where(time_based, time_range_daily / 24, interval_cycle)
+    return daily, cycle, time_based
+
+
+def calculate_fleet_usage(
+    machines: List[Dict[str, Any]],
+    schedules: List[CompiledSchedule],
+    now: Optional[datetime] = None,
+) -> Dict[str, Dict[str, Any]]:
+    """Usage figures for every machine in one vectorized pass
+
+    Args:
+        machines: Machine instance dicts (ml_per_hour, current_schedule_id, current_level_ml, last_refill_date)
+        schedules: Compiled schedules (at least those the machines use), or a prebuilt ScheduleArrays
+        now: Reference time for usage since refill (defaults to the current UTC time)
+
+    Returns:
+        {machine_id: usage dict} in the same shape as GET /api/dispensers/{id}/usage-calculation.
+        Machines on a schedule that failed to compile get zero usage and an "error" message.
+    """
+    table = _as_schedule_arrays(schedules)
+    now = now or datetime.now(timezone.utc)
+    now_us = to_epoch_us(now)
+
+    unscheduled, rows, arrays = _machine_arrays(machines, table)
+    results: Dict[str, Dict[str, Any]] = {
+        machine_id: {"daily_usage_ml": 0, "days_until_empty": None} for machine_id in unscheduled
+    }
+    if not rows:
+        return results
+
+    daily, cycle, time_based = _daily_usage(table, arrays)
+    level, has_rate, has_refill = arrays["level"], arrays["has_rate"], arrays["has_refill"]
+
+    # Usage since the last refill
+    hours_since_refill = (now_us - arrays["refill_us"]) / 1e6 / 3600
+    days_since_refill = hours_since_refill / 24
+    since_refill = np.where(
+        time_based & has_rate,
+        hours_since_refill * (daily / 24),
+        days_since_refill * daily,
+    )
+    since_refill = np.where((daily > 0) & has_refill, since_refill, 0.0)
+
+    # Days until empty, projecting the level forward by usage since refill
+    remaining = np.where(since_refill > 0, np.maximum(0.0, level - since_refill), level)
+    days_until_empty = np.divide(remaining, daily, out=np.zeros_like(remaining), where=(remaining > 0) & (daily > 0))
+
+    for i, machine_id in enumerate(rows):
+        error = arrays["errors"][i]
+        if error:
+            results[machine_id] = {"daily_usage_ml": 0, "days_until_empty": None, "error": error}
+            continue
+        daily_i = float(daily[i])
+        days_i = float(days_until_empty[i]) if daily_i > 0 else None
+        since_i = float(since_refill[i])
+        results[machine_id] = {
+            "daily_usage_ml": round(daily_i, 2),
+            "days_until_empty": round(days_i, 2) if days_i else None,
+            "cycle_usage_ml": round(float(cycle[i]), 2),
+            "usage_since_refill": round(since_i, 2) if since_i > 0 else None,
+        }
+    return results
+
+
+def project_empty_times(
+    machines: List[Dict[str, Any]],
+    schedules: List[CompiledSchedule],
+) -> Dict[str, tuple]:
+    """Projected time each machine runs dry, as epoch seconds
+
+    The level at the last refill drains at the daily usage rate, so the
+    machine is empty at last_refill + level / daily_usage days. A machine
+    that was never refilled drains from its installation date instead.
+    Machines with no usage, with neither date, or whose usage can't be
+    calculated (see calculate_fleet_usage errors) are omitted.
+
+    Returns:
+        {machine_id: (empty_at_epoch_seconds, daily_usage_ml)}
+    """
+    table = _as_schedule_arrays(schedules)
+    _, rows, arrays = _machine_arrays(machines, table)
+    if not rows:
+        return {}
+
+    daily, _, _ = _daily_usage(table, arrays)
+    installed_us = {m.get("id"): to_epoch_us(m.get("installation_date")) for m in machines}
+    anchor_us = np.asarray([
+        arrays["refill_us"][i] if arrays["has_refill"][i] else (installed_us.get(machine_id) or 0)
+        for i, machine_id in enumerate(rows)
+    ], dtype=np.int64)
+    has_anchor = arrays["has_refill"] | np.asarray([installed_us.get(m) is not None for m in rows], dtype=bool)
+    level = np.maximum(arrays["level"], 0.0)
+    days_left = np.divide(level, daily, out=np.zeros_like(level), where=daily > 0)
+    empty_at = anchor_us / 1e6 + days_left * 86400
+
+    return {
+        machine_id: (float(empty_at[i]), float(daily[i]))
+        for i, machine_id in enumerate(rows)
+        if daily[i] > 0 and has_anchor[i] and not arrays["errors"][i]
+    }
@@ -0,0 +1,114 @@
+"""
+Worker Pool Module
+Bounded thread pools for CPU-heavy work called from async endpoints.
+
+bcrypt hashing and verification take ~250 ms of CPU each. Running them on
+the event loop freezes every other request in the worker; running them on
+the shared default executor lets a login storm starve everything else that
+uses it. A BoundedWorkerPool gives such work its own threads, caps how many
+calls may wait for them, and records how long calls queue, so a burst only
+slows down the endpoints that use the pool.
+"""
+
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict
+
+
+class PoolSaturatedError(Exception):
+    """Raised when a pool's wait queue is full"""
+
+
+class BoundedWorkerPool:
+    """Dedicated thread pool with a concurrency limit, a queue limit and timing metrics"""
+
+    def __init__(self, name: str, max_workers: int, max_queue: int):
+        self.name = name
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=name)
+        self._lock = threading.Lock()
+        self._queued = 0
+        self._running = 0
+        self._completed = 0
+        self._failed = 0
+        self._rejected = 0
+        self._queue_seconds_total = 0.0
+        self._queue_seconds_max = 0.0
+        self._run_seconds_total = 0.0
+
+    async def run(self, func: Callable[..., Any], *args) -> Any:
+        """Run func(*args) on the pool and await the result
+
+        Raises:
+            PoolSaturatedError: max_queue calls are already waiting for a worker
+        """
+        with self._lock:
+            if self._queued >= self.max_queue:
+                self._rejected += 1
+                raise PoolSaturatedError(f"{self.name} pool is saturated")
+            self._queued += 1
+        submitted = time.perf_counter()
+        dequeued = [False]  # Set once this call has left the queue (started or cancelled)
+
+        def _timed():
+            started = time.perf_counter()
+            with self._lock:
+                if not dequeued[0]:
+                    dequeued[0] = True
+                    self._queued -= 1
+                self._running += 1
+                waited = started - submitted
+                self._queue_seconds_total += waited
+                self._queue_seconds_max = max(self._queue_seconds_max, waited)
+            ok = False
+            try:
+                result = func(*args)
+                ok = True
+                return result
+            finally:
+                with self._lock:
+                    self._running -= 1
+                    self._run_seconds_total += time.perf_counter() - started
+                    if ok:
+                        self._completed += 1
+                    else:
+                        self._failed += 1
+
+        loop = asyncio.get_running_loop()
+        try:
+            return await loop.run_in_executor(self._executor, _timed)
+        except asyncio.CancelledError:
+            # A cancelled call that never reached a worker leaves the queue here
+            with self._lock:
+                if not dequeued[0]:
+                    dequeued[0] = True
+                    self._queued -= 1
+            raise
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            finished = self._completed + self._failed
+            return {
+                "max_workers": self.max_workers,
+                "max_queue": self.max_queue,
+                "queued": self._queued,
+                "running": self._running,
+                "completed": self._completed,
+                "failed": self._failed,
+                "rejected": self._rejected,
+                "avg_queue_ms": round(self._queue_seconds_total / finished * 1000, 2) if finished else None,
+                "max_queue_ms": round(self._queue_seconds_max * 1000, 2),
+                "avg_run_ms": round(self._run_seconds_total / finished * 1000, 2) if finished else None,
+            }
+
+
+# bcrypt hashing/verification (PASSWORD_HASH_WORKERS threads, at most PASSWORD_HASH_MAX_QUEUE waiting)
+password_pool = BoundedWorkerPool(
+    "bcrypt",
+    max_workers=int(os.getenv("PASSWORD_HASH_WORKERS", str(min(4, os.cpu_count() or 1)))),
+    max_queue=int(os.getenv("PASSWORD_HASH_MAX_QUEUE", "64")),
+)
@@ -77,11 +77,12 @@ import Sidebar from './Sidebar';
 import ResponsiveTable from './ResponsiveTable';
 import TechnicianView from './TechnicianView';
 import {
+  batchGet,
   getDispensers,
-  getSchedules,
   assignSchedule,
-  getRefillLogs,
-  calculateUsage,
+  getRefillLogsPage,
+  calculateUsageBatch,
+  getRefillDue,
   getClients,
   createClient,
   updateClient,
@@ -117,7 +118,11 @@ function AdminDashboard() {
   const [users, setUsers] = useState([]);
   const [schedules, setSchedules] = useState([]);
   const [refillLogs, setRefillLogs] = useState([]);
+  const [refillLogsCursor, setRefillLogsCursor] = useState(null); // next_cursor of the last loaded page
+  const [refillLogsTotal, setRefillLogsTotal] = useState(null);
+  const [loadingMoreRefillLogs, setLoadingMoreRefillLogs] = useState(false);
   const [usageData, setUsageData] = useState({});
+  const [refillDue, setRefillDue] = useState([]);
   const [loading, setLoading] = useState(true);
   
   // Data loading state tracking
@@ -134,6 +139,7 @@ function AdminDashboard() {
   // Cache timestamp to prevent unnecessary refetches
   const [lastFetchTime, setLastFetchTime] = useState({});
   const CACHE_DURATION = 30000; // 30 seconds cache
+  const REFILL_LOGS_PAGE_SIZE = 100;
   
   // Technician View Mode
   const [technicianViewMode, setTechnicianViewMode] = useState(false);
@@ -285,45 +291,38 @@ function AdminDashboard() {
       const now = Date.now();
       const shouldFetch = (key) => force || !dataLoaded[key] || (now - (lastFetchTime[key] || 0)) > CACHE_DURATION;
       
-      const promises = [];
-      const keys = [];
-      
-      if (shouldFetch('dispensers')) {
-        promises.push(getDispensers());
-        keys.push('dispensers');
-      } else {
-        promises.push(Promise.resolve(dispensers));
-      }
-      
-      if (shouldFetch('schedules')) {
-        promises.push(getSchedules());
-        keys.push('schedules');
-      } else {
-        promises.push(Promise.resolve(schedules));
-      }
-      
-      if (shouldFetch('clients')) {
-        promises.push(getClients());
-        keys.push('clients');
-      } else {
-        promises.push(Promise.resolve(clients));
+      // Fetch everything that is stale in one batch request
+      const paths = { dispensers: '/dispensers', schedules: '/schedules', clients: '/clients' };
+      const keys = Object.keys(paths).filter(shouldFetch);
+      const fetched = {};
+      if (keys.length > 0) {
+        const responses = await batchGet(keys.map((key) => ({ id: key, path: paths[key] })));
+        responses.forEach(({ id, status, body }) => {
+          if (status === 200) {
+            fetched[id] = body;
+          } else {
+            console.error(`Error loading ${id}:`, body?.detail || status);
+          }
+        });
       }
+      const loadedKeys = keys.filter((key) => key in fetched);
+      const dispensersData = fetched.dispensers ?? dispensers;
+      const schedulesData = fetched.schedules ?? schedules;
+      const clientsData = fetched.clients ?? clients;
       
-      const [dispensersData, schedulesData, clientsData] = await Promise.all(promises);
-      
-      if (keys.includes('dispensers')) {
+      if (loadedKeys.includes('dispensers')) {
       setDispensers(dispensersData);
         setDataLoaded(prev => ({ ...prev, dispensers: true }));
         setLastFetchTime(prev => ({ ...prev, dispensers: now }));
       }
       
-      if (keys.includes('schedules')) {
+      if (loadedKeys.includes('schedules')) {
       setSchedules(schedulesData);
         setDataLoaded(prev => ({ ...prev, schedules: true }));
         setLastFetchTime(prev => ({ ...prev, schedules: now }));
       }
       
-      if (keys.includes('clients')) {
+      if (loadedKeys.includes('clients')) {
         setClients(clientsData);
         setDataLoaded(prev => ({ ...prev, clients: true }));
         setLastFetchTime(prev => ({ ...prev, clients: now }));
@@ -331,8 +330,9 @@ function AdminDashboard() {
       
       // Only calculate usage for installed machines (not all dispensers)
       // Run this in the background so initial admin load doesn't wait for all usage calls
-      if (keys.includes('dispensers') || force) {
+      if (loadedKeys.includes('dispensers') || force) {
         loadUsageData(dispensersData);
+        loadRefillDue();
       }
     } catch (err) {
       console.error('Error loading essential data:', err);
@@ -341,6 +341,15 @@ function AdminDashboard() {
     }
   };
 
+  // Machines projected to run dry soon, from the server's refill-due index
+  const loadRefillDue = async () => {
+    try {
+      setRefillDue(await getRefillDue());
+    } catch (err) {
+      console.error('Error loading refill-due machines:', err);
+    }
+  };
+
   // Load usage data only for installed machines with schedules
   const loadUsageData = async (dispensersData = dispensers) => {
     try {
@@ -355,24 +364,12 @@ function AdminDashboard() {
         return;
       }
       
-      // Batch calculate usage (limit concurrent requests)
-      const BATCH_SIZE = 10;
+      // Calculate usage for all machines in one batch request
       const usageMap = { ...usageData };
-      
-      for (let i = 0; i < installedWithSchedules.length; i += BATCH_SIZE) {
-        const batch = installedWithSchedules.slice(i, i + BATCH_SIZE);
-        const usagePromises = batch.map(async (d) => {
-          try {
-          const usage = await calculateUsage(d.id);
-          return { [d.id]: usage };
-          } catch (err) {
-            console.error(`Error calculating usage for ${d.id}:`, err);
-        return { [d.id]: null };
-          }
-        });
-        const batchResults = await Promise.all(usagePromises);
-        Object.assign(usageMap, ...batchResults);
-      }
+      const batchResults = await calculateUsageBatch({
+        dispenserIds: installedWithSchedules.map(d => d.id),
+      });
+      Object.assign(usageMap, batchResults);
       
       setUsageData(usageMap);
       setDataLoaded(prev => ({ ...prev, usage: true }));
@@ -389,10 +386,7 @@ function AdminDashboard() {
     
     try {
       if (tab === 3 && shouldFetch('refillLogs')) { // Refill Logs tab
-        const logsData = await getRefillLogs();
-        setRefillLogs(logsData);
-        setDataLoaded(prev => ({ ...prev, refillLogs: true }));
-        setLastFetchTime(prev => ({ ...prev, refillLogs: now }));
+        await loadFirstRefillLogsPage();
       }
       
       if (tab === 2 && shouldFetch('users')) { // Users tab
@@ -419,7 +413,9 @@ function AdminDashboard() {
     setDispensers(dispensersData);
     setDataLoaded(prev => ({ ...prev, dispensers: true }));
     setLastFetchTime(prev => ({ ...prev, dispensers: Date.now() }));
-    await loadUsageData(dispensersData);
+    // Recalculates usage for every installed machine in one batch request,
+    // so edits don't need per-machine usage calls before reloading
+    await Promise.all([loadUsageData(dispensersData), loadRefillDue()]);
   };
 
   const reloadClients = async () => {
@@ -436,13 +432,32 @@ function AdminDashboard() {
     setLastFetchTime(prev => ({ ...prev, users: Date.now() }));
   };
 
-  const reloadRefillLogs = async () => {
-    const logsData = await getRefillLogs();
-    setRefillLogs(logsData);
+  // Refill logs are loaded a page at a time, newest first
+  const loadFirstRefillLogsPage = async () => {
+    const page = await getRefillLogsPage({ includeTotal: true }, null, REFILL_LOGS_PAGE_SIZE);
+    setRefillLogs(page.items);
+    setRefillLogsCursor(page.next_cursor);
+    setRefillLogsTotal(page.total);
     setDataLoaded(prev => ({ ...prev, refillLogs: true }));
     setLastFetchTime(prev => ({ ...prev, refillLogs: Date.now() }));
   };
 
+  const loadMoreRefillLogs = async () => {
+    if (!refillLogsCursor) return;
+    setLoadingMoreRefillLogs(true);
+    try {
+      const page = await getRefillLogsPage({}, refillLogsCursor, REFILL_LOGS_PAGE_SIZE);
+      setRefillLogs(prev => [...prev, ...page.items]);
+      setRefillLogsCursor(page.next_cursor);
+    } catch (err) {
+      console.error('Error loading more refill logs:', err);
+    } finally {
+      setLoadingMoreRefillLogs(false);
+    }
+  };
+
+  const reloadRefillLogs = loadFirstRefillLogsPage;
+
   const reloadAssignments = async () => {
     const assignmentsData = await getTechnicianAssignments();
     setAssignedTasks(assignmentsData);
@@ -740,15 +755,6 @@ function AdminDashboard() {
                   refill_capacity_ml: capacityChanged ? newCapacity : machine.refill_capacity_ml,
                 };
                 await updateDispenser(machine.id, updatedMachine);
-                
-                // Recalculate usage if machine has a schedule
-                if (machine.current_schedule_id) {
-                  try {
-                    await calculateUsage(machine.id);
-                  } catch (err) {
-                    console.error(`Error recalculating usage for ${machine.id}:`, err);
-                  }
-                }
               });
               
               await Promise.all(updatePromises);
@@ -1180,10 +1186,6 @@ function AdminDashboard() {
       if (editingInstallation || assignedMachine) {
         const machineId = editingInstallation?.id || assignedMachine.id;
         await updateDispenser(machineId, installationData);
-        // Recalculate usage after update
-        if (installationData.current_schedule_id) {
-          await calculateUsage(machineId);
-        }
       } else {
         // Create new installation - create a NEW dispenser record
         // This allows multiple installations of the same SKU in different locations
@@ -1195,10 +1197,6 @@ function AdminDashboard() {
         };
         console.log('Creating installation with data:', newInstallationData);
         await createDispenser(newInstallationData);
-        // Recalculate usage after creation
-        if (installationData.current_schedule_id) {
-          await calculateUsage(newInstallationData.id);
-        }
       }
       
       handleCloseInstallationDialog();
@@ -1585,13 +1583,10 @@ function AdminDashboard() {
                                   variant="body2"
                                   sx={{ fontSize: '0.75rem', fontWeight: 600, textTransform: 'uppercase', letterSpacing: '1px', mb: 1.5 }}
                                 >
-                                  Low Level Machines
+                                  Machines Needing Refill
                                 </Typography>
                                 <Typography variant="h3" sx={{ fontWeight: 300, mt: 1, color: 'warning.main', fontSize: '2.5rem', lineHeight: 1.2 }}>
-                                  {installedMachines.filter(d => {
-                                    const percentage = (d.current_level_ml / d.refill_capacity_ml) * 100;
-                                    return percentage < 20;
-                                  }).length}
+                                  {refillDue.length}
                                 </Typography>
                               </Box>
                               <Box
@@ -1639,7 +1634,7 @@ function AdminDashboard() {
                                   Total Refills
                                 </Typography>
                                 <Typography variant="h3" sx={{ fontWeight: 300, mt: 1, color: 'text.primary', fontSize: '2.5rem', lineHeight: 1.2 }}>
-                                  {installedRefillLogs.length}
+                                  {refillLogsTotal ?? installedRefillLogs.length}
                                 </Typography>
                               </Box>
                               <Box
@@ -2082,15 +2077,6 @@ function AdminDashboard() {
                               };
                               await updateDispenser(machine.id, updatedMachine);
                               
-                              // Recalculate usage if machine has a schedule
-                              if (machine.current_schedule_id) {
-                                try {
-                                  await calculateUsage(machine.id);
-                                } catch (err) {
-                                  console.error(`Error recalculating usage for ${machine.id}:`, err);
-                                }
-                              }
-                              
                               successCount++;
                             } catch (err) {
                               console.error(`Error updating machine ${machine.id}:`, err);
@@ -2495,6 +2481,7 @@ function AdminDashboard() {
                   </Typography>
                     <Typography variant="body2" color="text.secondary" sx={{ fontSize: { xs: '0.8125rem', sm: '0.875rem' } }}>
                     Track all refill activities and history
+                    {refillLogsTotal !== null && ` - showing ${refillLogs.length} of ${refillLogsTotal}`}
                   </Typography>
                 </Box>
                   <Button
@@ -2734,6 +2721,20 @@ function AdminDashboard() {
                   </Table>
                 </TableContainer>
                 </Box>
+                {refillLogsCursor && (
+                  <Box sx={{ mt: 2, display: 'flex', justifyContent: 'center' }}>
+                    <Button
+                      variant="outlined"
+                      size="small"
+                      onClick={loadMoreRefillLogs}
+                      disabled={loadingMoreRefillLogs}
+                      startIcon={loadingMoreRefillLogs ? <CircularProgress size={16} /> : null}
+                      sx={{ textTransform: 'none', borderRadius: 1.5 }}
+                    >
+                      Load older refills
+                    </Button>
+                  </Box>
+                )}
               </Box>
             )}
 
@@ -4957,15 +4958,6 @@ function AdminDashboard() {
                                   refill_capacity_ml: needsCapacityUpdate ? skuTemplate.refill_capacity_ml : machine.refill_capacity_ml,
                                 };
                                 await updateDispenser(machine.id, updatedMachine);
-                                
-                                // Recalculate usage if machine has a schedule
-                                if (machine.current_schedule_id) {
-                                  try {
-                                    await calculateUsage(machine.id);
-                                  } catch (err) {
-                                    console.error(`Error recalculating usage for ${machine.id}:`, err);
-                                  }
-                                }
                               });
                               
                               await Promise.all(updatePromises);
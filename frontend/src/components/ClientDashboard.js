@@ -34,10 +34,7 @@ import { AuthContext } from '../context/AuthContext';
 import { useNavigate } from 'react-router-dom';
 import { formatDateIST } from '../utils/dateUtils';
 import {
-  getDispensers,
-  getRefillLogs,
-  getClients,
-  calculateUsage,
+  getClientDashboard,
 } from '../services/api';
 
 function ClientDashboard() {
@@ -51,6 +48,7 @@ function ClientDashboard() {
   const [refillLogs, setRefillLogs] = useState([]);
   const [clients, setClients] = useState([]);
   const [usageData, setUsageData] = useState({});
+  const [summary, setSummary] = useState(null);
   const [loading, setLoading] = useState(true);
 
   const clientId = user?.client_id || user?.username;
@@ -67,35 +65,13 @@ function ClientDashboard() {
   const loadData = async () => {
     try {
       setLoading(true);
-      const [dispensersData, logsData, clientsData] = await Promise.all([
-        getDispensers(),
-        getRefillLogs(),
-        getClients(),
-      ]);
-
-      // Filter to only this client's machines
-      const clientMachines = dispensersData.filter(d => d.client_id === clientId);
-      setDispensers(clientMachines);
-      setRefillLogs(logsData.filter(log => {
-        const machine = clientMachines.find(d => d.id === log.dispenser_id);
-        return machine !== undefined;
-      }));
-      setClients(clientsData);
-
-      // Load usage data for machines with schedules
-      const usagePromises = clientMachines
-        .filter(d => d.current_schedule_id)
-        .map(async (d) => {
-          try {
-            const usage = await calculateUsage(d.id);
-            return { [d.id]: usage };
-          } catch {
-            return { [d.id]: null };
-          }
-        });
-      const usageResults = await Promise.all(usagePromises);
-      const usageMap = Object.assign({}, ...usageResults);
-      setUsageData(usageMap);
+      // Machines, usage, recent refills and summary counts in one request
+      const dashboard = await getClientDashboard(clientId);
+      setDispensers(dashboard.machines);
+      setRefillLogs(dashboard.recent_refill_logs);
+      setClients([dashboard.client]);
+      setUsageData(dashboard.usage);
+      setSummary({ ...dashboard.summary, ...dashboard.quick_stats });
     } catch (err) {
       console.error('Error loading data:', err);
     } finally {
@@ -126,27 +102,11 @@ function ClientDashboard() {
     return clientMachines.some(d => d.id === log.dispenser_id);
   });
 
-  // Calculate statistics
-  const totalMachines = clientMachines.length;
-  const lowLevelMachines = clientMachines.filter(d => {
-    const dailyUsage = usageData[d.id]?.daily_usage_ml || 0;
-    const lastRefill = d.last_refill_date ? new Date(d.last_refill_date) : null;
-    let currentLevel = d.current_level_ml;
-    
-    if (lastRefill && dailyUsage > 0 && d.current_schedule_id) {
-      const now = new Date();
-      const timeDiffMs = now - lastRefill;
-      const daysElapsed = timeDiffMs / (1000 * 60 * 60 * 24);
-      const refillAmount = d.current_level_ml > 0 ? d.current_level_ml : d.refill_capacity_ml;
-      const usageSinceRefill = daysElapsed * dailyUsage;
-      currentLevel = Math.max(0, Math.min(refillAmount - usageSinceRefill, d.refill_capacity_ml));
-    }
-    
-    const percentage = (currentLevel / d.refill_capacity_ml) * 100;
-    return percentage < 20;
-  }).length;
-
-  const totalRefills = clientRefillLogs.length;
+  // Statistics are computed server-side by the dashboard endpoint
+  const totalMachines = summary?.total_machines ?? clientMachines.length;
+  // Served from the same refill-due index as GET /api/dispensers/refill-due
+  const machinesNeedingRefill = summary?.machines_needing_refill ?? 0;
+  const totalRefills = summary?.total_refills ?? clientRefillLogs.length;
 
   return (
     <Box sx={{ display: 'flex', minHeight: '100vh', bgcolor: 'background.default' }}>
@@ -219,10 +179,10 @@ function ClientDashboard() {
                   <Box sx={{ display: 'flex', justifyContent: 'space-between', alignItems: 'center' }}>
                     <Box>
                       <Typography variant="body2" color="text.secondary" gutterBottom sx={{ fontWeight: 600, textTransform: 'uppercase', fontSize: '0.75rem' }}>
-                        Low Level Machines
+                        Machines Needing Refill
                       </Typography>
                       <Typography variant="h4" sx={{ fontWeight: 600, color: 'warning.main' }}>
-                        {lowLevelMachines}
+                        {machinesNeedingRefill}
                       </Typography>
                     </Box>
                     <History sx={{ fontSize: 40, color: 'warning.main', opacity: 0.8 }} />
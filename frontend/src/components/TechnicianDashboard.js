@@ -69,14 +69,15 @@ import { AuthContext } from '../context/AuthContext';
 import { 
   getDispensers, 
   logRefill, 
-  getRefillLogs,
+  getRefillLogsPage,
   getClients, 
   getClient,
   getSchedules,
   createSchedule,
-  calculateUsage,
+  calculateUsageBatch,
   getTechnicianAssignments,
   getTechnicianStats,
+  getTechnicianWorkload,
   completeAssignment,
   updateClient,
   createDispenser,
@@ -87,6 +88,8 @@ import Sidebar from './Sidebar';
 import ResponsiveTable from './ResponsiveTable';
 import { useLocation } from 'react-router-dom';
 
+const REFILL_LOGS_PAGE_SIZE = 200;
+
 function TechnicianDashboard() {
   const { user, logout } = useContext(AuthContext);
   const location = useLocation();
@@ -103,6 +106,8 @@ function TechnicianDashboard() {
   const [schedules, setSchedules] = useState([]);
   const [assignments, setAssignments] = useState([]);
   const [stats, setStats] = useState(null);
+  const [workload, setWorkload] = useState([]); // Open tasks joined with machine, client and level
+  const [listsLoaded, setListsLoaded] = useState(false); // Full lists are only needed outside the dashboard view
   const [usageData, setUsageData] = useState({});
   const [refillLogs, setRefillLogs] = useState([]);
   const [loading, setLoading] = useState(true);
@@ -192,6 +197,13 @@ function TechnicianDashboard() {
     loadData();
   }, [user]);
 
+  // The other tabs and the refill dialog work from the full lists - load them the first time they are needed
+  useEffect(() => {
+    if (!listsLoaded && (activeTab !== null || refillCodeEntryDialogOpen)) {
+      loadLists();
+    }
+  }, [activeTab, refillCodeEntryDialogOpen, listsLoaded]);
+
   useEffect(() => {
     // Handle tab navigation from sidebar
     if (location?.state?.tab !== undefined) {
@@ -229,50 +241,68 @@ function TechnicianDashboard() {
     }
   }, [installationDialogOpen]);
 
-  const loadData = async () => {
+  // The dashboard view: this technician's open tasks and stats, without the full lists
+  const loadWorkload = async () => {
+    if (!user?.username) return;
+    const [workloadData, statsData] = await Promise.all([
+      getTechnicianWorkload(user.username),
+      getTechnicianStats(user.username),
+    ]);
+    setWorkload(workloadData.tasks.map(task => ({ ...task, id: task.assignment_id })));
+    setStats(statsData);
+  };
+
+  const loadLists = async () => {
     try {
-      setLoading(true);
-      // Load refill logs separately to handle errors gracefully
+      // Load refill logs separately to handle errors gracefully. Only the newest
+      // page is needed: the logs are matched against each machine's last refill
       let refillLogsData = [];
       try {
-        refillLogsData = await getRefillLogs();
+        refillLogsData = (await getRefillLogsPage({}, null, REFILL_LOGS_PAGE_SIZE)).items;
       } catch (err) {
         console.error('Error loading refill logs:', err);
         // Continue without refill logs if there's an error
       }
       
-      const [dispensersData, clientsData, schedulesData, assignmentsData, statsData] = await Promise.all([
+      const [dispensersData, clientsData, schedulesData, assignmentsData] = await Promise.all([
         getDispensers(),
         getClients(),
         getSchedules(),
         getTechnicianAssignments(user?.username),
-        getTechnicianStats(user?.username),
       ]);
       setDispensers(dispensersData);
       setClients(clientsData);
       setSchedules(schedulesData);
       setAssignments(assignmentsData);
-      setStats(statsData);
       setRefillLogs(refillLogsData);
+      setListsLoaded(true);
 
       // Load usage data for installed machines
       const installedMachines = dispensersData.filter(d => d.client_id && d.status === 'installed');
-      const usagePromises = installedMachines.map(async (d) => {
-        if (d.current_schedule_id) {
-          try {
-            const usage = await calculateUsage(d.id);
-            return { [d.id]: usage };
-          } catch {
-            return { [d.id]: null };
-          }
+      const usageMap = Object.fromEntries(installedMachines.map(d => [d.id, null]));
+      const scheduledIds = installedMachines.filter(d => d.current_schedule_id).map(d => d.id);
+      if (scheduledIds.length > 0) {
+        try {
+          Object.assign(usageMap, await calculateUsageBatch({ dispenserIds: scheduledIds }));
+        } catch (err) {
+          console.error('Error loading usage data:', err);
         }
-        return { [d.id]: null };
-      });
-      const usageResults = await Promise.all(usagePromises);
-      const usageMap = Object.assign({}, ...usageResults);
+      }
       setUsageData(usageMap);
     } catch (err) {
       console.error('Error loading data:', err);
+    }
+  };
+
+  const loadData = async () => {
+    try {
+      setLoading(true);
+      await Promise.all([
+        loadWorkload(),
+        listsLoaded || activeTab !== null ? loadLists() : null,
+      ]);
+    } catch (err) {
+      console.error('Error loading data:', err);
     } finally {
       setLoading(false);
     }
@@ -1008,17 +1038,14 @@ function TechnicianDashboard() {
     return 'success';
   };
 
-  // Filter assignments by date
-  const filteredAssignments = filterDate
-    ? assignments.filter(a => {
-        const assignedDate = a.assigned_date?.split('T')[0];
-        const visitDate = a.visit_date?.split('T')[0];
+  // Open tasks (pending and assigned) from the workload, filtered by date - already sorted by visit date
+  const pendingAssignments = filterDate
+    ? workload.filter(task => {
+        const assignedDate = task.assigned_date?.split('T')[0];
+        const visitDate = task.visit_date?.split('T')[0];
         return assignedDate === filterDate || visitDate === filterDate;
       })
-    : assignments;
-
-  // Get pending assignments (tasks to do) - includes both 'pending' and 'assigned' status
-  const pendingAssignments = filteredAssignments.filter(a => a.status === 'pending' || a.status === 'assigned');
+    : workload;
 
   return (
     <Box sx={{ display: 'flex', minHeight: '100vh', bgcolor: 'background.default' }}>
@@ -1579,31 +1606,23 @@ function TechnicianDashboard() {
                             { 
                               id: 'client', 
                               label: 'Client',
-                              render: (_, assignment) => {
-                                const dispenser = getDispenserDetails(assignment.dispenser_id);
-                                const installationClientId = assignment.task_type === 'installation' 
-                                  ? getClientIdFromInstallationTask(assignment) 
-                                  : null;
-                                const clientId = installationClientId || dispenser?.client_id;
-                                return (
-                                  <Typography variant="body2" fontWeight={500}>
-                                    {getClientName(clientId)}
-                                  </Typography>
-                                );
-                              },
+                              render: (_, task) => (
+                                <Typography variant="body2" fontWeight={500}>
+                                  {task.client?.name || 'No Client'}
+                                </Typography>
+                              ),
                               bold: true,
                             },
                             { 
                               id: 'location', 
                               label: 'Location',
-                              render: (_, assignment) => {
-                                const dispenser = getDispenserDetails(assignment.dispenser_id);
-                                const isInstallation = assignment.task_type === 'installation';
+                              render: (_, task) => {
+                                const isInstallation = task.task_type === 'installation';
                                 return (
                                   <Box sx={{ display: 'flex', alignItems: 'center', gap: 0.5 }}>
                                     {!isInstallation && <LocationOn fontSize="small" color="action" />}
                                     <Typography variant="body2">
-                                      {isInstallation ? 'Installation Task' : (dispenser?.location || '-')}
+                                      {isInstallation ? 'Installation Task' : (task.machine?.location || '-')}
                                     </Typography>
                                   </Box>
                                 );
@@ -1612,18 +1631,31 @@ function TechnicianDashboard() {
                             { 
                               id: 'machine', 
                               label: 'Machine',
-                              render: (_, assignment) => {
-                                const dispenser = getDispenserDetails(assignment.dispenser_id);
-                                const isInstallation = assignment.task_type === 'installation';
+                              render: (_, task) => {
+                                const isInstallation = task.task_type === 'installation';
                                 return (
                                   <Chip 
-                                    label={isInstallation ? 'Installation' : (dispenser?.sku || dispenser?.unique_code || 'N/A')} 
+                                    label={isInstallation ? 'Installation' : (task.machine?.sku || task.machine?.unique_code || 'N/A')} 
                                     size="small" 
                                     variant="outlined"
                                   />
                                 );
                               },
                             },
+                            { 
+                              id: 'estimated_level_ml', 
+                              label: 'Est. Level',
+                              render: (value, task) => (
+                                value === null || value === undefined ? '-' : (
+                                  <Chip 
+                                    label={`${Math.round(value)} ml${task.level_percent !== null ? ` (${task.level_percent}%)` : ''}`} 
+                                    size="small" 
+                                    color={task.level_percent !== null ? getLevelColor(value, task.machine?.refill_capacity_ml) : 'default'}
+                                    variant="outlined"
+                                  />
+                                )
+                              ),
+                            },
                             { 
                               id: 'task_type', 
                               label: 'Task Type',
@@ -1668,7 +1700,7 @@ function TechnicianDashboard() {
                           ]}
                           data={pendingAssignments}
                           renderActions={(assignment) => {
-                            const dispenser = getDispenserDetails(assignment.dispenser_id);
+                            const dispenser = assignment.machine;
                             const isInstallation = assignment.task_type === 'installation';
                             
                             if (isInstallation) {
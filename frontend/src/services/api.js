@@ -79,6 +79,49 @@ api.interceptors.request.use((config) => {
   return config;
 });
 
+// Exchange the stored refresh token for a new access token (one request shared by concurrent 401s)
+let refreshPromise = null;
+
+const refreshSession = () => {
+  if (!refreshPromise) {
+    refreshPromise = (async () => {
+      const storedUser = JSON.parse(localStorage.getItem('user') || 'null');
+      if (!storedUser?.refresh_token) {
+        throw new Error('No refresh token');
+      }
+      const response = await axios.post(`${API_BASE_URL}/token/refresh`, {
+        refresh_token: storedUser.refresh_token,
+      });
+      localStorage.setItem('user', JSON.stringify({ ...storedUser, ...response.data }));
+      return response.data.token;
+    })().finally(() => {
+      refreshPromise = null;
+    });
+  }
+  return refreshPromise;
+};
+
+// Renew an expired access token and retry the request once
+api.interceptors.response.use(
+  (response) => response,
+  async (error) => {
+    const config = error.config;
+    const isAuthCall = /\/(login|client-login|token\/refresh)$/.test(config?.url || '');
+    if (error.response?.status === 401 && config && !config._retried && !isAuthCall) {
+      config._retried = true;
+      try {
+        const token = await refreshSession();
+        config.headers = config.headers || {};
+        config.headers.Authorization = `Bearer ${token}`;
+        return api(config);
+      } catch {
+        // fall through with the original 401
+      }
+    }
+    return Promise.reject(error);
+  }
+);
+
 // Sanitize error responses to prevent API URL exposure
 api.interceptors.response.use(
   (response) => response,
@@ -219,8 +262,20 @@ export const logRefill = async (dispenserId, refillData) => {
   return response.data;
 };
 
-export const getRefillLogs = async () => {
-  const response = await api.get('/refill-logs');
+// One page of refill logs. Pass the previous page's next_cursor to continue.
+// Returns { items, next_cursor, total }
+export const getRefillLogsPage = async (filters = {}, cursor = null, limit = 100) => {
+  const params = new URLSearchParams();
+  params.append('limit', limit);
+  if (cursor) params.append('cursor', cursor);
+  if (filters.dispenserId) params.append('dispenser_id', filters.dispenserId);
+  if (filters.clientId) params.append('client_id', filters.clientId);
+  if (filters.technicianUsername) params.append('technician_username', filters.technicianUsername);
+  if (filters.fragranceCode) params.append('fragrance_code', filters.fragranceCode);
+  if (filters.startDate) params.append('start_date', filters.startDate);
+  if (filters.endDate) params.append('end_date', filters.endDate);
+  if (filters.includeTotal) params.append('include_total', 'true');
+  const response = await api.get(`/refill-logs?${params.toString()}`);
   return response.data;
 };
 
@@ -229,6 +284,24 @@ export const calculateUsage = async (dispenserId) => {
   return response.data;
 };
 
+// Usage for many machines in one request. Returns { [dispenserId]: usage | null }
+export const calculateUsageBatch = async ({ dispenserIds = null, clientId = null, technicianUsername = null } = {}) => {
+  const response = await api.post('/dispensers/usage-calculation', {
+    dispenser_ids: dispenserIds,
+    client_id: clientId,
+    technician_username: technicianUsername,
+  });
+  return response.data;
+};
+
+export const getRefillDue = async (withinDays = 3, clientId = null) => {
+  const params = new URLSearchParams();
+  params.append('within_days', withinDays);
+  if (clientId) params.append('client_id', clientId);
+  const response = await api.get(`/dispensers/refill-due?${params.toString()}`);
+  return response.data;
+};
+
 export const getClients = async () => {
   const response = await api.get('/clients');
   return response.data;
@@ -239,6 +312,12 @@ export const getClient = async (clientId) => {
   return response.data;
 };
 
+// Summary cards, machines, usage, assignments and recent refills for one client
+export const getClientDashboard = async (clientId) => {
+  const response = await api.get(`/clients/${clientId}/dashboard`);
+  return response.data;
+};
+
 export const createClient = async (client) => {
   const response = await api.post('/clients', client);
   return response.data;
@@ -275,11 +354,31 @@ export const deleteUser = async (username) => {
 };
 
 // Technician Assignments
-export const getTechnicianAssignments = async (technician = null, status = null) => {
+// Several GET requests in one round trip. requests: [{ id, path, query }] with
+// paths relative to the API root (e.g. '/dispensers'). Returns
+// [{ id, path, status, body }] in the same order; check each status.
+export const batchGet = async (requests) => {
+  const response = await api.post('/batch', {
+    requests: requests.map(({ id, path, query }) => ({ id, path: `/api${path}`, query })),
+  });
+  return response.data.responses;
+};
+
+// Open assignments joined with machine, client, schedule and projected level
+export const getTechnicianWorkload = async (username) => {
+  const response = await api.get(`/technicians/${username}/workload`);
+  return response.data;
+};
+
+export const getTechnicianAssignments = async (technician = null, status = null, filters = {}) => {
   let url = '/technician-assignments';
   const params = new URLSearchParams();
   if (technician) params.append('technician', technician);
   if (status) params.append('status', status);
+  if (filters.dispenserId) params.append('dispenser_id', filters.dispenserId);
+  if (filters.visitDateFrom) params.append('visit_date_from', filters.visitDateFrom);
+  if (filters.visitDateTo) params.append('visit_date_to', filters.visitDateTo);
+  if (filters.limit) params.append('limit', filters.limit);
   if (params.toString()) url += `?${params.toString()}`;
   const response = await api.get(url);
   return response.data;